@@ -0,0 +1,93 @@
+import os
+import logging
+import tempfile
+from gemini import stream_with_gemini
+from live_metrics import publish_live_event
+from local_analysis import with_ai_insights
+from s3_utils import upload_file_to_s3
+
+logger = logging.getLogger(__name__)
+
+MARKDOWN_FENCE = "```markdown"
+
+
+def clean_markdown(text):
+    """Strip the ```markdown fence Gemini sometimes wraps its answer in."""
+    text = text.strip()
+    if text.startswith(MARKDOWN_FENCE):
+        text = text[len(MARKDOWN_FENCE):].strip()
+    if text.endswith("```"):
+        text = text[:-3].strip()
+    return text
+
+
+def _streamable_prefix(text):
+    """
+    Accumulated text that is safe to show: an opening fence is dropped,
+    and trailing backticks (maybe a closing fence) wait for more text.
+    """
+    stripped = text.lstrip()
+    if len(stripped) < len(MARKDOWN_FENCE) and MARKDOWN_FENCE.startswith(stripped):
+        return ""
+    if stripped.startswith(MARKDOWN_FENCE):
+        stripped = stripped[len(MARKDOWN_FENCE):].lstrip()
+    return stripped.rstrip("`")
+
+
+def _save_markdown(markdown_text, user_prefix, md_filename):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        md_path = os.path.join(temp_dir, md_filename)
+        with open(md_path, "w", encoding="utf-8") as f:
+            f.write(markdown_text)
+        if not upload_file_to_s3(md_path, f"{user_prefix}{md_filename}"):
+            raise RuntimeError(f"Failed to upload {md_filename}.")
+
+
+def stream_analysis(job_id, prompt, user_prefix, md_filename, report=""):
+    """
+    Stream Gemini's commentary on `report` to the job's live channel as
+    it is written, then save report + commentary to S3 as `md_filename`.
+
+    Subscribers get `token` events carrying new text (late subscribers
+    first get a `partial` snapshot of everything so far), and a `done`
+    event with the complete markdown once the .md is uploaded. If Gemini
+    fails, the report is saved on its own and `done` has `enriched: false`.
+    """
+    parts = []
+    sent = ""
+    seq = 0
+    try:
+        for chunk in stream_with_gemini(prompt):
+            parts.append(chunk)
+            visible = _streamable_prefix("".join(parts))
+            if len(visible) > len(sent):
+                seq += 1
+                publish_live_event(
+                    job_id,
+                    {"type": "token", "seq": seq, "text": visible[len(sent):]},
+                    snapshot={"type": "partial", "seq": seq, "analysis": visible},
+                )
+                sent = visible
+        insights = clean_markdown("".join(parts))
+        markdown_text = with_ai_insights(report, insights) if report else insights
+        enriched = True
+    except Exception as e:
+        if not report:
+            logger.error(f"❌ Streaming analysis failed: {e}")
+            publish_live_event(job_id, {"type": "error", "message": f"Gemini error: {str(e)}"})
+            raise
+        logger.warning(f"⚠️ Gemini enrichment failed, saving the local report only: {e}")
+        markdown_text = report
+        enriched = False
+
+    try:
+        _save_markdown(markdown_text, user_prefix, md_filename)
+    except Exception as e:
+        logger.error(f"❌ Streaming analysis failed: {e}")
+        publish_live_event(job_id, {"type": "error", "message": str(e)})
+        raise
+
+    logger.info(f"✅ Streamed analysis saved: {user_prefix}{md_filename}")
+    publish_live_event(job_id, {"type": "done", "filename": md_filename, "analysis": markdown_text,
+                                "enriched": enriched})
+    return {"analysis": markdown_text, "filename": md_filename, "enriched": enriched}
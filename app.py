@@ -1,17 +1,30 @@
 import os
 import sys
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from intelligent_test_analysis import analyze_jtl
+from intelligent_test_analysis import analyze_jtl, aggregate_s3_jtl, ANALYSIS_ENRICH
+from jtl_timeline import TIMELINE_WINDOWS, DEFAULT_WINDOW_SECONDS
 from run_test import run_jmeter_test
-from generate_test_plan import generate_jmeter_test_plan
-from datetime import datetime
+from run_scheduler import RunRejected
+from sharding import MAX_NODES
+from jobs import register_job, get_job_owner, get_job, job_status, job_failed
+from live_metrics import stream_live_events, acquire_stream_slot, release_stream_slot, SSE_RETRY_AFTER_SECONDS
+from tasks.tasks import generate_test_plan_async
+from generate_test_plan import build_test_plan, quick_test_plan
+from plan_library import library_stats, clear_user_library
+from gemini_cache import cache_stats
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from users.auth import auth_bp
+from users.models import find_user
+from users.licence_utils import get_license_info
 from email_utils import send_email
 from users import init_jwt
-from s3_utils import s3, BUCKET_NAME, download_file_from_s3, upload_file_to_s3, generate_presigned_url
+from s3_utils import download_file_from_s3, upload_file_to_s3, generate_presigned_url, s3_object_exists
+from jtl_reader import parquet_filename
+from jtl_aggregator import aggregates_filename, load_aggregates
+from container_telemetry import RunTelemetry, telemetry_filename
+from file_index import list_files as list_indexed_files, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 import tempfile
 from users import limiter
 from payments.routes import payments_bp
@@ -24,6 +37,20 @@ def get_user_prefix():
     return f"uploads/{get_jwt_identity()}/"
 
 
+def parse_flag(value, default=False):
+    """A JSON boolean, or "true"/"false", "1"/"0", "yes"/"no"; None for anything else."""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("1", "true", "yes"):
+        return True
+    if text in ("0", "false", "no"):
+        return False
+    return None
+
+
 # ---------- Logging ----------
 logging.basicConfig(
     level=logging.INFO,
@@ -60,22 +87,34 @@ def list_files():
         if file_type not in ["jmx", "jtl", "md"]:
             return jsonify({"error": "Invalid file type requested. Must be 'jmx', 'jtl', or 'md'."}), 400
 
-        # List only objects under 'uploads/' folder
         user_prefix = get_user_prefix()
-        response = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=user_prefix)
-
-        if "Contents" not in response:
-            return jsonify([])  # No files found
-
-        # Extract files with the requested extension
-        matching_files = [
-            obj["Key"].replace(user_prefix, "")  # strip the user-specific prefix for response
-            for obj in response.get("Contents", [])
-            if obj["Key"].endswith(f".{file_type}")
-        ]
-
-        return jsonify(matching_files)
-
+        refresh = request.args.get("refresh", "false").lower() == "true"
+
+        # Paginated listing with metadata when any paging/sorting option is given
+        if any(arg in request.args for arg in ("limit", "cursor", "sort", "order")):
+            page, next_cursor = list_indexed_files(
+                user_prefix,
+                file_type,
+                sort=request.args.get("sort", "date"),
+                order=request.args.get("order", "desc"),
+                limit=request.args.get("limit", DEFAULT_PAGE_SIZE, type=int),
+                cursor=request.args.get("cursor"),
+                refresh=refresh,
+            )
+            return jsonify({"files": page, "next_cursor": next_cursor})
+
+        # Plain list of names, as before, but no longer cut off at 1000 keys
+        names, cursor = [], None
+        while True:
+            page, cursor = list_indexed_files(user_prefix, file_type, sort="name", order="asc",
+                                              limit=MAX_PAGE_SIZE, cursor=cursor, refresh=refresh)
+            names.extend(doc["name"] for doc in page)
+            refresh = False
+            if cursor is None:
+                return jsonify(names)
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -88,43 +127,131 @@ def run_test(test_filename):
         if not test_filename.endswith(".jmx"):
             return jsonify({'status': 'error', 'message': 'Invalid test file format. Must be .jmx'}), 400
 
-        # Download the .jmx test file from S3 to a temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jmx") as temp_jmx:
-            local_jmx_path = temp_jmx.name
-
-        user_prefix = get_user_prefix()
-        download_file_from_s3(f"{user_prefix}{test_filename}", local_jmx_path)
-        logger.info(f"📥 Downloaded {test_filename} from S3")
-
-        # Create temp file path for .jtl result
-        timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
-        result_filename = f"test_plan_{timestamp}.jtl"
-        local_result_path = os.path.join(tempfile.gettempdir(), result_filename)
+        # Optional distributed mode: number of runner containers to shard the load over
+        nodes = (request.get_json(silent=True) or {}).get("nodes", 1)
+        if not isinstance(nodes, int) or not 1 <= nodes <= MAX_NODES:
+            return jsonify({'status': 'error', 'message': f'nodes must be an integer between 1 and {MAX_NODES}'}), 400
 
-        # Run JMeter with the downloaded .jmx and capture summary
-        summary_output = _run_jmeter_internal(local_jmx_path, local_result_path)
-        logger.info(f"✅ JMeter run complete. Result: {local_result_path}")
+        # Paid licences are admitted ahead of trial ones when the host is busy
+        user = find_user(get_jwt_identity())
+        license_type = get_license_info(user)["license"] if user else "expired"
 
-        # Upload the result file to S3
-        upload_file_to_s3(local_result_path, f"{user_prefix}{result_filename}")
-        logger.info(f"☁️ Uploaded result to S3: uploads/{result_filename}")
+        # Queue the run; download, execution, upload and cleanup happen in the Celery job
+        try:
+            job_id = run_jmeter_test(get_user_prefix(), test_filename, nodes,
+                                     user=get_jwt_identity(), license_type=license_type)
+        except RunRejected as e:
+            return jsonify({'status': 'error', 'message': str(e)}), e.status_code
 
-        # Clean up temp files
-        os.remove(local_jmx_path)
-        os.remove(local_result_path)
+        register_job(job_id, get_jwt_identity())
+        logger.info(f"🧾 Queued JMeter run for {test_filename}: job {job_id}")
 
         return jsonify({
-            "status": "success",
-            "message": "JMeter test executed.",
-            "result_file": result_filename,
-            "summary_output": summary_output  # 👈 Previewable on frontend
-        })
+            "status": "queued",
+            "message": "JMeter test queued.",
+            "job_id": job_id
+        }), 202
 
     except Exception as e:
         logger.error(f"Run test error: {str(e)}")
         return jsonify({'status': 'error', 'message': f'Failed to run test: {str(e)}'}), 500
 
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+@jwt_required()
+def get_job_status(job_id):
+    try:
+        if get_job_owner(job_id) != get_jwt_identity():
+            return jsonify({"status": "error", "message": "Job not found."}), 404
+
+        return jsonify(job_status(job_id))
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Job status error: {str(e)}"}), 500
+
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+@jwt_required()
+def get_job_result(job_id):
+    try:
+        if get_job_owner(job_id) != get_jwt_identity():
+            return jsonify({"status": "error", "message": "Job not found."}), 404
+
+        job = get_job(job_id)
+        if job_failed(job):
+            return jsonify(job.result), 500
+        if job.state == "SUCCESS":
+            return jsonify(job.result)
+        if job.state == "FAILURE":
+            return jsonify({"status": "error", "message": f"Job failed: {job.result}"}), 500
+        return jsonify(job_status(job_id)), 202
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Job result error: {str(e)}"}), 500
+
+
+@app.route("/jobs/<job_id>/stream", methods=["GET"])
+@jwt_required()
+def stream_job(job_id):
+    if get_job_owner(job_id) != get_jwt_identity():
+        return jsonify({"status": "error", "message": "Job not found."}), 404
+
+    # A stream holds a worker thread until the job ends; refuse rather than starve other requests
+    if not acquire_stream_slot():
+        response = jsonify({"status": "error", "message": "Too many live streams; poll /jobs/<job_id> instead."})
+        response.headers["Retry-After"] = str(SSE_RETRY_AFTER_SECONDS)
+        return response, 429
+
+    # Server-Sent Events: live summariser metrics relayed from Redis pub/sub
+    response = Response(
+        stream_with_context(stream_live_events(job_id, lambda: get_job(job_id).ready())),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    response.call_on_close(release_stream_slot)
+    return response
+
+
+def _fetch_aggregates(user_prefix, jtl_filename, work_dir, window_seconds):
+    """Aggregates saved by the live tailer, if present and built with the requested window."""
+    aggregates_key = f"{user_prefix}{aggregates_filename(jtl_filename)}"
+    if not s3_object_exists(aggregates_key):
+        return None
+
+    local_path = os.path.join(work_dir, aggregates_filename(jtl_filename))
+    if not download_file_from_s3(aggregates_key, local_path):
+        return None
+
+    aggregator, timeline = load_aggregates(local_path)
+    if timeline is None or timeline.window_seconds != window_seconds:
+        return None
+    return aggregator, timeline
+
+
+def _fetch_telemetry(user_prefix, jtl_filename, work_dir):
+    """Load generator telemetry recorded during the run, if present."""
+    telemetry_key = f"{user_prefix}{telemetry_filename(jtl_filename)}"
+    if not s3_object_exists(telemetry_key):
+        return None
+
+    local_path = os.path.join(work_dir, telemetry_filename(jtl_filename))
+    if not download_file_from_s3(telemetry_key, local_path):
+        return None
+    return RunTelemetry.load(local_path)
+
+
+def _fetch_parquet(user_prefix, jtl_filename, work_dir):
+    """Download the Parquet copy of a result, if one was written."""
+    parquet_key = f"{user_prefix}{parquet_filename(jtl_filename)}"
+    if not s3_object_exists(parquet_key):
+        return None
+
+    local_parquet_path = os.path.join(work_dir, parquet_filename(jtl_filename))
+    if not download_file_from_s3(parquet_key, local_parquet_path):
+        return None
+    return local_parquet_path
+
+
 @app.route("/analyzeJTL", methods=["POST"])
 @limiter.limit("5/minute")
 @jwt_required()
@@ -136,25 +263,56 @@ def analyze_jtl_api():
         if not jtl_filename or not jtl_filename.endswith(".jtl"):
             return jsonify({"error": "Invalid or missing .jtl filename"}), 400
 
-        # Step 1: Download .jtl file from S3 to temp location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jtl") as temp_jtl_file:
-            local_jtl_path = temp_jtl_file.name
-        user_prefix = get_user_prefix()
-        download_file_from_s3(f"{user_prefix}{jtl_filename}", local_jtl_path)
+        # bool("false") is True: parse flags explicitly
+        stream = parse_flag(data.get("stream"))
+        if stream is None:
+            return jsonify({"error": "stream must be a boolean."}), 400
+        enrich = parse_flag(data.get("enrich"), ANALYSIS_ENRICH)
+        if enrich is None:
+            return jsonify({"error": "enrich must be a boolean."}), 400
+        sla = data.get("sla") or {}
+        if not isinstance(sla, dict) or not all(
+            isinstance(sla.get(k, 0), (int, float)) and sla.get(k, 0) >= 0 for k in ("p95_ms", "error_rate")
+        ):
+            return jsonify({"error": "sla must be an object with non-negative p95_ms and error_rate."}), 400
+        window_seconds = data.get("window", DEFAULT_WINDOW_SECONDS)
+        if window_seconds not in TIMELINE_WINDOWS:
+            return jsonify({"error": f"Invalid timeline window. Must be one of {list(TIMELINE_WINDOWS)} seconds."}), 400
 
-        # Step 2: Run analysis and generate .md file in temp dir
+        user_prefix = get_user_prefix()
         with tempfile.TemporaryDirectory() as temp_analysis_dir:
-            result = analyze_jtl(local_jtl_path, temp_analysis_dir)
-
-            # Step 3: Upload analysis file to S3
+            # Step 1: Use the aggregates computed live during the run, else the Parquet copy,
+            # else read the raw .jtl straight from S3 into pandas
+            aggregates = _fetch_aggregates(user_prefix, jtl_filename, temp_analysis_dir, window_seconds)
+            local_jtl_path = None
+            if aggregates is None:
+                local_jtl_path = _fetch_parquet(user_prefix, jtl_filename, temp_analysis_dir)
+            if aggregates is None and local_jtl_path is None:
+                aggregates = aggregate_s3_jtl(f"{user_prefix}{jtl_filename}", window_seconds)
+                if isinstance(aggregates, dict):
+                    return jsonify(aggregates)
+
+            telemetry = _fetch_telemetry(user_prefix, jtl_filename, temp_analysis_dir)
+
+            # Step 2: Run analysis and generate .md file in temp dir
+            result = analyze_jtl(local_jtl_path, temp_analysis_dir, window_seconds, aggregates, telemetry,
+                                 stream=stream, user_prefix=user_prefix, enrich=enrich, sla=sla)
+
+            # Step 3: Upload analysis file to S3 (a streaming job uploads it when Gemini finishes)
             md_filename = result.get("filename")
-            if md_filename:
+            if md_filename and result.get("status") != "streaming":
                 md_path = os.path.join(temp_analysis_dir, md_filename)
                 upload_file_to_s3(md_path, f"{user_prefix}{md_filename}")
 
-        # Step 4: Clean up
-        os.remove(local_jtl_path)
+            timeline_filename = result.get("timeline_filename")
+            if timeline_filename:
+                timeline_path = os.path.join(temp_analysis_dir, timeline_filename)
+                upload_file_to_s3(timeline_path, f"{user_prefix}{timeline_filename}")
 
+        if result.get("status") == "streaming":
+            # The local report is in the response; Gemini's insights arrive on /jobs/<job_id>/stream
+            register_job(result["job_id"], get_jwt_identity())
+            return jsonify(result), 202
         return jsonify(result)
 
     except Exception as e:
@@ -213,17 +371,59 @@ def generate_test_plan_api():
     try:
         data = request.json
         prompt = data.get("prompt")
+        spec = data.get("spec")
+
+        # A structured spec is built locally in milliseconds; no job needed
+        if isinstance(spec, dict):
+            result, code = build_test_plan(spec, get_jwt_identity())
+            return jsonify(result), code
 
         if not prompt:
-            return jsonify({"status": "error", "message": "Prompt is missing."}), 400
+            return jsonify({"status": "error", "message": "Prompt or spec is missing."}), 400
+
+        # Simple prompts come from a template, familiar ones from the plan library
+        quick = quick_test_plan(prompt, get_jwt_identity())
+        if quick is not None:
+            result, code = quick
+            return jsonify(result), code
 
-        result, code = generate_jmeter_test_plan(prompt)
-        return jsonify(result), code
+        # Candidates are generated and validated by a job on the gemini queue
+        task = generate_test_plan_async.delay(prompt, get_jwt_identity())
+        register_job(task.id, get_jwt_identity())
+        return jsonify({"status": "queued", "job_id": task.id}), 202
 
     except Exception as e:
         return jsonify({"status": "error", "message": f"Failed to generate test plan: {str(e)}"}), 500
 
 
+@app.route("/plan-library/stats", methods=["GET"])
+@jwt_required()
+def plan_library_stats():
+    try:
+        return jsonify(library_stats(get_jwt_identity()))
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Plan library error: {str(e)}"}), 500
+
+
+@app.route("/gemini-cache/stats", methods=["GET"])
+@jwt_required()
+def gemini_cache_stats():
+    try:
+        return jsonify(cache_stats())
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Gemini cache error: {str(e)}"}), 500
+
+
+@app.route("/plan-library", methods=["DELETE"])
+@jwt_required()
+def clear_plan_library():
+    try:
+        removed = clear_user_library(get_jwt_identity())
+        return jsonify({"status": "success", "removed": removed})
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Plan library error: {str(e)}"}), 500
+
+
 @app.route('/download/<filename>', methods=['GET'])
 @jwt_required()
 def universal_download(filename):
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_SUFFIX = ".telemetry.json"
+
+# A generator counts as saturated above these fractions of its limits...
+CPU_SATURATION = float(os.getenv("TELEMETRY_CPU_SATURATION", 0.9))
+MEMORY_SATURATION = float(os.getenv("TELEMETRY_MEMORY_SATURATION", 0.9))
+THROTTLE_SATURATION = float(os.getenv("TELEMETRY_THROTTLE_SATURATION", 0.2))
+
+# ...for at least this long; shorter blips are ignored
+MIN_BOTTLENECK_SECONDS = float(os.getenv("TELEMETRY_MIN_BOTTLENECK_SECONDS", 5))
+
+# Flagged samples further apart than this start a new interval
+BOTTLENECK_GAP_MS = 3000
+
+FIELDS = ("ts", "node", "cpu_pct", "mem_mb", "mem_pct", "rx_kbps", "tx_kbps", "throttled_pct")
+
+
+def telemetry_filename(jtl_filename):
+    """Name of the resource telemetry stored next to a .jtl."""
+    return os.path.splitext(jtl_filename)[0] + TELEMETRY_SUFFIX
+
+
+def _network_totals(stats):
+    networks = stats.get("networks") or {}
+    return (sum(n.get("rx_bytes", 0) for n in networks.values()),
+            sum(n.get("tx_bytes", 0) for n in networks.values()))
+
+
+def parse_stats(stats, cpu_limit, previous=None):
+    """
+    Telemetry sample from a Docker stats frame, plus the network totals
+    to pass as `previous` with the next frame. The sample is None for the
+    first frame, which has no CPU baseline yet.
+
+    CPU is reported as a percentage of the container's CPU limit and
+    memory excludes the page cache.
+    """
+    now = time.time()
+    rx, tx = _network_totals(stats)
+    totals = {"time": now, "rx": rx, "tx": tx}
+
+    cpu, precpu = stats.get("cpu_stats") or {}, stats.get("precpu_stats") or {}
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    if not precpu.get("system_cpu_usage") or system_delta <= 0:
+        return None, totals
+
+    online_cpus = cpu.get("online_cpus") or len(cpu.get("cpu_usage", {}).get("percpu_usage") or []) or 1
+    cpu_delta = cpu["cpu_usage"]["total_usage"] - precpu.get("cpu_usage", {}).get("total_usage", 0)
+    cores = cpu_delta / system_delta * online_cpus
+
+    memory = stats.get("memory_stats") or {}
+    memory_detail = memory.get("stats") or {}
+    # cgroup v2 reports inactive_file, v1 reports cache
+    used = memory.get("usage", 0) - memory_detail.get("inactive_file", memory_detail.get("cache", 0))
+    limit = memory.get("limit") or 0
+
+    throttling, prethrottling = cpu.get("throttling_data") or {}, precpu.get("throttling_data") or {}
+    periods = throttling.get("periods", 0) - prethrottling.get("periods", 0)
+    throttled = throttling.get("throttled_periods", 0) - prethrottling.get("throttled_periods", 0)
+
+    rx_kbps = tx_kbps = 0.0
+    if previous is not None and now > previous["time"]:
+        elapsed = now - previous["time"]
+        rx_kbps = max(rx - previous["rx"], 0) / 1024 / elapsed
+        tx_kbps = max(tx - previous["tx"], 0) / 1024 / elapsed
+
+    sample = {
+        "ts": int(now * 1000),
+        "cpu_pct": round(cores / (cpu_limit or online_cpus) * 100, 1),
+        "mem_mb": round(used / (1024 * 1024), 1),
+        "mem_pct": round(used / limit * 100, 1) if limit else None,
+        "rx_kbps": round(rx_kbps, 1),
+        "tx_kbps": round(tx_kbps, 1),
+        "throttled_pct": round(throttled / periods * 100, 1) if periods > 0 else 0.0,
+    }
+    return sample, totals
+
+
+class _ContainerSampler(threading.Thread):
+    """Follows one container's stats stream until stopped or the container exits."""
+
+    def __init__(self, telemetry, runtime, container_id, node):
+        super().__init__(name=f"telemetry-{container_id[:12]}", daemon=True)
+        self.telemetry = telemetry
+        self.runtime = runtime
+        self.container_id = container_id
+        self.node = node
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            nano_cpus = self.runtime.inspect(self.container_id)["HostConfig"].get("NanoCpus") or 0
+            previous = None
+            for stats in self.runtime.stats(self.container_id, stream=True, decode=True):
+                if self._stop_event.is_set():
+                    break
+                sample, previous = parse_stats(stats, nano_cpus / 1e9, previous)
+                if sample is not None:
+                    self.telemetry.add(dict(sample, node=self.node))
+        except Exception as e:
+            # The container going away mid-read ends the stream; never fail the run over telemetry
+            if not self._stop_event.is_set():
+                logger.warning(f"⚠️ Telemetry for container {self.container_id[:12]} stopped: {e}")
+
+    def stop(self, timeout=5):
+        # The stream only yields about once a second, so this returns quickly
+        self._stop_event.set()
+        self.join(timeout)
+
+
+class RunTelemetry:
+    """
+    CPU, memory, network and throttling samples of the runner containers
+    of one test run (one per shard for distributed runs), saved as a
+    compact columnar time series next to the .jtl.
+    """
+
+    def __init__(self, samples=None):
+        self.samples = samples or []
+        self._lock = threading.Lock()
+
+    def add(self, sample):
+        with self._lock:
+            self.samples.append(sample)
+
+    def watch(self, runtime, container_id, node=1):
+        """Start sampling a container; call `.stop()` on the result when the run ends."""
+        sampler = _ContainerSampler(self, runtime, container_id, node)
+        sampler.start()
+        return sampler
+
+    def to_columns(self):
+        with self._lock:
+            samples = sorted(self.samples, key=lambda s: (s["ts"], s["node"]))
+        return {field: [s[field] for s in samples] for field in FIELDS}
+
+    def save(self, output_path):
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump({"columns": self.to_columns()}, f, separators=(",", ":"))
+        logger.info(f"📈 Telemetry saved: {output_path} ({len(self.samples)} samples)")
+        return output_path
+
+    @classmethod
+    def load(cls, input_path):
+        with open(input_path, encoding="utf-8") as f:
+            columns = json.load(f)["columns"]
+        rows = zip(*(columns[field] for field in FIELDS))
+        return cls([dict(zip(FIELDS, row)) for row in rows])
+
+    def bottlenecks(self):
+        """
+        Intervals where a load generator itself was saturated, per node:
+        CPU or memory near their limits, or CPU heavily throttled. Latency
+        measured in these intervals reflects the generator, not the system
+        under test.
+        """
+        intervals = []
+        for node in sorted({s["node"] for s in self.samples}):
+            current = None
+            for sample in sorted((s for s in self.samples if s["node"] == node), key=lambda s: s["ts"]):
+                reasons = _saturation_reasons(sample)
+                if reasons and current and sample["ts"] - current["end"] <= BOTTLENECK_GAP_MS:
+                    current["end"] = sample["ts"]
+                    current["reasons"].update(reasons)
+                    current["peak_cpu_pct"] = max(current["peak_cpu_pct"], sample["cpu_pct"])
+                    current["peak_mem_pct"] = max(current["peak_mem_pct"], sample["mem_pct"] or 0)
+                elif reasons:
+                    current = {"node": node, "start": sample["ts"], "end": sample["ts"], "reasons": set(reasons),
+                               "peak_cpu_pct": sample["cpu_pct"], "peak_mem_pct": sample["mem_pct"] or 0}
+                    intervals.append(current)
+        return [
+            {**interval, "reasons": sorted(interval["reasons"]),
+             "duration_seconds": round((interval["end"] - interval["start"]) / 1000 + 1, 1)}
+            for interval in intervals
+            if (interval["end"] - interval["start"]) / 1000 + 1 >= MIN_BOTTLENECK_SECONDS
+        ]
+
+
+def _saturation_reasons(sample):
+    reasons = []
+    if sample["cpu_pct"] >= CPU_SATURATION * 100:
+        reasons.append("cpu")
+    if sample["mem_pct"] is not None and sample["mem_pct"] >= MEMORY_SATURATION * 100:
+        reasons.append("memory")
+    if sample["throttled_pct"] >= THROTTLE_SATURATION * 100:
+        reasons.append("cpu_throttling")
+    return reasons
+
+
+def format_bottlenecks(bottlenecks):
+    """Markdown list of saturated generator intervals (UTC)."""
+    def clock(ms):
+        return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%H:%M:%S")
+
+    return "\n".join(
+        f"- Node {b['node']}: {clock(b['start'])}–{clock(b['end'])} UTC ({b['duration_seconds']}s), "
+        f"{', '.join(b['reasons'])}; peak CPU `{b['peak_cpu_pct']}%`, peak memory `{b['peak_mem_pct']}%`"
+        for b in bottlenecks
+    )
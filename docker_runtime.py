@@ -0,0 +1,150 @@
+import os
+import time
+import logging
+import threading
+import docker
+from requests.exceptions import ConnectionError as DockerConnectionError
+from metrics_log import register_metrics
+
+logger = logging.getLogger(__name__)
+
+# HTTP connections kept open to the Docker daemon per process
+DOCKER_POOL_SIZE = int(os.getenv("DOCKER_POOL_SIZE", 10))
+
+# Non-streaming calls slower than this are logged
+DOCKER_SLOW_CALL_SECONDS = float(os.getenv("DOCKER_SLOW_CALL_SECONDS", 2))
+
+# Long-running by design; not reported as slow
+LONG_CALLS = {"wait", "exec_start", "logs", "stats"}
+
+
+class DockerRuntime:
+    """
+    Process-wide Docker access for the web and jmeter worker processes.
+
+    Holds one pooled client (created lazily, thread-safe) instead of a
+    `docker.from_env()` per run, reconnects after the daemon restarts and
+    records per-call latency for every operation. Calls take container ids
+    and go through the current client, so objects created before a
+    reconnect keep working.
+    """
+
+    def __init__(self, pool_size=DOCKER_POOL_SIZE):
+        self.pool_size = pool_size
+        self._client = None
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = docker.from_env(max_pool_size=self.pool_size)
+                logger.info("🐳 Docker client connected.")
+            return self._client
+
+    def _reconnect(self):
+        with self._lock:
+            if self._client is not None:
+                try:
+                    self._client.close()
+                except Exception:
+                    pass
+            self._client = None
+        logger.warning("🔌 Lost connection to the Docker daemon; reconnecting.")
+
+    def _record(self, op, seconds, failed):
+        with self._lock:
+            m = self._metrics.setdefault(op, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            m["calls"] += 1
+            m["errors"] += int(failed)
+            m["total_ms"] += seconds * 1000
+            m["max_ms"] = max(m["max_ms"], seconds * 1000)
+        if op not in LONG_CALLS and seconds > DOCKER_SLOW_CALL_SECONDS:
+            logger.warning(f"🐢 Slow Docker call '{op}': {seconds:.2f}s")
+
+    def call(self, op, fn, idempotent=True):
+        """
+        Run `fn(client)` with latency instrumentation.
+
+        On a lost daemon connection the client is rebuilt; idempotent calls
+        are retried once, others (e.g. creating a container) are not, since
+        the daemon may already have acted on them.
+        """
+        attempts = 2 if idempotent else 1
+        for attempt in range(attempts):
+            start = time.perf_counter()
+            try:
+                result = fn(self.client)
+                self._record(op, time.perf_counter() - start, False)
+                return result
+            except DockerConnectionError:
+                self._record(op, time.perf_counter() - start, True)
+                self._reconnect()
+                if attempt == attempts - 1:
+                    raise
+            except Exception:
+                self._record(op, time.perf_counter() - start, True)
+                raise
+
+    def run(self, **kwargs):
+        return self.call("run", lambda c: c.containers.run(**kwargs), idempotent=False)
+
+    def wait(self, container_id):
+        return self.call("wait", lambda c: c.api.wait(container_id))
+
+    def logs(self, container_id, **kwargs):
+        return self.call("logs", lambda c: c.api.logs(container_id, **kwargs))
+
+    def stats(self, container_id, **kwargs):
+        return self.call("stats", lambda c: c.api.stats(container_id, **kwargs))
+
+    def inspect(self, container_id):
+        return self.call("inspect", lambda c: c.api.inspect_container(container_id))
+
+    def remove(self, container_id):
+        return self.call("remove", lambda c: c.api.remove_container(container_id, force=True))
+
+    def list_containers(self, **kwargs):
+        return self.call("list", lambda c: c.containers.list(**kwargs))
+
+    def exec_create(self, container_id, cmd, **kwargs):
+        return self.call("exec_create", lambda c: c.api.exec_create(container_id, cmd, **kwargs)["Id"],
+                         idempotent=False)
+
+    def exec_start(self, exec_id, **kwargs):
+        return self.call("exec_start", lambda c: c.api.exec_start(exec_id, **kwargs), idempotent=False)
+
+    def exec_inspect(self, exec_id):
+        return self.call("exec_inspect", lambda c: c.api.exec_inspect(exec_id))
+
+    def create_network(self, name, **kwargs):
+        return self.call("create_network", lambda c: c.networks.create(name, **kwargs), idempotent=False)
+
+    def remove_network(self, network_id):
+        return self.call("remove_network", lambda c: c.api.remove_network(network_id))
+
+    def info(self):
+        return self.call("info", lambda c: c.info())
+
+    def metrics(self):
+        """Per-operation call counts, errors and latency (ms)."""
+        with self._lock:
+            return {
+                op: {**m, "avg_ms": round(m["total_ms"] / m["calls"], 2), "total_ms": round(m["total_ms"], 2),
+                     "max_ms": round(m["max_ms"], 2)}
+                for op, m in self._metrics.items()
+            }
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_docker_runtime():
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = DockerRuntime()
+            register_metrics("docker", _runtime.metrics)
+    return _runtime
@@ -0,0 +1,153 @@
+import os
+import json
+import base64
+import logging
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from users.models import db
+from s3_utils import s3, BUCKET_NAME
+
+logger = logging.getLogger(__name__)
+
+files = db["files"]
+file_index_state = db["file_index_state"]
+
+files.create_index([("prefix", ASCENDING), ("name", ASCENDING)], unique=True)
+files.create_index([("prefix", ASCENDING), ("type", ASCENDING), ("last_modified", DESCENDING), ("name", ASCENDING)])
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# A prefix is re-listed from S3 this often, to pick up writes made outside the app
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("FILE_INDEX_RECONCILE_SECONDS", 24 * 3600))
+
+SORT_FIELDS = {"date": "last_modified", "name": "name"}
+
+
+def _split_key(s3_key):
+    prefix, _, name = s3_key.rpartition("/")
+    return f"{prefix}/" if prefix else "", name
+
+
+def file_type(name):
+    return os.path.splitext(name)[1].lstrip(".").lower()
+
+
+def _document(s3_key, size, etag, last_modified):
+    prefix, name = _split_key(s3_key)
+    return {
+        "prefix": prefix,
+        "name": name,
+        "type": file_type(name),
+        "size": size,
+        "etag": etag.strip('"') if etag else None,
+        "last_modified": last_modified,
+    }
+
+
+def index_object(s3_key, size, etag, last_modified):
+    """Record (or refresh) one object in its user's index."""
+    doc = _document(s3_key, size, etag, last_modified)
+    files.update_one({"prefix": doc["prefix"], "name": doc["name"]}, {"$set": doc}, upsert=True)
+
+
+def remove_object(s3_key):
+    prefix, name = _split_key(s3_key)
+    files.delete_one({"prefix": prefix, "name": name})
+
+
+def reconcile(prefix):
+    """
+    Rebuild a prefix's index from a full, paginated S3 listing: objects
+    written outside the app are added and deleted ones dropped.
+    Returns the number of objects found.
+    """
+    seen = set()
+    operations = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=BUCKET_NAME, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            # Only direct children: the index is per folder, like the listing it replaces
+            if "/" in obj["Key"][len(prefix):]:
+                continue
+            doc = _document(obj["Key"], obj["Size"], obj.get("ETag"), obj["LastModified"])
+            seen.add(doc["name"])
+            operations.append(UpdateOne({"prefix": prefix, "name": doc["name"]}, {"$set": doc}, upsert=True))
+
+    if operations:
+        files.bulk_write(operations, ordered=False)
+    removed = files.delete_many({"prefix": prefix, "name": {"$nin": list(seen)}}).deleted_count
+    file_index_state.update_one(
+        {"prefix": prefix}, {"$set": {"reconciled_at": datetime.now(timezone.utc)}}, upsert=True
+    )
+    logger.info(f"🗂️ Reconciled file index for {prefix}: {len(seen)} objects, {removed} stale entries removed")
+    return len(seen)
+
+
+def _needs_reconcile(prefix):
+    state = file_index_state.find_one({"prefix": prefix})
+    if state is None:
+        return True
+    reconciled_at = state["reconciled_at"]
+    if reconciled_at.tzinfo is None:
+        reconciled_at = reconciled_at.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - reconciled_at).total_seconds() > RECONCILE_INTERVAL_SECONDS
+
+
+def _encode_cursor(doc, sort_field):
+    value = doc[sort_field]
+    if isinstance(value, datetime):
+        value = value.replace(tzinfo=value.tzinfo or timezone.utc).isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, doc["name"]]).encode()).decode()
+
+
+def _decode_cursor(cursor, sort_field):
+    try:
+        value, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort_field == "last_modified":
+            value = datetime.fromisoformat(value)
+        return value, name
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+
+def list_files(prefix, file_type=None, sort="date", order="desc", limit=DEFAULT_PAGE_SIZE, cursor=None,
+               refresh=False):
+    """
+    One page of a user's files from the index, as (files, next_cursor).
+
+    Pages are keyset-paginated on (sort field, name), so they stay stable
+    while files are added. The prefix is reconciled against S3 first if
+    it has never been indexed, is stale, or `refresh` is set.
+    """
+    if sort not in SORT_FIELDS or order not in ("asc", "desc"):
+        raise ValueError("sort must be 'date' or 'name' and order 'asc' or 'desc'.")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    if refresh or _needs_reconcile(prefix):
+        reconcile(prefix)
+
+    sort_field = SORT_FIELDS[sort]
+    direction = DESCENDING if order == "desc" else ASCENDING
+    query = {"prefix": prefix}
+    if file_type:
+        query["type"] = file_type
+    if cursor:
+        value, name = _decode_cursor(cursor, sort_field)
+        beyond = "$lt" if direction == DESCENDING else "$gt"
+        if sort_field == "name":
+            query["name"] = {beyond: name}
+        else:
+            query["$or"] = [{sort_field: {beyond: value}}, {sort_field: value, "name": {"$gt": name}}]
+
+    sort_keys = [(sort_field, direction)] + ([("name", ASCENDING)] if sort_field != "name" else [])
+    docs = list(files.find(query, {"_id": 0, "prefix": 0}).sort(sort_keys).limit(limit + 1))
+
+    next_cursor = _encode_cursor(docs[limit - 1], sort_field) if len(docs) > limit else None
+    page = []
+    for doc in docs[:limit]:
+        if isinstance(doc["last_modified"], datetime):
+            doc["last_modified"] = doc["last_modified"].replace(
+                tzinfo=doc["last_modified"].tzinfo or timezone.utc
+            ).isoformat()
+        page.append(doc)
+    return page, next_cursor
@@ -1,29 +1,71 @@
 import os
 from google import genai
+from gemini_cache import get_cached_response, cache_response
+from gemini_gateway import GeminiGateway
+from metrics_log import register_metrics
 
 # Set your API key here or use an environment variable
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 
 # Configure the client
 client = genai.Client(api_key=GEMINI_API_KEY)
 
-def generate_with_gemini(prompt):
+# Shared async gateway: connection reuse, concurrency and rate limits, in-flight dedup
+gateway = GeminiGateway(client)
+register_metrics("gemini_gateway", gateway.metrics)
+
+def generate_with_gemini(prompt, model=GEMINI_MODEL, use_cache=True):
     """
     Generate text from Gemini using a prompt.
 
+    Responses are cached in Redis keyed by a hash of (model, prompt), so a
+    byte-identical prompt is answered without calling the model.
+
     Args:
         prompt (str): Text prompt to send to Gemini.
         model (str): Model version (default: gemini-2.0-flash).
+        use_cache (bool): Look up and store the response in the cache.
 
     Returns:
         str: Generated text response.
     """
     try:
+        if use_cache:
+            cached = get_cached_response(model, prompt)
+            if cached is not None:
+                return cached
+
         print(prompt)
-        response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt
-    )
-        return response.text.strip() if hasattr(response, "text") else "❌ No text found in response."
+        text = gateway.generate(prompt, model)
+        if text is None:
+            return "❌ No text found in response."
+
+        if use_cache:
+            cache_response(model, prompt, text)
+        return text
     except Exception as e:
         return f"❌ Gemini error: {str(e)}"
+
+
+def stream_with_gemini(prompt, model=GEMINI_MODEL, use_cache=True):
+    """
+    Generate text from Gemini as it is produced, yielding text chunks.
+
+    A cached response is yielded as one chunk; a completed stream is
+    cached. Unlike generate_with_gemini, errors are raised, since part of
+    the response may already have been consumed.
+    """
+    if use_cache:
+        cached = get_cached_response(model, prompt)
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+    for text in gateway.stream(prompt, model):
+        parts.append(text)
+        yield text
+
+    if use_cache and parts:
+        cache_response(model, prompt, "".join(parts).strip())
@@ -0,0 +1,84 @@
+import os
+import time
+import hashlib
+import logging
+from redis.exceptions import RedisError
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CACHE_TTL", 7 * 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", 5000))
+
+CACHE_PREFIX = "gemini:cache:"
+INDEX_KEY = "gemini:cache-index"  # sorted set of entry hashes scored by last access (= expiry - TTL)
+HITS_KEY = "gemini:cache-hits"
+MISSES_KEY = "gemini:cache-misses"
+
+
+def cache_key(model, prompt):
+    """Content address of a request: sha256 over model and prompt."""
+    return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def get_cached_response(model, prompt):
+    """Return the cached response text, or None on a miss or if Redis is unavailable."""
+    key = cache_key(model, prompt)
+    try:
+        r = get_redis()
+        value = r.get(CACHE_PREFIX + key)
+        pipe = r.pipeline()
+        if value is None:
+            pipe.incr(MISSES_KEY)
+        else:
+            # Sliding expiry, so an entry expires exactly CACHE_TTL_SECONDS after its index score
+            pipe.incr(HITS_KEY)
+            pipe.expire(CACHE_PREFIX + key, CACHE_TTL_SECONDS)
+            pipe.zadd(INDEX_KEY, {key: time.time()})
+        pipe.execute()
+        return value
+    except RedisError as e:
+        logger.warning(f"⚠️ Gemini cache lookup failed: {e}")
+        return None
+
+
+def cache_response(model, prompt, text):
+    key = cache_key(model, prompt)
+    try:
+        r = get_redis()
+        pipe = r.pipeline()
+        pipe.setex(CACHE_PREFIX + key, CACHE_TTL_SECONDS, text)
+        pipe.zadd(INDEX_KEY, {key: time.time()})
+        pipe.execute()
+        _evict(r)
+    except RedisError as e:
+        logger.warning(f"⚠️ Gemini cache write failed: {e}")
+
+
+def _drop_expired(r):
+    """Forget index entries whose cached value Redis has already expired."""
+    r.zremrangebyscore(INDEX_KEY, 0, time.time() - CACHE_TTL_SECONDS)
+
+
+def _evict(r):
+    """Drop least recently used entries beyond CACHE_MAX_ENTRIES."""
+    _drop_expired(r)
+    overflow = r.zcard(INDEX_KEY) - CACHE_MAX_ENTRIES
+    if overflow > 0:
+        evicted = r.zpopmin(INDEX_KEY, overflow)
+        if evicted:
+            r.delete(*[CACHE_PREFIX + key for key, _ in evicted])
+            logger.info(f"🧹 Evicted {len(evicted)} Gemini cache entries")
+
+
+def cache_stats():
+    r = get_redis()
+    _drop_expired(r)
+    hits, misses, entries = r.pipeline().get(HITS_KEY).get(MISSES_KEY).zcard(INDEX_KEY).execute()
+    hits, misses = int(hits or 0), int(misses or 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "entries": entries,
+        "hit_rate": round(hits / (hits + misses) * 100, 2) if hits + misses else 0.0,
+    }
@@ -0,0 +1,263 @@
+import os
+import math
+import time
+import queue
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from gemini_cache import cache_key
+from latency_sketch import LatencySketch
+
+logger = logging.getLogger(__name__)
+
+# Upstream calls in flight at once per worker process
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 8))
+
+# Requests per minute per model; override per model as "model=rpm,model=rpm"
+GEMINI_DEFAULT_RPM = float(os.getenv("GEMINI_RPM", 60))
+GEMINI_RPM_OVERRIDES = {
+    model.strip(): float(rpm)
+    for model, _, rpm in (item.partition("=") for item in os.getenv("GEMINI_MODEL_RPM", "").split(",") if "=" in item)
+}
+
+# Seconds of rate a bucket can burst
+GEMINI_BURST_SECONDS = float(os.getenv("GEMINI_BURST_SECONDS", 5))
+
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 3))
+GEMINI_BACKOFF_SECONDS = float(os.getenv("GEMINI_BACKOFF_SECONDS", 2))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT", 120))
+
+THROUGHPUT_WINDOW_SECONDS = 60
+
+
+class TokenBucket:
+    """Per-model request budget; `acquire` sleeps until a token is available."""
+
+    def __init__(self, rpm, burst_seconds=GEMINI_BURST_SECONDS):
+        self.rate = rpm / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Take one token; returns the seconds spent waiting for it."""
+        waited = 0.0
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return waited
+            delay = (1 - self.tokens) / self.rate
+            waited += delay
+            await asyncio.sleep(delay)
+
+    def penalize(self, seconds):
+        """Push every caller back by `seconds` after the API reported a rate limit."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class _ModelMetrics:
+    __slots__ = ("requests", "deduplicated", "upstream_calls", "errors", "rate_limited",
+                 "throttled_seconds", "latency", "completed")
+
+    def __init__(self):
+        self.requests = 0
+        self.deduplicated = 0
+        self.upstream_calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.throttled_seconds = 0.0
+        self.latency = LatencySketch()
+        self.completed = deque()
+
+    def to_dict(self):
+        cutoff = time.monotonic() - THROUGHPUT_WINDOW_SECONDS
+        while self.completed and self.completed[0] < cutoff:
+            self.completed.popleft()
+        # An empty sketch (no calls yet) has NaN percentiles, which aren't valid JSON
+        latency = {name: round(value / 1000, 3) if not math.isnan(value) else None
+                   for name, value in self.latency.percentiles().items()}
+        return {
+            "requests": self.requests,
+            "deduplicated": self.deduplicated,
+            "upstream_calls": self.upstream_calls,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "throttled_seconds": round(self.throttled_seconds, 2),
+            "completed_last_minute": len(self.completed),
+            "latency_seconds": latency,
+        }
+
+
+def _is_rate_limited(error):
+    return getattr(error, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+
+class GeminiGateway:
+    """
+    Runs Gemini calls on one long-lived asyncio loop per process.
+
+    Callers on any thread (e.g. a threads-pool Celery worker) submit
+    prompts with `generate`; they share the client's async connection
+    pool, run up to `max_concurrency` at once, respect a token bucket
+    per model (backing off when the API answers 429), and identical
+    prompts already in flight share a single upstream call.
+    """
+
+    def __init__(self, client, max_concurrency=GEMINI_MAX_CONCURRENCY):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+        self._inflight = {}
+        self._buckets = {}
+        self._metrics = {}
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="gemini-gateway", daemon=True).start()
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._loop = loop
+        return self._loop
+
+    def _model_state(self, model):
+        if model not in self._buckets:
+            self._buckets[model] = TokenBucket(GEMINI_RPM_OVERRIDES.get(model, GEMINI_DEFAULT_RPM))
+            self._metrics[model] = _ModelMetrics()
+        return self._buckets[model], self._metrics[model]
+
+    def generate(self, prompt, model, timeout=GEMINI_TIMEOUT_SECONDS):
+        """Blocking entry point: response text (None if the model returned none)."""
+        return self.submit(prompt, model).result(timeout)
+
+    def submit(self, prompt, model, dedupe=True):
+        """
+        Start a call and return its concurrent.futures.Future. Cancelling
+        the future cancels the upstream request; pass `dedupe=False` for
+        independent samples of the same prompt (e.g. speculative candidates).
+        """
+        return asyncio.run_coroutine_threadsafe(self.agenerate(prompt, model, dedupe), self._ensure_loop())
+
+    async def agenerate(self, prompt, model, dedupe=True):
+        _, metrics = self._model_state(model)
+        metrics.requests += 1
+        if not dedupe:
+            return await self._call(prompt, model)
+
+        key = cache_key(model, prompt)
+        task = self._inflight.get(key)
+        if task is not None:
+            metrics.deduplicated += 1
+        else:
+            task = asyncio.ensure_future(self._call(prompt, model))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one caller timing out doesn't cancel the call the others wait on
+        return await asyncio.shield(task)
+
+    async def _call(self, prompt, model):
+        bucket, metrics = self._model_state(model)
+        for attempt in range(GEMINI_MAX_RETRIES + 1):
+            metrics.throttled_seconds += await bucket.acquire()
+            async with self._semaphore:
+                metrics.upstream_calls += 1
+                start = time.perf_counter()
+                try:
+                    response = await self.client.aio.models.generate_content(model=model, contents=prompt)
+                except Exception as e:
+                    if _is_rate_limited(e) and attempt < GEMINI_MAX_RETRIES:
+                        metrics.rate_limited += 1
+                        delay = GEMINI_BACKOFF_SECONDS * 2 ** attempt * (1 + random.random() / 2)
+                        logger.warning(f"⏳ Gemini rate limit on {model}; backing off {delay:.1f}s")
+                        bucket.penalize(delay)
+                        continue
+                    metrics.errors += 1
+                    raise
+
+            metrics.latency.add([(time.perf_counter() - start) * 1000])
+            metrics.completed.append(time.monotonic())
+            text = getattr(response, "text", None)
+            return text.strip() if text else None
+
+    async def astream(self, prompt, model):
+        """
+        Yield the text chunks of a streamed response. Rate-limit retries
+        happen only before the first chunk; streams are never deduplicated.
+        """
+        bucket, metrics = self._model_state(model)
+        metrics.requests += 1
+        for attempt in range(GEMINI_MAX_RETRIES + 1):
+            metrics.throttled_seconds += await bucket.acquire()
+            async with self._semaphore:
+                metrics.upstream_calls += 1
+                start = time.perf_counter()
+                started = False
+                try:
+                    async for chunk in await self.client.aio.models.generate_content_stream(
+                        model=model, contents=prompt
+                    ):
+                        if chunk.text:
+                            started = True
+                            yield chunk.text
+                except Exception as e:
+                    if not started and _is_rate_limited(e) and attempt < GEMINI_MAX_RETRIES:
+                        metrics.rate_limited += 1
+                        delay = GEMINI_BACKOFF_SECONDS * 2 ** attempt * (1 + random.random() / 2)
+                        logger.warning(f"⏳ Gemini rate limit on {model}; backing off {delay:.1f}s")
+                        bucket.penalize(delay)
+                        continue
+                    metrics.errors += 1
+                    raise
+
+            metrics.latency.add([(time.perf_counter() - start) * 1000])
+            metrics.completed.append(time.monotonic())
+            return
+
+    def stream(self, prompt, model, timeout=GEMINI_TIMEOUT_SECONDS):
+        """Blocking generator over a streamed response; `timeout` bounds the wait for each chunk."""
+        chunks = queue.Queue()
+
+        async def pump():
+            try:
+                async for text in self.astream(prompt, model):
+                    chunks.put(("chunk", text))
+                chunks.put(("done", None))
+            except Exception as e:
+                chunks.put(("error", e))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._ensure_loop())
+        try:
+            while True:
+                try:
+                    kind, value = chunks.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No Gemini output for {timeout:.0f}s.")
+                if kind == "error":
+                    raise value
+                if kind == "done":
+                    return
+                yield value
+        finally:
+            future.cancel()
+
+    def metrics(self):
+        """Per-model counters, calls completed in the last minute and latency percentiles (s)."""
+        if self._loop is None:
+            return {}
+
+        async def snapshot():
+            return {model: m.to_dict() for model, m in self._metrics.items()}
+
+        # Read on the loop thread, which owns the counters
+        return asyncio.run_coroutine_threadsafe(snapshot(), self._loop).result(5)
@@ -1,22 +1,28 @@
 import io
+import os
+import time
+import logging
+from concurrent.futures import as_completed, TimeoutError as FuturesTimeout
 from datetime import datetime
-import xml.etree.ElementTree as ET
 from s3_utils import upload_fileobj_to_s3  # assumes you've written this
-import traceback
-from tasks.tasks import generate_gemini_analysis_async
+from gemini import gateway, GEMINI_MODEL
+from gemini_cache import get_cached_response, cache_response
+from jmx_validator import validate_jmx, has_errors, format_diagnostics
+from jmx_builder import build_jmx, spec_from_prompt
+from plan_library import find_plan, remember_plan
+from run_planner import remember_plan_stats
 
-def is_valid_jmx(xml_content: str) -> bool:
-    try:
-        root = ET.fromstring(xml_content)
-        if root.tag != "jmeterTestPlan":
-            return False
+logger = logging.getLogger(__name__)
 
-        required_elements = ["TestPlan", "ThreadGroup", "HTTPSamplerProxy"]
-        xml_str = ET.tostring(root, encoding='unicode')
+# Candidates generated in parallel per round; the first valid one wins
+PLAN_CANDIDATES = int(os.getenv("PLAN_CANDIDATES", 3))
+# Rounds: the first from the description, the rest repair a rejected candidate
+PLAN_MAX_ROUNDS = int(os.getenv("PLAN_MAX_ROUNDS", 3))
+# Overall budget for one generation job
+PLAN_GENERATION_TIMEOUT = int(os.getenv("PLAN_GENERATION_TIMEOUT", 180))
 
-        return all(tag in xml_str for tag in required_elements)
-    except Exception:
-        return False
+def is_valid_jmx(xml_content: str) -> bool:
+    return not has_errors(validate_jmx(xml_content))
 
 def extract_xml_from_markdown(jmx_response: str) -> str:
     start = jmx_response.find("```xml")
@@ -25,39 +31,201 @@ def extract_xml_from_markdown(jmx_response: str) -> str:
         return jmx_response[start + 6:end].strip()
     return jmx_response.strip()
 
-def generate_jmeter_test_plan(prompt, user_email, attempts=0, max_attempts=10):
+def _generation_prompt(prompt):
+    return (
+        f"{prompt.strip()}\n\n"
+        "Now generate a valid Apache JMeter .jmx test plan XML file based on the above description.\n"
+        "- It must be valid for Apache JMeter 5.6.3.\n"
+        "- Return XML in markdown code block using ```xml ... ```.\n"
+        "- Do not return explanations or comments outside the XML block."
+    )
+
+def _repair_prompt(prompt, xml_content, diagnostics):
+    """Retry prompt that hands the rejected plan back with what is wrong with it."""
+    return (
+        f"{prompt.strip()}\n\n"
+        "This Apache JMeter 5.6.3 .jmx test plan was generated for the description above, "
+        "but it failed validation:\n"
+        f"{format_diagnostics(diagnostics)}\n\n"
+        f"```xml\n{xml_content}\n```\n\n"
+        "Fix these problems and return the complete corrected plan.\n"
+        "- Return XML in markdown code block using ```xml ... ```.\n"
+        "- Do not return explanations or comments outside the XML block."
+    )
+
+def _speculate(full_prompt, candidates, deadline):
+    """
+    Generate `candidates` plans in parallel and validate each as it lands.
+    Returns the XML of the first valid plan (or None), the
+    rejected (xml, diagnostics) pairs, and how many responses came back.
+    Outstanding calls are cancelled as soon as a plan is accepted.
+
+    An accepted response is cached, so a repeated prompt is answered from
+    the cache without calling Gemini. On a miss the first candidate shares
+    identical in-flight requests; the rest are independent samples.
+    """
+    cached = get_cached_response(GEMINI_MODEL, full_prompt)
+    if cached is not None:
+        xml_only = extract_xml_from_markdown(cached)
+        if not has_errors(validate_jmx(xml_only)):
+            return xml_only, [], 0
+
+    futures = [gateway.submit(full_prompt, GEMINI_MODEL, dedupe=index == 0) for index in range(candidates)]
+    rejected = []
+    completed = 0
+    try:
+        for future in as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+            completed += 1
+            try:
+                raw_response = future.result() or ""
+            except Exception as e:
+                logger.warning(f"⚠️ Plan candidate failed: {e}")
+                continue
+
+            xml_only = extract_xml_from_markdown(raw_response)
+            diagnostics = validate_jmx(xml_only)
+            if not has_errors(diagnostics):
+                cache_response(GEMINI_MODEL, full_prompt, raw_response)
+                return xml_only, rejected, completed
+            rejected.append((xml_only, diagnostics))
+    except FuturesTimeout:
+        logger.warning("⚠️ Plan generation round timed out.")
+    finally:
+        for future in futures:
+            future.cancel()
+    return None, rejected, completed
+
+def _repair_target(rejected):
+    """The rejected candidate most worth repairing: well-formed XML over a syntax error."""
+    parsed = [r for r in rejected if r[1][0]["code"] != "xml_syntax"]
+    return (parsed or rejected)[0]
+
+def _upload_plan(xml_content, user_email):
+    timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
+    jmx_filename = f"test_plan_{timestamp}.jmx"
+    s3_key = f"uploads/{user_email}/{jmx_filename}"
+
+    file_obj = io.BytesIO(xml_content.encode('utf-8'))
+    upload_fileobj_to_s3(file_obj, s3_key)
+    remember_plan_stats(s3_key, xml_content)
+    return jmx_filename
+
+def build_test_plan(spec, user_email):
+    """Build a plan from a structured jmx_builder spec and upload it; no LLM involved."""
+    start = time.monotonic()
     try:
-        if attempts >= max_attempts:
-            return {"status": "error", "message": f"Max retry limit of {max_attempts} reached."}, 500
+        xml_content = build_jmx(spec)
+    except (ValueError, TypeError, AttributeError) as e:
+        return {"status": "error", "message": f"Invalid test plan spec: {e}"}, 400
+
+    diagnostics = validate_jmx(xml_content)
+    if has_errors(diagnostics):
+        return {"status": "error", "message": f"Invalid test plan spec:\n{format_diagnostics(diagnostics)}"}, 400
 
-        full_prompt = (
-            f"{prompt.strip()}\n\n"
-            "Now generate a valid Apache JMeter .jmx test plan XML file based on the above description.\n"
-            "- It must be valid for Apache JMeter 5.6.3.\n"
-            "- Return XML in markdown code block using ```xml ... ```.\n"
-            "- Do not return explanations or comments outside the XML block."
-        )
+    return {
+        "status": "success",
+        "message": "Test plan generated and uploaded to S3.",
+        "jmx_filename": _upload_plan(xml_content, user_email),
+        "source": "template",
+        "attempts": 0,
+        "latency_seconds": round(time.monotonic() - start, 3),
+    }, 200
 
-        task = generate_gemini_analysis_async.delay(full_prompt)
-        raw_response = task.get(timeout=60)
-        xml_only = extract_xml_from_markdown(raw_response)
+def quick_test_plan(prompt, user_email):
+    """
+    A plan for the prompt without calling Gemini: built from a template
+    when the prompt is simple enough, else reused (and adapted) from the
+    user's plan library. Returns (result, http_status), or None.
+    """
+    spec = spec_from_prompt(prompt)
+    if spec is not None:
+        result, code = build_test_plan(spec, user_email)
+        if code == 200:
+            return result, code
+        logger.warning(f"⚠️ Template fast path failed: {result['message']}")
+
+    start = time.monotonic()
+    try:
+        found = find_plan(user_email, prompt)
+    except Exception as e:
+        logger.warning(f"⚠️ Plan library lookup failed: {e}")
+        return None
+    if found is None:
+        return None
 
-        if not is_valid_jmx(xml_only):
-            return generate_jmeter_test_plan(prompt, user_email, attempts + 1, max_attempts)
+    xml_content, similarity, adapted = found
+    return {
+        "status": "success",
+        "message": "Test plan generated and uploaded to S3.",
+        "jmx_filename": _upload_plan(xml_content, user_email),
+        "source": "library",
+        "similarity": similarity,
+        "adapted": adapted,
+        "attempts": 0,
+        "latency_seconds": round(time.monotonic() - start, 3),
+    }, 200
+
+def generate_jmeter_test_plan(prompt, user_email, candidates=PLAN_CANDIDATES, max_rounds=PLAN_MAX_ROUNDS,
+                              timeout=PLAN_GENERATION_TIMEOUT, skip_quick=False):
+    """
+    Generate a plan from a description and upload it under the user's prefix.
+
+    Simple prompts are built locally from a template, and prompts close
+    to one the user already generated reuse that plan from the library.
+    Anything else goes to Gemini: each round fans out `candidates`
+    parallel generations and takes the first that validates; if all are
+    rejected, the next round asks for a repair of one of them with its
+    diagnostics. Bounded by `max_rounds` and `timeout` seconds overall.
+    Accepted plans are added to the library. Returns (result, http_status).
+
+    Pass `skip_quick` when quick_test_plan has already missed for this
+    prompt (the queued job after /generate-test-plan tried it).
+    """
+    quick = quick_test_plan(prompt, user_email) if not skip_quick else None
+    if quick is not None:
+        return quick
+
+    start = time.monotonic()
+    deadline = start + timeout
+    attempts = 0
+    try:
+        accepted = None
+        rounds = 0
+        round_prompt = _generation_prompt(prompt)
+        while accepted is None and rounds < max_rounds and time.monotonic() < deadline:
+            rounds += 1
+            accepted, rejected, completed = _speculate(round_prompt, candidates, deadline)
+            attempts += completed
+            if accepted is not None:
+                break
+            if rejected:
+                xml_only, diagnostics = _repair_target(rejected)
+                logger.warning(f"⚠️ Round {rounds}: {len(rejected)} plans rejected, e.g.\n{format_diagnostics(diagnostics)}")
+                round_prompt = _repair_prompt(prompt, xml_only, diagnostics)
 
-        timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
-        jmx_filename = f"test_plan_{timestamp}.jmx"
-        s3_key = f"uploads/{user_email}/{jmx_filename}"
+        latency = round(time.monotonic() - start, 2)
+        if accepted is None:
+            return {
+                "status": "error",
+                "message": f"No valid test plan after {attempts} attempts in {latency}s.",
+                "attempts": attempts,
+                "latency_seconds": latency,
+            }, 500
 
-        file_obj = io.BytesIO(xml_only.encode('utf-8'))
-        upload_fileobj_to_s3(file_obj, s3_key)
+        try:
+            remember_plan(user_email, prompt, accepted)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not add plan to the library: {e}")
 
         return {
             "status": "success",
             "message": "Test plan generated and uploaded to S3.",
-            "jmx_filename": jmx_filename
+            "jmx_filename": _upload_plan(accepted, user_email),
+            "source": "gemini",
+            "attempts": attempts,
+            "latency_seconds": latency,
         }, 200
 
     except Exception as e:
-        print("❌ Error generating test plan:", traceback.format_exc())
-        return {"status": "error", "message": str(e)}, 500
+        logger.exception("❌ Error generating test plan")
+        return {"status": "error", "message": str(e), "attempts": attempts}, 500
@@ -1,8 +1,13 @@
-import pandas as pd
 import json
 import os
 import logging
-from tasks.tasks import generate_gemini_analysis_async
+from tasks.tasks import generate_gemini_analysis_async, stream_gemini_analysis_async
+from analysis_stream import clean_markdown
+from jtl_aggregator import aggregate_jtl, aggregate_jtl_stream
+from jtl_reader import read_jtl_columns, read_stream_columns
+from s3_utils import open_s3_stream
+from jtl_timeline import JTLTimeline, DEFAULT_WINDOW_SECONDS
+from local_analysis import SLA_P95_MS, SLA_ERROR_RATE, analyze, render_report, with_ai_insights
 from datetime import datetime
 
 # Configure logging
@@ -19,66 +24,161 @@ logger = logging.getLogger(__name__)
 # Get the base directory of the script
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
+# Gemini commentary on top of the rule-based report; requests can opt out
+ANALYSIS_ENRICH = os.getenv("ANALYSIS_ENRICH", "true").lower() == "true"
+GEMINI_ANALYSIS_TIMEOUT = int(os.getenv("GEMINI_ANALYSIS_TIMEOUT", 60))
 
 
 
-def analyze_jtl(file_path, output_folder):
+
+def _aggregate(read_columns, aggregate, window_seconds):
+    """Chunked pass over a JTL source; returns (aggregator, timeline) or an error dict."""
+    try:
+        columns = read_columns()
+    except Exception as e:
+        logger.error(f"❌ Failed to read JTL file: {e}")
+        return {"error": "Invalid JTL file format or unreadable."}
+
+    required_columns = {"label", "elapsed", "responseCode", "allThreads"}
+    if not required_columns.issubset(columns):
+        return {"error": f"Missing required columns: {required_columns - set(columns)}"}
+
+    # Per-window timeline is only possible when timestamps were saved
+    timeline = JTLTimeline(window_seconds) if "timeStamp" in columns else None
+
+    # Stream the data in chunks so memory stays flat on multi-GB soak tests
     try:
-        logger.info(f"📊 Starting analysis for {file_path}")
+        aggregator = aggregate(timeline)
+    except Exception as e:
+        logger.error(f"❌ Failed to read JTL file: {e}")
+        return {"error": "Invalid JTL file format or unreadable."}
+
+    return aggregator, timeline
 
-        try:
-            df = pd.read_csv(file_path)
-        except Exception as e:
-            logger.error(f"❌ Failed to read JTL file: {e}")
-            return {"error": "Invalid JTL file format or unreadable."}
 
-        required_columns = {"label", "elapsed", "responseCode", "allThreads"}
-        if not required_columns.issubset(df.columns):
-            return {"error": f"Missing required columns: {required_columns - set(df.columns)}"}
+def _aggregate_file(file_path, window_seconds):
+    """Aggregate a local JTL (or its Parquet copy)."""
+    return _aggregate(lambda: read_jtl_columns(file_path),
+                      lambda timeline: aggregate_jtl(file_path, timeline=timeline), window_seconds)
 
-        summary = df.groupby("label").agg(
-            avg_response_time=("elapsed", "mean"),
-            error_rate=("responseCode", lambda x: (x.astype(str) != "200").mean() * 100),
-            throughput=("label", "count"),
-            concurrent_users=("allThreads", "max")
-        ).reset_index()
+
+def aggregate_s3_jtl(s3_key, window_seconds=DEFAULT_WINDOW_SECONDS):
+    """
+    Aggregate a CSV JTL straight from S3 into pandas, without a local
+    copy; returns (aggregator, timeline) or an error dict.
+    """
+    try:
+        stream = open_s3_stream(s3_key)
+    except Exception as e:
+        logger.error(f"❌ Failed to open {s3_key}: {e}")
+        return {"error": "JTL file not found or unreadable."}
+    with stream:
+        return _aggregate(lambda: read_stream_columns(stream),
+                          lambda timeline: aggregate_jtl_stream(stream, timeline=timeline), window_seconds)
+
+
+def _gemini_insights(prompt):
+    """Gemini's commentary on the report, or None when it is unavailable."""
+    try:
+        raw_result = generate_gemini_analysis_async.delay(prompt).get(timeout=GEMINI_ANALYSIS_TIMEOUT).strip()
+    except Exception as e:
+        logger.warning(f"⚠️ Gemini enrichment skipped: {e}")
+        return None
+
+    try:
+        markdown_text = json.loads(raw_result).get("analysis", raw_result)
+    except Exception:
+        markdown_text = raw_result
+
+    if markdown_text.startswith("❌"):
+        logger.warning(f"⚠️ Gemini enrichment skipped: {markdown_text}")
+        return None
+    return clean_markdown(markdown_text)
+
+
+def analyze_jtl(file_path, output_folder, window_seconds=DEFAULT_WINDOW_SECONDS, aggregates=None,
+                telemetry=None, stream=False, user_prefix=None, enrich=ANALYSIS_ENRICH, sla=None):
+    """
+    Summarise a JTL into a rule-based markdown report, optionally enriched by Gemini.
+
+    `aggregates` is an (aggregator, timeline) pair precomputed by the live
+    tailer during the run; when given, `file_path` is not read at all.
+    `telemetry` is the run's RunTelemetry; intervals where the load
+    generator was saturated are flagged in the analysis. `sla` overrides
+    the default thresholds with {"p95_ms": ..., "error_rate": ...}.
+
+    The report (verdict, findings, recommendations) never depends on
+    Gemini. With `enrich`, Gemini's commentary is appended to it; if
+    Gemini fails or times out the report is returned on its own.
+
+    With `stream`, the commentary is written by a Celery job that streams
+    it to /jobs/<job_id>/stream and uploads the .md under `user_prefix`;
+    the report and job id are returned without waiting for Gemini.
+    """
+    try:
+        if aggregates is not None:
+            logger.info("📊 Starting analysis from precomputed aggregates")
+            aggregator, timeline = aggregates
+        else:
+            logger.info(f"📊 Starting analysis for {file_path}")
+            aggregated = _aggregate_file(file_path, window_seconds)
+            if isinstance(aggregated, dict):
+                return aggregated
+            aggregator, timeline = aggregated
+
+        summary = aggregator.summary_frame()
 
         if summary.empty:
             return {"error": "No valid data found in JTL."}
 
         summary = summary.round(2)
 
-        summary_markdown = "\n".join(
-            f"- **{row['label']}**: Avg Time = `{row['avg_response_time']}ms`, "
-            f"Errors = `{row['error_rate']}%`, "
-            f"Throughput = `{row['throughput']}`, Users = `{row['concurrent_users']}`"
-            for _, row in summary.iterrows()
-        )
+        sla = sla or {}
+        sla_p95_ms = float(sla.get("p95_ms", SLA_P95_MS))
+        sla_error_rate = float(sla.get("error_rate", SLA_ERROR_RATE))
+
+        bottlenecks = telemetry.bottlenecks() if telemetry is not None else []
+        verdict, findings = analyze(summary, timeline, bottlenecks, sla_p95_ms, sla_error_rate)
+        report = render_report(summary, verdict, findings, sla_p95_ms, sla_error_rate)
+        logger.info(f"📋 Local analysis: {verdict} with {len(findings)} findings")
+
+        os.makedirs(output_folder, exist_ok=True)
+        timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
+        filename = f"analysis_{timestamp}.md"
+
+        # Save the columnar timeline next to the markdown for dashboards
+        timeline_filename = None
+        if timeline is not None and timeline.groups:
+            timeline_filename = f"timeline_{timestamp}.json"
+            timeline.save(os.path.join(output_folder, timeline_filename))
+
+        result = {
+            "filename": filename,
+            "timeline_filename": timeline_filename,
+            "verdict": verdict,
+            "findings": findings,
+            "generator_bottlenecks": bottlenecks,
+            "summary": summary.astype(object).where(summary.notna(), None).to_dict(orient="records")
+        }
 
         prompt = (
-            "You are a performance analysis expert. Analyze this result:\n\n"
-            f"{summary_markdown}\n\n"
-            "Provide a detailed markdown analysis. No code blocks. No additional explanations."
+            "You are a performance analysis expert. Below is an automated analysis of a load test. "
+            "Add insights it does not already state: likely root causes, how the findings relate, "
+            "and what to test next. Do not repeat the tables or findings.\n\n"
+            f"{report}\n"
+            "Reply in markdown. No code blocks. No additional explanations."
         )
 
-        task = generate_gemini_analysis_async.delay(prompt)
-        raw_result = task.get(timeout=60).strip()
+        if enrich and stream:
+            task = stream_gemini_analysis_async.delay(prompt, user_prefix, filename, report)
+            logger.info(f"📡 Streaming analysis queued: job {task.id}")
+            return {"status": "streaming", "job_id": task.id, "analysis": report, **result}
 
-        try:
-            parsed = json.loads(raw_result)
-            markdown_text = parsed.get("analysis", raw_result)
-        except Exception:
-            markdown_text = raw_result
-
-        if markdown_text.startswith("```markdown"):
-            markdown_text = markdown_text[len("```markdown"):].strip()
-        if markdown_text.endswith("```"):
-            markdown_text = markdown_text[:-3].strip()
+        markdown_text = report
+        if enrich:
+            markdown_text = with_ai_insights(report, _gemini_insights(prompt))
 
         # Save markdown to temp output folder
-        os.makedirs(output_folder, exist_ok=True)
-        timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
-        filename = f"analysis_{timestamp}.md"
         output_path = os.path.join(output_folder, filename)
 
         with open(output_path, "w", encoding="utf-8") as f:
@@ -86,10 +186,7 @@ def analyze_jtl(file_path, output_folder):
 
         logger.info(f"✅ Analysis saved: {output_path}")
 
-        return {
-            "analysis": markdown_text,
-            "filename": filename
-        }
+        return {"analysis": markdown_text, **result}
 
     except Exception as e:
         logger.error(f"❌ Unexpected analysis error: {e}")
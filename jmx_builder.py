@@ -0,0 +1,378 @@
+import re
+from urllib.parse import urlsplit
+import xml.etree.ElementTree as ET
+
+JMETER_VERSION = "5.6.3"
+
+HTTP_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+
+# ConstantThroughputTimer calcMode: target is shared by all active threads in the thread group
+THROUGHPUT_CALC_MODE = 4
+
+# ResponseAssertion test types
+ASSERT_EQUALS = 8
+ASSERT_SUBSTRING = 16
+
+
+def _java_hash(text):
+    """String.hashCode(), which JMeter uses to name assertion test strings."""
+    h = 0
+    for ch in text:
+        h = (31 * h + ord(ch)) & 0xFFFFFFFF
+    return str(h - (1 << 32) if h >= 1 << 31 else h)
+
+
+def _prop(parent, tag, name, value):
+    prop = ET.SubElement(parent, tag, name=name)
+    prop.text = str(value).lower() if isinstance(value, bool) else str(value)
+    return prop
+
+
+def _element(tree, tag, guiclass, name, **attrs):
+    """A test element plus the hashTree that holds its children."""
+    elem = ET.SubElement(tree, tag, guiclass=guiclass, testclass=tag, testname=name, **attrs)
+    return elem, ET.SubElement(tree, "hashTree")
+
+
+def _arguments(parent, name, guiclass, testname):
+    args = ET.SubElement(parent, "elementProp", name=name, elementType="Arguments", guiclass=guiclass,
+                         testclass="Arguments", testname=testname)
+    return ET.SubElement(args, "collectionProp", name="Arguments.arguments")
+
+
+def _int(value, field, minimum=0):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer.")
+    if number < minimum:
+        raise ValueError(f"{field} must be at least {minimum}.")
+    return number
+
+
+def _add_http_sampler(tree, request):
+    url = request.get("url", "")
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Invalid URL: {url!r}")
+    method = request.get("method", "GET").upper()
+    if method not in HTTP_METHODS:
+        raise ValueError(f"Unsupported HTTP method: {method}")
+
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    sampler, children = _element(tree, "HTTPSamplerProxy", "HttpTestSampleGui",
+                                 request.get("name") or f"{method} {path}")
+    _prop(sampler, "stringProp", "HTTPSampler.domain", parts.hostname)
+    _prop(sampler, "stringProp", "HTTPSampler.port", parts.port or "")
+    _prop(sampler, "stringProp", "HTTPSampler.protocol", parts.scheme)
+    _prop(sampler, "stringProp", "HTTPSampler.path", path)
+    _prop(sampler, "stringProp", "HTTPSampler.method", method)
+    _prop(sampler, "boolProp", "HTTPSampler.follow_redirects", True)
+    _prop(sampler, "boolProp", "HTTPSampler.use_keepalive", True)
+
+    body = request.get("body")
+    _prop(sampler, "boolProp", "HTTPSampler.postBodyRaw", body is not None)
+    args = _arguments(sampler, "HTTPsampler.Arguments", "HTTPArgumentsPanel", "User Defined Variables")
+    if body is not None:
+        arg = ET.SubElement(args, "elementProp", name="", elementType="HTTPArgument")
+        _prop(arg, "boolProp", "HTTPArgument.always_encode", False)
+        _prop(arg, "stringProp", "Argument.value", body)
+        _prop(arg, "stringProp", "Argument.metadata", "=")
+
+    if request.get("headers"):
+        _add_headers(children, request["headers"])
+    if request.get("assert_status"):
+        _add_assertion(children, f"Status {request['assert_status']}", "Assertion.response_code",
+                       str(request["assert_status"]), ASSERT_EQUALS)
+    if request.get("assert_text"):
+        _add_assertion(children, "Response contains text", "Assertion.response_data",
+                       request["assert_text"], ASSERT_SUBSTRING)
+
+
+def _add_headers(tree, headers):
+    manager, _ = _element(tree, "HeaderManager", "HeaderPanel", "HTTP Header Manager")
+    collection = ET.SubElement(manager, "collectionProp", name="HeaderManager.headers")
+    for name, value in headers.items():
+        header = ET.SubElement(collection, "elementProp", name="", elementType="Header")
+        _prop(header, "stringProp", "Header.name", name)
+        _prop(header, "stringProp", "Header.value", value)
+
+
+def _add_assertion(tree, name, field, expected, test_type):
+    assertion, _ = _element(tree, "ResponseAssertion", "AssertionGui", name)
+    strings = ET.SubElement(assertion, "collectionProp", name="Asserion.test_strings")
+    _prop(strings, "stringProp", _java_hash(expected), expected)
+    _prop(assertion, "stringProp", "Assertion.custom_message", "")
+    _prop(assertion, "stringProp", "Assertion.test_field", field)
+    _prop(assertion, "boolProp", "Assertion.assume_success", False)
+    _prop(assertion, "intProp", "Assertion.test_type", test_type)
+
+
+def _add_csv(tree, csv):
+    if not csv.get("filename") or not csv.get("variables"):
+        raise ValueError("csv needs a filename and variables.")
+    dataset, _ = _element(tree, "CSVDataSet", "TestBeanGUI", "CSV Data Set Config")
+    _prop(dataset, "stringProp", "filename", csv["filename"])
+    _prop(dataset, "stringProp", "fileEncoding", "UTF-8")
+    _prop(dataset, "stringProp", "variableNames", ",".join(csv["variables"]))
+    _prop(dataset, "boolProp", "ignoreFirstLine", bool(csv.get("ignore_first_line", False)))
+    _prop(dataset, "stringProp", "delimiter", csv.get("delimiter", ","))
+    _prop(dataset, "boolProp", "quotedData", False)
+    _prop(dataset, "boolProp", "recycle", bool(csv.get("recycle", True)))
+    _prop(dataset, "boolProp", "stopThread", False)
+    _prop(dataset, "stringProp", "shareMode", "shareMode.all")
+
+
+def _add_think_time(tree, think_time_ms):
+    if isinstance(think_time_ms, dict):
+        low = _int(think_time_ms.get("min", 0), "think_time_ms.min")
+        high = _int(think_time_ms.get("max", low), "think_time_ms.max", low)
+        timer, _ = _element(tree, "UniformRandomTimer", "UniformRandomTimerGui", "Think Time")
+        _prop(timer, "stringProp", "ConstantTimer.delay", low)
+        _prop(timer, "stringProp", "RandomTimer.range", high - low)
+    else:
+        timer, _ = _element(tree, "ConstantTimer", "ConstantTimerGui", "Think Time")
+        _prop(timer, "stringProp", "ConstantTimer.delay", _int(think_time_ms, "think_time_ms"))
+
+
+def _add_throughput(tree, per_minute):
+    try:
+        per_minute = float(per_minute)
+    except (TypeError, ValueError):
+        raise ValueError("throughput_per_minute must be a number.")
+    if per_minute <= 0:
+        raise ValueError("throughput_per_minute must be positive.")
+    timer, _ = _element(tree, "ConstantThroughputTimer", "TestBeanGUI", "Throughput Shaping")
+    _prop(timer, "intProp", "calcMode", THROUGHPUT_CALC_MODE)
+    # doubleProp is saved as child elements rather than a name attribute
+    throughput = ET.SubElement(timer, "doubleProp")
+    for tag, value in (("name", "throughput"), ("value", per_minute), ("savedValue", 0.0)):
+        ET.SubElement(throughput, tag).text = str(value)
+
+
+def _add_thread_group(tree, group, index):
+    users = _int(group.get("users"), "users", 1)
+    requests = group.get("requests") or []
+    if not requests:
+        raise ValueError("Every thread group needs at least one request.")
+
+    thread_group, children = _element(tree, "ThreadGroup", "ThreadGroupGui", group.get("name") or f"Users {index}")
+    _prop(thread_group, "stringProp", "ThreadGroup.on_sample_error", "continue")
+    controller = ET.SubElement(thread_group, "elementProp", name="ThreadGroup.main_controller",
+                               elementType="LoopController", guiclass="LoopControlPanel",
+                               testclass="LoopController", testname="Loop Controller")
+    duration = group.get("duration")
+    loops = -1 if duration else _int(group.get("loops", 1), "loops", 1)
+    _prop(controller, "stringProp", "LoopController.loops", loops)
+    _prop(controller, "boolProp", "LoopController.continue_forever", False)
+    _prop(thread_group, "stringProp", "ThreadGroup.num_threads", users)
+    _prop(thread_group, "stringProp", "ThreadGroup.ramp_time", _int(group.get("ramp_up", 0), "ramp_up"))
+    _prop(thread_group, "boolProp", "ThreadGroup.scheduler", bool(duration))
+    _prop(thread_group, "stringProp", "ThreadGroup.duration", _int(duration, "duration", 1) if duration else "")
+    _prop(thread_group, "stringProp", "ThreadGroup.delay", "")
+    _prop(thread_group, "boolProp", "ThreadGroup.same_user_on_next_iteration", True)
+
+    # Config elements and timers first: they apply to every sampler in the group
+    if group.get("csv"):
+        _add_csv(children, group["csv"])
+    if group.get("headers"):
+        _add_headers(children, group["headers"])
+    if group.get("think_time_ms"):
+        _add_think_time(children, group["think_time_ms"])
+    if group.get("throughput_per_minute"):
+        _add_throughput(children, group["throughput_per_minute"])
+    for request in requests:
+        _add_http_sampler(children, request)
+
+
+def build_jmx(spec):
+    """
+    A JMeter 5.6.3 plan from a structured spec:
+
+        {"name": "...", "thread_groups": [{
+            "users": 50, "ramp_up": 60, "duration": 600,   # or "loops": 10
+            "think_time_ms": 500,                          # or {"min": 200, "max": 800}
+            "throughput_per_minute": 1200,
+            "headers": {"Accept": "application/json"},
+            "csv": {"filename": "users.csv", "variables": ["user", "password"]},
+            "requests": [{"url": "https://example.com/api", "method": "POST", "body": "...",
+                          "headers": {...}, "assert_status": 200, "assert_text": "ok"}],
+        }]}
+
+    Raises ValueError for an invalid spec.
+    """
+    groups = spec.get("thread_groups") or []
+    if not groups:
+        raise ValueError("The spec needs at least one thread group.")
+
+    root = ET.Element("jmeterTestPlan", version="1.2", properties="5.0", jmeter=JMETER_VERSION)
+    top = ET.SubElement(root, "hashTree")
+    plan, plan_tree = _element(top, "TestPlan", "TestPlanGui", spec.get("name") or "Test Plan")
+    _arguments(plan, "TestPlan.user_defined_variables", "ArgumentsPanel", "User Defined Variables")
+    _prop(plan, "boolProp", "TestPlan.functional_mode", False)
+    _prop(plan, "boolProp", "TestPlan.serialize_threadgroups", False)
+
+    for index, group in enumerate(groups, start=1):
+        _add_thread_group(plan_tree, group, index)
+
+    ET.indent(root, space="  ")
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(root, encoding="unicode") + "\n"
+
+
+# ---------- Prompt parsing ----------
+
+_UNITS = r"(ms|milliseconds?|s|secs?|seconds?|m|mins?|minutes?|h|hrs?|hours?)\b"
+_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+# A time span: number and unit as the last two groups of each pattern using it
+_SPAN = r"(\d+(?:\.\d+)?)\s*" + _UNITS
+_USERS = r"(\d[\d,]*)\s*(?:concurrent\s+|virtual\s+|parallel\s+|simultaneous\s+)?(?:users|threads|vus)\b"
+
+USERS_PATTERN = re.compile(_USERS, re.I)
+# "for 10 minutes", "over 10 minutes", "duration of 10m", "10 minutes duration"
+DURATION_PATTERNS = (
+    re.compile(r"\b(?:for|over|duration(?:\s+of)?|lasting)\s*:?\s+" + _SPAN, re.I),
+    re.compile(_SPAN + r"\s+(?:duration|long|test|run)\b", re.I),
+)
+# Steady state after the ramp: "hold for 30 minutes", "then hold the load for 30m"
+HOLD_PATTERN = re.compile(r"\b(?:hold|sustain|stay|keep)\w*(?:\s+(?:it|them|that|the\s+load|steady|there))?"
+                          r"\s+(?:for\s+)?" + _SPAN, re.I)
+RAMP_PATTERNS = (
+    # "ramp up to 200 users over 5 minutes"
+    re.compile(r"\bramp(?:ing)?[\s-]*(?:up\s+)?to\s+" + _USERS + r"\s+(?:over|in|within)\s+" + _SPAN, re.I),
+    re.compile(r"\bramp(?:ing)?[\s-]*(?:up)?\s*(?:time|period)?\s*(?:of|over|in|:)?\s*" + _SPAN, re.I),
+)
+LOOPS_PATTERN = re.compile(r"\b(\d+)\s*(?:times|iterations|loops)\b", re.I)
+THINK_PATTERN = re.compile(r"\b(?:think[\s-]*time|pause|delay)\s*(?:of|:)?\s*" + _SPAN, re.I)
+THROUGHPUT_PATTERN = re.compile(r"\b(\d+(?:\.\d+)?)\s*(?:(rps|rpm)\b|(?:requests?|reqs?|hits)\s*"
+                                r"(?:per|/|a)\s*(second|sec|s|minute|min|m)\b)", re.I)
+STATUS_PATTERN = re.compile(r"\b(?:assert|expect|check)\w*\s+(?:an?\s+|the\s+)?(?:http\s+)?"
+                            r"(?:status|response\s+code)\s*(?:is|of|=|:)?\s*(\d{3})\b", re.I)
+URL_PATTERN = re.compile(r"(?:\b(GET|POST|PUT|PATCH|DELETE|HEAD|OPTIONS)\s+)?(https?://[^\s,;'\"<>()\[\]]+)", re.I)
+
+# Anything these describe needs real scripting: leave such prompts to Gemini
+UNSUPPORTED = re.compile(
+    r"\b(log\s?in|logs?\s+in|auth\w*|token|extract\w*|correlat\w*|cookie|session|csv|parameteri[sz]\w*|"
+    r"variable|random\w*|json\s?path|regex|if\b|condition\w*|websocket|jdbc|database|graphql|soap|"
+    r"upload|download|body|payload|header|step|spike|stair|every)",
+    re.I,
+)
+
+# Time words left over once the recognised patterns are removed mean the
+# prompt asks for something the parser didn't understand
+TIME_WORDS = re.compile(r"\b(?:ms|milliseconds?|secs?|seconds?|mins?|minutes?|hrs?|hours?|days?)\b", re.I)
+
+
+def _seconds(value, unit):
+    unit = unit.lower()
+    return float(value) * _SECONDS["ms" if unit.startswith(("ms", "milli")) else unit[0]]
+
+
+def prompt_urls(prompt):
+    return [url.rstrip(".:!?") for _, url in URL_PATTERN.findall(prompt)]
+
+
+def _search(patterns, prompt, taken=()):
+    """First match of the patterns, in order, that doesn't overlap the `taken` spans."""
+    for pattern in patterns:
+        for match in pattern.finditer(prompt):
+            if not any(match.start() < end and start < match.end() for start, end in taken):
+                return match
+    return None
+
+
+def parse_load_shape(prompt):
+    """Load shape of a prompt and the (start, end) spans of the text it was read from."""
+    shape, spans = {}, []
+    users = USERS_PATTERN.search(prompt)
+    if users:
+        shape["users"] = int(users.group(1).replace(",", ""))
+        spans.append(users.span())
+
+    ramp = _search(RAMP_PATTERNS, prompt)
+    if ramp:
+        shape["ramp_up"] = round(_seconds(*ramp.groups()[-2:]))
+        spans.append(ramp.span())
+        if "users" not in shape and ramp.re is RAMP_PATTERNS[0]:
+            shape["users"] = int(ramp.group(1).replace(",", ""))
+
+    # "over 5 minutes" belongs to the ramp when it is part of it
+    hold = _search([HOLD_PATTERN], prompt, spans)
+    duration = _search(DURATION_PATTERNS, prompt, spans + ([hold.span()] if hold else []))
+    loops = LOOPS_PATTERN.search(prompt)
+    if hold:
+        # The scheduler's duration includes the ramp-up
+        shape["duration"] = max(1, round(_seconds(*hold.groups()) + shape.get("ramp_up", 0)))
+        spans.append(hold.span())
+    elif duration:
+        shape["duration"] = max(1, round(_seconds(*duration.groups())))
+        spans.append(duration.span())
+    elif loops:
+        shape["loops"] = int(loops.group(1))
+        spans.append(loops.span())
+    return shape, spans
+
+
+def load_shape(prompt):
+    """The users, duration or loops, and ramp-up a prompt states, as far as it states them."""
+    return parse_load_shape(prompt)[0]
+
+
+def _all_consumed(prompt, spans):
+    """Whether every number and time expression in the prompt was read by a recognised pattern."""
+    leftover = list(prompt)
+    for start, end in spans:
+        leftover[start:end] = " " * (end - start)
+    leftover = "".join(leftover)
+    return not re.search(r"\d", leftover) and not TIME_WORDS.search(leftover)
+
+
+def spec_from_prompt(prompt):
+    """
+    Parse a simple "N users hitting these URLs for T with ramp R" prompt
+    into a build_jmx spec, or None when the prompt asks for more than the
+    templates express (logins, correlation, payloads, custom shapes, ...).
+
+    Conservative: any number or time expression that no recognised pattern
+    accounts for (e.g. "response time under 500ms") also returns None, so
+    the prompt goes to Gemini instead of yielding a subtly wrong plan.
+    """
+    if UNSUPPORTED.search(prompt):
+        return None
+    shape, spans = parse_load_shape(prompt)
+    url_matches = list(URL_PATTERN.finditer(prompt))
+    urls = [(match.group(1), match.group(2).rstrip(".:!?")) for match in url_matches]
+    spans += [match.span() for match in url_matches]
+    if "users" not in shape or not urls:
+        return None
+
+    group = {**shape, "requests": []}
+    for method, url in urls:
+        request = {"url": url, "method": (method or "GET").upper()}
+        if request["method"] != "GET":
+            # Non-GET requests almost always need a body or headers the prompt doesn't give
+            return None
+        group["requests"].append(request)
+
+    think = THINK_PATTERN.search(prompt)
+    if think:
+        group["think_time_ms"] = round(_seconds(*think.groups()) * 1000)
+        spans.append(think.span())
+
+    throughput = THROUGHPUT_PATTERN.search(prompt)
+    if throughput:
+        value, short, unit = throughput.groups()
+        per_second = (short or unit).lower() in ("rps", "second", "sec", "s")
+        group["throughput_per_minute"] = float(value) * (60 if per_second else 1)
+        spans.append(throughput.span())
+
+    status = STATUS_PATTERN.search(prompt)
+    if status:
+        for request in group["requests"]:
+            request["assert_status"] = int(status.group(1))
+        spans.append(status.span())
+
+    if not _all_consumed(prompt, spans):
+        return None
+    return {"name": "Generated Test Plan", "thread_groups": [group]}
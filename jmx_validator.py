@@ -0,0 +1,287 @@
+import io
+import re
+import xml.etree.ElementTree as ET
+
+ERROR = "error"
+WARNING = "warning"
+
+# Plugin thread groups (e.g. com.blazemeter.jmeter.threads.concurrency.ConcurrencyThreadGroup) are
+# recognised by class name or by this property; only the core ones have REQUIRED_PROPERTIES
+THREAD_GROUP_CONTROLLER = "ThreadGroup.main_controller"
+# Samplers may also live in a test fragment, to be pulled into thread groups by Module Controllers
+TEST_FRAGMENT = "TestFragmentController"
+PROPERTY_TAGS = {"stringProp", "intProp", "longProp", "boolProp", "doubleProp", "floatProp",
+                 "elementProp", "collectionProp"}
+
+# Properties a test element cannot run without
+REQUIRED_PROPERTIES = {
+    "ThreadGroup": ("ThreadGroup.num_threads", "ThreadGroup.main_controller"),
+    "SetupThreadGroup": ("ThreadGroup.num_threads", "ThreadGroup.main_controller"),
+    "PostThreadGroup": ("ThreadGroup.num_threads", "ThreadGroup.main_controller"),
+    "LoopController": ("LoopController.loops",),
+}
+
+# name: (minimum, maximum, required non-empty)
+INTEGER_PROPERTIES = {
+    "ThreadGroup.num_threads": (1, None, True),
+    "ThreadGroup.ramp_time": (0, None, False),
+    "ThreadGroup.duration": (0, None, False),
+    "ThreadGroup.delay": (0, None, False),
+    "LoopController.loops": (-1, None, True),
+    "HTTPSampler.port": (1, 65535, False),
+    "HTTPSampler.connect_timeout": (0, None, False),
+    "HTTPSampler.response_timeout": (0, None, False),
+    "ConstantTimer.delay": (0, None, False),
+}
+
+# ${threads}, ${__P(threads,10)}: resolved by JMeter at run time
+EXPRESSION = re.compile(r"\$\{.*\}")
+
+
+def _is_sampler(tag):
+    return tag.endswith("Sampler") or tag.endswith("SamplerProxy")
+
+
+def _thread_group_class(elem):
+    return any(name.endswith("ThreadGroup") for name in (elem.tag, elem.get("testclass") or ""))
+
+
+def is_thread_group(elem):
+    """Whether a parsed test element is a core or plugin thread group."""
+    return _thread_group_class(elem) or any(child.get("name") == THREAD_GROUP_CONTROLLER for child in elem)
+
+
+def _diagnostic(severity, code, message, element=None):
+    return {"severity": severity, "code": code, "message": message, "element": element}
+
+
+class _Element:
+    """A test element (a direct child of a hashTree) and what has been read of it so far."""
+
+    __slots__ = ("tag", "name", "path", "enabled", "in_plan", "is_thread_group", "thread_group", "properties",
+                 "samplers")
+
+    def __init__(self, elem, parent_path, in_plan, thread_group):
+        self.tag = elem.tag
+        self.name = elem.get("testname") or elem.tag
+        self.path = f"{parent_path} > {self.tag}[{self.name}]" if parent_path else f"{self.tag}[{self.name}]"
+        self.enabled = elem.get("enabled", "true") != "false"
+        self.in_plan = in_plan  # directly inside the TestPlan's hashTree
+        self.is_thread_group = _thread_group_class(elem)
+        self.thread_group = self if self.is_thread_group or self.tag == TEST_FRAGMENT else thread_group
+        self.properties = {}
+        self.samplers = 0
+
+
+class _Validator:
+    def __init__(self):
+        self.diagnostics = []
+        self.stack = []       # ("root" | "tree" | "element" | "property", payload) per open XML element
+        self.last_closed = {}  # id(tree frame) -> last test element closed directly in it
+        self.thread_groups = []
+        self.http_defaults_domain = False
+        self.pending_domain_warnings = []
+        self.failed = False
+
+    def fail(self, code, message, element=None):
+        self.diagnostics.append(_diagnostic(ERROR, code, message, element))
+        self.failed = True
+
+    def warn(self, code, message, element=None):
+        self.diagnostics.append(_diagnostic(WARNING, code, message, element))
+
+    def _current_element(self):
+        for kind, payload in reversed(self.stack):
+            if kind == "element":
+                return payload
+        return None
+
+    def start(self, elem):
+        if not self.stack:
+            if elem.tag != "jmeterTestPlan":
+                self.fail("root", f"Root element is <{elem.tag}>, expected <jmeterTestPlan>.")
+            self.stack.append(("root", None))
+            return
+
+        parent_kind, parent = self.stack[-1]
+        if elem.tag == "hashTree":
+            self._start_tree(parent_kind, parent)
+        elif parent_kind in ("root", "tree") and elem.tag not in PROPERTY_TAGS:
+            self._start_element(elem, parent_kind, parent)
+        else:
+            self.stack.append(("property", elem.get("name")))
+
+    def _start_tree(self, parent_kind, parent):
+        if parent_kind == "root":
+            self.stack.append(("tree", {"owner": None}))
+            return
+        if parent_kind != "tree":
+            self.fail("structure", "<hashTree> found inside a test element.", self._path())
+            return
+        owner = self.last_closed.get(id(parent))
+        if owner is None:
+            self.fail("structure", "<hashTree> without a preceding test element.", self._path())
+            return
+        self.stack.append(("tree", {"owner": owner}))
+
+    def _start_element(self, elem, parent_kind, parent):
+        owner = parent["owner"] if parent_kind == "tree" else None
+        parent_path = owner.path if owner else ""
+
+        if parent_kind == "root":
+            self.fail("structure", f"<{elem.tag}> must be inside the top-level <hashTree>.")
+            return
+        if owner is None and elem.tag != "TestPlan":
+            self.fail("structure", f"<{elem.tag}> is at the top level; only the TestPlan may be.", elem.tag)
+            return
+        if elem.tag == "TestPlan" and owner is not None:
+            self.fail("structure", "TestPlan must be the top-level element.", owner.path)
+            return
+        in_plan = owner is not None and owner.tag == "TestPlan"
+        if _thread_group_class(elem) and not in_plan:
+            self.fail("structure", f"{elem.tag} must be directly inside the TestPlan's hashTree.", parent_path)
+            return
+
+        element = _Element(elem, parent_path, in_plan, owner.thread_group if owner else None)
+        if _is_sampler(elem.tag) and element.thread_group is None:
+            self.fail("structure", f"{elem.tag} '{element.name}' is not inside a ThreadGroup.", element.path)
+            return
+        self.stack.append(("element", element))
+
+    def end(self, elem):
+        kind, payload = self.stack.pop()
+        if kind == "property":
+            element = self._current_element()
+            if element is not None and payload and payload not in element.properties:
+                element.properties[payload] = (elem.text or "").strip() if elem.tag != "elementProp" else ""
+        elif kind == "element":
+            self._end_element(payload)
+            _, tree = self.stack[-1]
+            self.last_closed[id(tree)] = payload
+        elif kind == "tree":
+            self.last_closed.pop(id(payload), None)
+        # Children have been read; drop them so large plans don't build a full tree
+        elem.clear()
+
+    def _end_element(self, element):
+        for name in REQUIRED_PROPERTIES.get(element.tag, ()):
+            if name not in element.properties:
+                self.fail("missing_property", f"{element.tag} '{element.name}' has no {name} property.", element.path)
+                return
+
+        # Disabled elements may carry placeholder values (e.g. 0-thread groups on a shard)
+        for name, value in element.properties.items():
+            if element.enabled and name in INTEGER_PROPERTIES and not self._check_integer(element, name, value):
+                return
+
+        # Properties precede the element's hashTree, so its children already see it as their thread group
+        if not element.is_thread_group and THREAD_GROUP_CONTROLLER in element.properties:
+            if not element.in_plan:
+                self.fail("structure", f"{element.tag} must be directly inside the TestPlan's hashTree.",
+                          element.path)
+                return
+            element.is_thread_group = True
+            element.thread_group = element
+
+        if element.is_thread_group:
+            props = element.properties
+            if element.enabled and props.get("ThreadGroup.scheduler") == "true" \
+                    and props.get("ThreadGroup.duration", "") in ("", "0"):
+                self.fail("invalid_number", f"{element.tag} '{element.name}' uses the scheduler but has no "
+                          "ThreadGroup.duration.", element.path)
+                return
+            self.thread_groups.append(element)
+
+        if element.tag == "ConfigTestElement" and element.properties.get("HTTPSampler.domain"):
+            self.http_defaults_domain = True
+
+        if _is_sampler(element.tag):
+            element.thread_group.samplers += 1
+            if element.tag == "HTTPSamplerProxy" and not element.properties.get("HTTPSampler.domain"):
+                self.pending_domain_warnings.append(element)
+
+    def _check_integer(self, element, name, value):
+        minimum, maximum, required = INTEGER_PROPERTIES[name]
+        if EXPRESSION.search(value):
+            return True
+        if value == "":
+            if required:
+                self.fail("invalid_number", f"{name} of '{element.name}' is empty.", element.path)
+            return not required
+        try:
+            number = int(value)
+        except ValueError:
+            self.fail("invalid_number", f"{name} of '{element.name}' is '{value}', not an integer.", element.path)
+            return False
+        if number < minimum or (maximum is not None and number > maximum):
+            bounds = f"between {minimum} and {maximum}" if maximum is not None else f"at least {minimum}"
+            self.fail("invalid_number", f"{name} of '{element.name}' is {number}; it must be {bounds}.",
+                      element.path)
+            return False
+        return True
+
+    def _path(self):
+        for kind, payload in reversed(self.stack):
+            if kind == "element":
+                return payload.path
+            if kind == "tree" and payload["owner"] is not None:
+                return payload["owner"].path
+        return None
+
+    def finish(self):
+        if not self.thread_groups:
+            self.fail("structure", "The plan has no ThreadGroup.")
+            return
+        active = [tg for tg in self.thread_groups if tg.enabled]
+        if not any(tg.samplers for tg in active):
+            self.fail("no_samplers", "No enabled ThreadGroup contains a sampler.")
+            return
+        for tg in active:
+            if not tg.samplers:
+                self.warn("no_samplers", f"{tg.tag} '{tg.name}' has no samplers.", tg.path)
+        if not self.http_defaults_domain:
+            for sampler in self.pending_domain_warnings:
+                self.warn("missing_property", f"HTTP sampler '{sampler.name}' has no HTTPSampler.domain and "
+                          "there are no HTTP Request Defaults.", sampler.path)
+
+
+def validate_jmx(xml_content):
+    """
+    Single-pass structural validation of a JMX plan.
+
+    Walks the document with iterparse, following the real hashTree
+    nesting (TestPlan → ThreadGroup → samplers, with controllers in
+    between), and checks required properties and numeric fields. Stops
+    at the first error. Returns a list of diagnostics, each
+    {"severity", "code", "message", "element"}; the plan is valid when
+    none has severity "error".
+    """
+    data = xml_content.encode("utf-8") if isinstance(xml_content, str) else xml_content
+    validator = _Validator()
+    try:
+        for event, elem in ET.iterparse(io.BytesIO(data), events=("start", "end")):
+            if event == "start":
+                validator.start(elem)
+            else:
+                validator.end(elem)
+            if validator.failed:
+                return validator.diagnostics
+    except ET.ParseError as e:
+        line, column = e.position
+        validator.fail("xml_syntax", f"XML is not well-formed at line {line}, column {column}: {e}")
+        return validator.diagnostics
+
+    validator.finish()
+    return validator.diagnostics
+
+
+def has_errors(diagnostics):
+    return any(d["severity"] == ERROR for d in diagnostics)
+
+
+def format_diagnostics(diagnostics):
+    """Markdown list of diagnostics, e.g. for a retry prompt."""
+    return "\n".join(
+        f"- {d['severity'].upper()}: {d['message']}" + (f" (at {d['element']})" if d["element"] else "")
+        for d in diagnostics
+    )
@@ -0,0 +1,43 @@
+import os
+from celery.result import AsyncResult
+from tasks.celery import celery
+from redis_client import get_redis
+from run_scheduler import queue_position
+
+# How long job ownership is remembered (matches Celery's default result expiry)
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL", 24 * 3600))
+
+JOB_OWNER_PREFIX = "jobs:owner:"
+
+
+def register_job(job_id, owner):
+    get_redis().setex(f"{JOB_OWNER_PREFIX}{job_id}", JOB_TTL_SECONDS, owner)
+
+
+def get_job_owner(job_id):
+    return get_redis().get(f"{JOB_OWNER_PREFIX}{job_id}")
+
+
+def get_job(job_id):
+    return AsyncResult(job_id, app=celery)
+
+
+def job_failed(result):
+    """A finished job that returned an error result (e.g. plan generation) rather than raising."""
+    return result.state == "SUCCESS" and isinstance(result.result, dict) and result.result.get("status") == "error"
+
+
+def job_status(job_id):
+    result = get_job(job_id)
+    status = {"job_id": job_id, "status": result.state}
+    if job_failed(result):
+        status["status"] = "FAILURE"
+        status["error"] = result.result.get("message")
+    if result.state == "PENDING":
+        position = queue_position(job_id)
+        if position is not None:
+            status["status"] = "QUEUED"
+            status["queue_position"] = position
+    elif result.state == "FAILURE":
+        status["error"] = str(result.result)
+    return status
@@ -0,0 +1,272 @@
+import os
+import json
+import logging
+import pandas as pd
+from jtl_reader import iter_jtl_chunks, iter_jtl_stream, DEFAULT_CHUNKSIZE
+from latency_sketch import LatencySketch, DEFAULT_RELATIVE_ACCURACY, PERCENTILES
+
+logger = logging.getLogger(__name__)
+
+# Columns the per-label summary is built from
+JTL_COLUMNS = ["label", "elapsed", "responseCode", "allThreads"]
+
+# Precomputed aggregates (written by the live tailer) stored next to the .jtl
+AGGREGATES_SUFFIX = ".summary.json"
+
+SUMMARY_COLUMNS = (
+    ["label", "avg_response_time"]
+    + [f"p{p}" for p in PERCENTILES]
+    + ["max_response_time", "error_rate", "throughput", "concurrent_users"]
+)
+
+
+class LabelStats:
+    """Running aggregates for a single sampler label."""
+
+    __slots__ = ("count", "elapsed_count", "elapsed_sum", "elapsed_min",
+                 "elapsed_max", "errors", "max_threads", "threads_sum", "threads_count", "sketch")
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.count = 0
+        self.elapsed_count = 0
+        self.elapsed_sum = 0.0
+        self.elapsed_min = None
+        self.elapsed_max = None
+        self.errors = 0
+        self.max_threads = None
+        # allThreads summed over the samples that report it, for the average load
+        self.threads_sum = 0.0
+        self.threads_count = 0
+        self.sketch = LatencySketch(relative_accuracy)
+
+    def add(self, count, elapsed_count, elapsed_sum, elapsed_min, elapsed_max, errors, max_threads,
+            threads_sum=0.0, threads_count=0):
+        self.count += int(count)
+        self.elapsed_count += int(elapsed_count)
+        self.elapsed_sum += float(elapsed_sum)
+        self.elapsed_min = _nan_min(self.elapsed_min, elapsed_min)
+        self.elapsed_max = _nan_max(self.elapsed_max, elapsed_max)
+        self.errors += int(errors)
+        self.max_threads = _nan_max(self.max_threads, max_threads)
+        self.threads_sum += float(threads_sum)
+        self.threads_count += int(threads_count)
+
+    def merge(self, other):
+        self.add(other.count, other.elapsed_count, other.elapsed_sum, other.elapsed_min,
+                 other.elapsed_max, other.errors, other.max_threads, other.threads_sum, other.threads_count)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "elapsed_count": self.elapsed_count,
+            "elapsed_sum": self.elapsed_sum,
+            "elapsed_min": _native(self.elapsed_min),
+            "elapsed_max": _native(self.elapsed_max),
+            "errors": self.errors,
+            "max_threads": _native(self.max_threads),
+            "threads_sum": self.threads_sum,
+            "threads_count": self.threads_count,
+            "sketch": self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        # Aggregates saved before threads_sum existed have no average load
+        stats.add(data["count"], data["elapsed_count"], data["elapsed_sum"], data["elapsed_min"],
+                  data["elapsed_max"], data["errors"], data["max_threads"],
+                  data.get("threads_sum", 0.0), data.get("threads_count", 0))
+        stats.sketch = LatencySketch.from_dict(data["sketch"])
+        return stats
+
+    @property
+    def avg_response_time(self):
+        return self.elapsed_sum / self.elapsed_count if self.elapsed_count else float("nan")
+
+    @property
+    def avg_threads(self):
+        return self.threads_sum / self.threads_count if self.threads_count else None
+
+    @property
+    def error_rate(self):
+        return self.errors / self.count * 100 if self.count else 0.0
+
+
+def _native(value):
+    """numpy scalar -> Python scalar, so aggregates serialise to JSON."""
+    return value.item() if hasattr(value, "item") else value
+
+
+def _nan_min(current, value):
+    if value is None or pd.isna(value):
+        return current
+    return value if current is None else min(current, value)
+
+
+def _nan_max(current, value):
+    if value is None or pd.isna(value):
+        return current
+    return value if current is None else max(current, value)
+
+
+class JTLAggregator:
+    """
+    Streaming per-label aggregation over JTL chunks.
+
+    Each chunk is reduced with a vectorised groupby and folded into the
+    running per-label state, so only one chunk is ever held in memory.
+    Aggregators built over different chunks or files can be merged.
+    """
+
+    # Columns each chunk is grouped on; subclasses may group on more
+    group_by = ["label"]
+
+    # Constructor arguments persisted by to_dict()
+    init_fields = ("relative_accuracy",)
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.groups = {}
+        self.rows = 0
+
+    @property
+    def labels(self):
+        return self.groups
+
+    def _stats(self, key):
+        stats = self.groups.get(key)
+        if stats is None:
+            stats = self.groups[key] = LabelStats(self.relative_accuracy)
+        return stats
+
+    def _prepare(self, chunk):
+        return chunk
+
+    def update(self, chunk):
+        chunk = self._prepare(chunk)
+        if chunk.empty:
+            return self
+
+        group_key = self.group_by[0] if len(self.group_by) == 1 else self.group_by
+        self.rows += len(chunk)
+        partial = chunk.assign(
+            is_error=chunk["responseCode"] != "200"
+        ).groupby(group_key, sort=False, observed=True).agg(
+            count=("label", "size"),
+            elapsed_count=("elapsed", "count"),
+            elapsed_sum=("elapsed", "sum"),
+            elapsed_min=("elapsed", "min"),
+            elapsed_max=("elapsed", "max"),
+            errors=("is_error", "sum"),
+            max_threads=("allThreads", "max"),
+            threads_sum=("allThreads", "sum"),
+            threads_count=("allThreads", "count"),
+        )
+
+        for key, row in zip(partial.index, partial.itertuples(index=False)):
+            self._stats(key).add(*row)
+
+        # Latency sketches: bucket the whole chunk once, then count per (group, bucket)
+        timed = chunk[chunk["elapsed"].notna()]
+        if not timed.empty:
+            buckets = timed[self.group_by].assign(
+                bucket=LatencySketch(self.relative_accuracy).bucket_keys(timed["elapsed"].to_numpy())
+            )
+            bucket_counts = buckets.groupby(self.group_by + ["bucket"], sort=False, observed=True).size()
+            for key, counts in bucket_counts.groupby(level=group_key, sort=False, observed=True):
+                self._stats(key).sketch.add_counts(counts.index.get_level_values("bucket"), counts.to_numpy())
+        return self
+
+    def merge(self, other):
+        for key, stats in other.groups.items():
+            self._stats(key).merge(stats)
+        self.rows += other.rows
+        return self
+
+    def to_dict(self):
+        return {
+            **{name: getattr(self, name) for name in self.init_fields},
+            "rows": self.rows,
+            "groups": [
+                [[_native(k) for k in key] if isinstance(key, tuple) else _native(key), stats.to_dict()]
+                for key, stats in self.groups.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregator = cls(**{name: data[name] for name in cls.init_fields})
+        aggregator.rows = data["rows"]
+        for key, stats in data["groups"]:
+            aggregator.groups[tuple(key) if isinstance(key, list) else key] = LabelStats.from_dict(stats)
+        return aggregator
+
+    def summary_frame(self):
+        """Per-label summary table, one row per label sorted by label."""
+        records = [
+            {
+                "label": label,
+                "avg_response_time": stats.avg_response_time,
+                **stats.sketch.percentiles(),
+                "max_response_time": stats.elapsed_max,
+                "error_rate": stats.error_rate,
+                "throughput": stats.count,
+                "concurrent_users": stats.max_threads,
+            }
+            for label, stats in sorted(self.labels.items(), key=lambda item: str(item[0]))
+        ]
+        return pd.DataFrame(records, columns=SUMMARY_COLUMNS)
+
+
+def aggregates_filename(jtl_filename):
+    """Name of the precomputed aggregates stored next to a .jtl."""
+    return os.path.splitext(jtl_filename)[0] + AGGREGATES_SUFFIX
+
+
+def save_aggregates(output_path, aggregator, timeline=None):
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "summary": aggregator.to_dict(),
+            "timeline": timeline.to_dict() if timeline is not None else None,
+        }, f, separators=(",", ":"))
+    return output_path
+
+
+def load_aggregates(input_path):
+    """Return (aggregator, timeline) saved by `save_aggregates`; timeline may be None."""
+    # Imported here: jtl_timeline builds on this module
+    from jtl_timeline import JTLTimeline
+
+    with open(input_path, encoding="utf-8") as f:
+        data = json.load(f)
+    timeline = JTLTimeline.from_dict(data["timeline"]) if data.get("timeline") else None
+    return JTLAggregator.from_dict(data["summary"]), timeline
+
+
+def aggregate_jtl(file_path, chunksize=DEFAULT_CHUNKSIZE, timeline=None):
+    """
+    Aggregate a JTL file in one chunked pass.
+
+    If a `timeline` aggregator is given it is fed the same chunks, so the
+    per-window breakdown costs no extra read of the file.
+    """
+    columns = JTL_COLUMNS + ["timeStamp"] if timeline is not None else JTL_COLUMNS
+    return _aggregate_chunks(iter_jtl_chunks(file_path, columns, chunksize=chunksize), timeline)
+
+
+def aggregate_jtl_stream(stream, chunksize=DEFAULT_CHUNKSIZE, timeline=None):
+    """Like aggregate_jtl, over a CSV JTL read from a stream (e.g. `s3_utils.open_s3_stream`)."""
+    columns = JTL_COLUMNS + ["timeStamp"] if timeline is not None else JTL_COLUMNS
+    return _aggregate_chunks(iter_jtl_stream(stream, columns, chunksize=chunksize), timeline)
+
+
+def _aggregate_chunks(chunks, timeline):
+    aggregator = JTLAggregator()
+    for chunk in chunks:
+        aggregator.update(chunk)
+        if timeline is not None:
+            timeline.update(chunk)
+    logger.info(f"📈 Aggregated {aggregator.rows} samples across {len(aggregator.labels)} labels")
+    return aggregator
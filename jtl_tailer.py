@@ -0,0 +1,158 @@
+import os
+import logging
+import threading
+from jtl_reader import parse_jtl_lines
+from jtl_aggregator import JTLAggregator, JTL_COLUMNS, save_aggregates
+from jtl_timeline import JTLTimeline
+from live_metrics import publish_live_event
+
+logger = logging.getLogger(__name__)
+
+# Seconds between live snapshots while the test runs
+TAIL_INTERVAL_SECONDS = float(os.getenv("JTL_TAIL_INTERVAL", 5))
+
+# Max bytes parsed per poll, so a burst of samples doesn't spike memory
+TAIL_READ_BYTES = 8 * 1024 * 1024
+
+
+def _complete_lines_end(data):
+    """
+    Offset just past the last complete CSV record in `data`.
+
+    A newline only ends a record when it is outside quotes, i.e. when the
+    bytes before it hold an even number of quote characters.
+    """
+    end = data.rfind(b"\n")
+    while end != -1 and data.count(b'"', 0, end) % 2:
+        end = data.rfind(b"\n", 0, end)
+    return end + 1
+
+
+class _TailCursor:
+    """Read position in one followed file."""
+
+    __slots__ = ("path", "offset", "header", "pending")
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.header = None
+        self.pending = b""
+
+
+class JTLTailer(threading.Thread):
+    """
+    Follows JTL files while JMeter appends to them (autoflush=true) and keeps
+    rolling per-label aggregates and the per-window timeline up to date.
+
+    Only newly appended bytes are parsed on each poll. A snapshot of the
+    summary is published on the job's live channel every `interval`
+    seconds, and after `stop()` the aggregates cover the whole file, so
+    the final summary is ready without re-reading the JTL. Several files
+    (one per shard of a distributed run) feed the same aggregates. If any
+    poll fails, the aggregates are incomplete and `save()` writes nothing,
+    so analyses fall back to the JTL itself.
+    """
+
+    def __init__(self, file_paths, job_id=None, interval=TAIL_INTERVAL_SECONDS):
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        super().__init__(name=f"jtl-tailer-{os.path.basename(file_paths[0])}", daemon=True)
+        self.job_id = job_id
+        self.interval = interval
+        self.aggregator = JTLAggregator()
+        self.timeline = JTLTimeline()
+        self._stop_event = threading.Event()
+        self._cursors = [_TailCursor(path) for path in file_paths]
+        self.failed = False
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if self.poll():
+                    self.publish_snapshot()
+            except Exception as e:
+                # The cursor wasn't advanced, so the next poll retries the same bytes
+                self.failed = True
+                logger.warning(f"⚠️ JTL tail poll failed: {e}")
+
+    def stop(self):
+        """
+        Stop following and parse whatever remains, including a final
+        unterminated line. Never raises, so it can't mask the run's own error.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        try:
+            while self.poll():
+                pass
+            self.poll(final=True)
+            self.publish_snapshot()
+        except Exception as e:
+            self.failed = True
+            logger.warning(f"⚠️ Final JTL tail poll failed; aggregates will not be saved: {e}")
+        return self.aggregator
+
+    def poll(self, final=False):
+        """Parse newly appended bytes; returns True when new samples were aggregated."""
+        updated = False
+        for cursor in self._cursors:
+            updated = self._poll_file(cursor, final) or updated
+        return updated
+
+    def _poll_file(self, cursor, final):
+        """
+        Parse one file's new bytes. The cursor only moves once they are
+        aggregated, so a failed parse loses nothing and is retried.
+        """
+        if not os.path.isfile(cursor.path):
+            return False
+
+        with open(cursor.path, "rb") as f:
+            f.seek(cursor.offset)
+            data = f.read(TAIL_READ_BYTES)
+        offset = cursor.offset + len(data)
+        data = cursor.pending + data
+
+        header = cursor.header
+        if header is None:
+            newline = data.find(b"\n")
+            if newline == -1:
+                cursor.offset, cursor.pending = offset, data
+                return False
+            header, data = data[:newline + 1], data[newline + 1:]
+
+        end = _complete_lines_end(data)
+        lines, pending = data[:end], data[end:]
+        chunks = [parse_jtl_lines(header, lines, JTL_COLUMNS + ["timeStamp"])] if lines.strip() else []
+        if final and pending.strip():
+            # An unterminated last row is usually cut off (killed run); keep it only if it parses
+            try:
+                chunks.append(parse_jtl_lines(header, pending, JTL_COLUMNS + ["timeStamp"]))
+            except Exception as e:
+                logger.warning(f"⚠️ Dropped malformed last line of {cursor.path}: {e}")
+            pending = b""
+
+        for chunk in chunks:
+            self.aggregator.update(chunk)
+            self.timeline.update(chunk)
+        cursor.offset, cursor.header, cursor.pending = offset, header, pending
+        return bool(chunks)
+
+    def publish_snapshot(self):
+        if not self.job_id:
+            return
+        summary = self.aggregator.summary_frame().round(2)
+        publish_live_event(self.job_id, {
+            "type": "jtl_snapshot",
+            "samples": self.aggregator.rows,
+            "summary": summary.astype(object).where(summary.notna(), None).to_dict(orient="records"),
+        })
+
+    def save(self, output_path):
+        """Write the aggregates, or return None when they are incomplete."""
+        if self.failed:
+            logger.warning("⚠️ JTL tailing had failures; not saving aggregates, analyses will read the JTL")
+            return None
+        return save_aggregates(output_path, self.aggregator, self.timeline)
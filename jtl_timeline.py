@@ -0,0 +1,72 @@
+import os
+import json
+import logging
+import pandas as pd
+from jtl_aggregator import JTLAggregator
+from latency_sketch import PERCENTILES
+
+logger = logging.getLogger(__name__)
+
+# Supported bucket widths (seconds) for the timeline
+TIMELINE_WINDOWS = (1, 10, 60)
+DEFAULT_WINDOW_SECONDS = int(os.getenv("JTL_TIMELINE_WINDOW", 10))
+
+
+class JTLTimeline(JTLAggregator):
+    """
+    Per-window, per-label aggregation keyed on the JTL `timeStamp` column.
+
+    Samples are binned by `timeStamp // window` (ms epoch, as configured in
+    minimal.properties) and reduced with the same vectorised groupby as the
+    overall summary, so each window gets real RPS, error rate and latency
+    percentiles. Windows spanning chunk boundaries merge naturally.
+    """
+
+    group_by = ["window", "label"]
+    init_fields = ("window_seconds", "relative_accuracy")
+
+    def __init__(self, window_seconds=DEFAULT_WINDOW_SECONDS, **kwargs):
+        super().__init__(**kwargs)
+        self.window_seconds = window_seconds
+        self.window_ms = int(window_seconds * 1000)
+
+    def _prepare(self, chunk):
+        timestamps = pd.to_numeric(chunk["timeStamp"], errors="coerce")
+        valid = timestamps.notna()
+        return chunk[valid].assign(
+            window=(timestamps[valid] // self.window_ms * self.window_ms).astype("int64")
+        )
+
+    def to_columns(self):
+        """Columnar (struct-of-arrays) view of the timeline, sorted by window then label."""
+        columns = {name: [] for name in (
+            ["window_start", "label", "samples", "rps", "error_rate", "avg_response_time"]
+            + [f"p{p}" for p in PERCENTILES]
+            + ["max_response_time"]
+        )}
+        for (window, label), stats in sorted(self.groups.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            columns["window_start"].append(int(window))
+            columns["label"].append(label)
+            columns["samples"].append(stats.count)
+            columns["rps"].append(round(stats.count / self.window_seconds, 2))
+            columns["error_rate"].append(round(stats.error_rate, 2))
+            columns["avg_response_time"].append(_round(stats.avg_response_time))
+            for name, value in stats.sketch.percentiles().items():
+                columns[name].append(_round(value))
+            columns["max_response_time"].append(_round(stats.elapsed_max))
+        return columns
+
+    def save(self, output_path):
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"window_seconds": self.window_seconds, "columns": self.to_columns()},
+                f, separators=(",", ":")
+            )
+        logger.info(f"🕒 Timeline saved: {output_path} ({len(self.groups)} rows)")
+        return output_path
+
+
+def _round(value):
+    if value is None or pd.isna(value):
+        return None
+    return round(float(value), 2)
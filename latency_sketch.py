@@ -0,0 +1,92 @@
+import math
+import numpy as np
+
+# Relative accuracy of reported quantiles (1% of the true value)
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# Bucket key used for zero / negative samples (e.g. 0 ms cached responses)
+ZERO_KEY = np.iinfo(np.int32).min
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class LatencySketch:
+    """
+    Mergeable quantile sketch (DDSketch) for latency samples.
+
+    Values are counted in logarithmically sized buckets, so every quantile
+    is reported within `relative_accuracy` of the true value while memory
+    only grows with the log of the latency range, not the sample count.
+    Sketches with the same accuracy can be merged across chunks, files
+    and workers, and round-trip through `to_dict`/`from_dict` as JSON.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.count = 0
+
+    def bucket_keys(self, values):
+        """Vectorised bucket index for an array of values."""
+        values = np.asarray(values, dtype=np.float64)
+        keys = np.full(values.shape, ZERO_KEY, dtype=np.int64)
+        positive = values > 0
+        keys[positive] = np.ceil(np.log(values[positive]) / self._log_gamma)
+        return keys
+
+    def add_counts(self, keys, counts):
+        buckets = self.buckets
+        for key, count in zip(np.asarray(keys).tolist(), np.asarray(counts).tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+            self.count += count
+        return self
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size:
+            keys, counts = np.unique(self.bucket_keys(values), return_counts=True)
+            self.add_counts(keys, counts)
+        return self
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy.")
+        return self.add_counts(list(other.buckets), list(other.buckets.values()))
+
+    def _bucket_value(self, key):
+        if key == ZERO_KEY:
+            return 0.0
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantiles(self, qs):
+        """Return the estimated value for each quantile in `qs` (0..1)."""
+        if not self.count:
+            return [float("nan")] * len(qs)
+
+        keys = sorted(self.buckets)
+        cumulative = np.cumsum([self.buckets[k] for k in keys])
+        ranks = [q * (self.count - 1) for q in qs]
+        positions = np.searchsorted(cumulative, np.asarray(ranks), side="right")
+        return [self._bucket_value(keys[min(p, len(keys) - 1)]) for p in positions]
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def percentiles(self, percentiles=PERCENTILES):
+        values = self.quantiles([p / 100 for p in percentiles])
+        return {f"p{p}": v for p, v in zip(percentiles, values)}
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "buckets": {str(k): v for k, v in self.buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get("relative_accuracy", DEFAULT_RELATIVE_ACCURACY))
+        buckets = data.get("buckets", {})
+        return sketch.add_counts([int(k) for k in buckets], list(buckets.values()))
@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from redis.exceptions import RedisError
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+LIVE_CHANNEL_PREFIX = "jobs:live:"
+LIVE_LAST_PREFIX = "jobs:live-last:"
+LIVE_TTL_SECONDS = 3600
+
+# Seconds between SSE keep-alive comments when no metrics arrive
+SSE_KEEPALIVE_SECONDS = 15
+
+# Threads per web worker process (gunicorn --threads, set from the same variable in docker-compose.yml)
+WEB_THREADS = int(os.getenv("WEB_THREADS", 8))
+# Each SSE subscriber holds one of them for the whole stream; by default half
+# may stream, so ordinary requests always keep the other half
+MAX_LIVE_STREAMS = int(os.getenv("MAX_LIVE_STREAMS", max(1, WEB_THREADS // 2)))
+SSE_RETRY_AFTER_SECONDS = 5
+
+_stream_slots = threading.BoundedSemaphore(MAX_LIVE_STREAMS)
+
+# summary +     10 in 00:00:05 =    2.0/s Avg:   123 Min:   100 Max:   200 Err:     0 (0.00%) Active: 5 ...
+SUMMARY_PATTERN = re.compile(
+    r"summary\s*(?P<kind>[+=])\s*(?P<samples>\d+)\s+in\s+(?P<duration>[\d:.]+)\s*=\s*"
+    r"(?P<rps>[\d.]+)/s\s+Avg:\s*(?P<avg>\d+)\s+Min:\s*(?P<min>\d+)\s+Max:\s*(?P<max>\d+)\s+"
+    r"Err:\s*(?P<errors>\d+)\s*\((?P<error_rate>[\d.]+)%\)"
+    r"(?:\s+Active:\s*(?P<active>\d+)\s+Started:\s*(?P<started>\d+)\s+Finished:\s*(?P<finished>\d+))?"
+)
+
+FINAL_EVENTS = ("done", "error")
+
+
+def parse_summary_line(line):
+    """Parse a JMeter summariser line into metrics, or return None."""
+    match = SUMMARY_PATTERN.search(line)
+    if not match:
+        return None
+
+    fields = match.groupdict()
+    metrics = {
+        "type": "delta" if fields["kind"] == "+" else "cumulative",
+        "samples": int(fields["samples"]),
+        "duration": fields["duration"],
+        "rps": float(fields["rps"]),
+        "avg": int(fields["avg"]),
+        "min": int(fields["min"]),
+        "max": int(fields["max"]),
+        "errors": int(fields["errors"]),
+        "error_rate": float(fields["error_rate"]),
+    }
+    for key in ("active", "started", "finished"):
+        if fields[key] is not None:
+            metrics[key] = int(fields[key])
+    return metrics
+
+
+def publish_live_event(job_id, event, snapshot=None):
+    """
+    Publish an event for a running job and keep it as the latest snapshot.
+
+    Incremental events (e.g. streamed text) pass the accumulated state as
+    `snapshot` for late subscribers; both carry the same `seq` so the
+    stream skips deltas the snapshot already includes.
+    """
+    if not job_id:
+        return
+    now = time.time()
+    payload = json.dumps({**event, "ts": now})
+    last = json.dumps({**snapshot, "ts": now}) if snapshot is not None else payload
+    try:
+        r = get_redis()
+        r.pipeline().publish(f"{LIVE_CHANNEL_PREFIX}{job_id}", payload).setex(
+            f"{LIVE_LAST_PREFIX}{job_id}", LIVE_TTL_SECONDS, last
+        ).execute()
+    except RedisError as e:
+        logger.warning(f"⚠️ Failed to publish live metrics for job {job_id}: {e}")
+
+
+def acquire_stream_slot():
+    """Take one of this process's SSE slots without waiting; False if all are in use."""
+    return _stream_slots.acquire(blocking=False)
+
+
+def release_stream_slot():
+    _stream_slots.release()
+
+
+def stream_live_events(job_id, is_finished=lambda: False):
+    """
+    Server-Sent Events generator for a job's live metrics.
+
+    Sends the latest snapshot first so late subscribers see current state,
+    then relays pub/sub messages until a final event arrives or
+    `is_finished()` reports the job is over.
+    """
+    r = get_redis()
+    pubsub = r.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(f"{LIVE_CHANNEL_PREFIX}{job_id}")
+    try:
+        last = r.get(f"{LIVE_LAST_PREFIX}{job_id}")
+        seen_seq = -1
+        if last:
+            yield f"data: {last}\n\n"
+            last = json.loads(last)
+            if last.get("type") in FINAL_EVENTS:
+                return
+            seen_seq = last.get("seq", -1)
+
+        while True:
+            message = pubsub.get_message(timeout=SSE_KEEPALIVE_SECONDS)
+            if message is None:
+                if is_finished():
+                    return
+                yield ": keepalive\n\n"
+                continue
+
+            event = json.loads(message["data"])
+            if event.get("seq", seen_seq + 1) <= seen_seq:
+                continue
+            yield f"data: {message['data']}\n\n"
+            if event.get("type") in FINAL_EVENTS:
+                return
+    finally:
+        pubsub.close()
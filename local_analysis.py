@@ -0,0 +1,308 @@
+import os
+import math
+import logging
+from datetime import datetime, timezone
+from jtl_aggregator import LabelStats
+from container_telemetry import format_bottlenecks
+
+logger = logging.getLogger(__name__)
+
+# Default service levels; /analyzeJTL can override them per request
+SLA_P95_MS = float(os.getenv("ANALYSIS_SLA_P95_MS", 1000))
+SLA_ERROR_RATE = float(os.getenv("ANALYSIS_SLA_ERROR_RATE", 1.0))
+
+# A window is an error spike above max(factor x run error rate, run rate + floor) percent
+ERROR_SPIKE_FACTOR = 3.0
+ERROR_SPIKE_FLOOR = 5.0
+
+# A window regresses when its P95 exceeds the run's P95 by this factor
+REGRESSION_FACTOR = 1.5
+
+# Windows with fewer samples are too noisy to judge
+MIN_WINDOW_SAMPLES = 20
+
+# Load steps: windows whose average thread counts are within this share of
+# each other, and only steps held for several windows (single windows are
+# dominated by sampling noise)
+STEP_WIDTH = 0.10
+MIN_STEP_WINDOWS = 3
+
+# Plateau: every one of the next PLATEAU_STEPS steps has at least this much
+# more load than a step, yet throughput grows less than PLATEAU_RPS_GROWTH
+PLATEAU_STEPS = 2
+PLATEAU_THREAD_GROWTH = 0.10
+PLATEAU_RPS_GROWTH = 0.05
+
+# Saturation knee: latency up by this much over the lightest load step...
+KNEE_LATENCY_GROWTH = 0.5
+# ...while each added thread buys less than this share of the initial rps per thread
+KNEE_EFFICIENCY = 0.5
+
+LONG_TAIL_RATIO = 10
+
+AI_SECTION_HEADING = "## 🤖 AI insights"
+
+SEVERITY_ICONS = {"critical": "🔴", "warning": "🟠", "info": "🔵"}
+
+
+def _clock(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%H:%M:%S")
+
+
+def _fmt(value, unit=""):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "n/a"
+    if abs(value) >= 100 or float(value).is_integer():
+        return f"{value:,.0f}{unit}"
+    return f"{value:,.2f}{unit}"
+
+
+def _finding(kind, severity, title, detail, **data):
+    return {"kind": kind, "severity": severity, "title": title, "detail": detail, **data}
+
+
+def _windows(timeline):
+    """Per-window totals across labels, in time order: (start_ms, LabelStats)."""
+    combined = {}
+    for (window, _), stats in timeline.groups.items():
+        combined.setdefault(window, LabelStats()).merge(stats)
+    return sorted(combined.items())
+
+
+def _sla_breaches(summary, sla_p95_ms, sla_error_rate):
+    findings = []
+    for _, row in summary.iterrows():
+        if row["p95"] is not None and row["p95"] > sla_p95_ms:
+            findings.append(_finding(
+                "sla_latency", "critical", f"{row['label']}: P95 above SLA",
+                f"P95 is {_fmt(row['p95'], 'ms')} against an SLA of {_fmt(sla_p95_ms, 'ms')}.",
+                label=row["label"], value=row["p95"], threshold=sla_p95_ms,
+            ))
+        if row["error_rate"] > sla_error_rate:
+            findings.append(_finding(
+                "sla_errors", "critical", f"{row['label']}: error rate above SLA",
+                f"{_fmt(row['error_rate'], '%')} of requests failed against an SLA of {_fmt(sla_error_rate, '%')}.",
+                label=row["label"], value=row["error_rate"], threshold=sla_error_rate,
+            ))
+    return findings
+
+
+def _long_tails(summary):
+    findings = []
+    for _, row in summary.iterrows():
+        if row["p50"] and row["p99"] and row["p99"] / row["p50"] >= LONG_TAIL_RATIO:
+            findings.append(_finding(
+                "long_tail", "warning", f"{row['label']}: long latency tail",
+                f"P99 ({_fmt(row['p99'], 'ms')}) is {row['p99'] / row['p50']:.0f}x the median "
+                f"({_fmt(row['p50'], 'ms')}): a minority of requests is much slower than the rest.",
+                label=row["label"], value=row["p99"] / row["p50"], threshold=LONG_TAIL_RATIO,
+            ))
+    return findings
+
+
+def _merge_intervals(windows, window_ms):
+    """Group consecutive flagged windows into (start, end, windows) intervals."""
+    intervals = []
+    for window, stats in windows:
+        if intervals and window - intervals[-1][1] <= window_ms:
+            intervals[-1][1] = window
+            intervals[-1][2].append(stats)
+        else:
+            intervals.append([window, window, [stats]])
+    return intervals
+
+
+def _error_spikes(windows, window_ms, run_error_rate):
+    threshold = max(run_error_rate * ERROR_SPIKE_FACTOR, run_error_rate + ERROR_SPIKE_FLOOR)
+    spiking = [(w, s) for w, s in windows if s.count >= MIN_WINDOW_SAMPLES and s.error_rate > threshold]
+    findings = []
+    for start, end, stats in _merge_intervals(spiking, window_ms):
+        peak = max(s.error_rate for s in stats)
+        findings.append(_finding(
+            "error_spike", "critical", f"Error spike {_clock(start)}–{_clock(end + window_ms)} UTC",
+            f"Error rate peaked at {_fmt(peak, '%')} (run average {_fmt(run_error_rate, '%')}).",
+            start=start, end=end + window_ms, value=peak, threshold=threshold,
+        ))
+    return findings
+
+
+def _latency_regressions(windows, window_ms, run_p95):
+    if not run_p95:
+        return []
+    threshold = run_p95 * REGRESSION_FACTOR
+    slow = [(w, s) for w, s in windows
+            if s.count >= MIN_WINDOW_SAMPLES and (s.sketch.quantile(0.95) or 0) > threshold]
+    findings = []
+    for start, end, stats in _merge_intervals(slow, window_ms):
+        peak = max(s.sketch.quantile(0.95) for s in stats)
+        findings.append(_finding(
+            "latency_regression", "warning", f"Latency regression {_clock(start)}–{_clock(end + window_ms)} UTC",
+            f"P95 reached {_fmt(peak, 'ms')}, {peak / run_p95:.1f}x the run's P95 of {_fmt(run_p95, 'ms')}.",
+            start=start, end=end + window_ms, value=peak, threshold=threshold,
+        ))
+    return findings
+
+
+def load_steps(windows, window_seconds):
+    """
+    Windows grouped into load levels by their average active thread count
+    (the load a window actually saw; its maximum overstates it while
+    ramping), ascending. Levels seen in fewer than MIN_STEP_WINDOWS windows
+    are dropped. Each step has the mean thread count, and the median
+    throughput (rps) and median average latency at that load.
+    """
+    loaded = sorted(((s.avg_threads, s) for _, s in windows if s.count >= MIN_WINDOW_SAMPLES and s.avg_threads),
+                    key=lambda item: item[0])
+    groups = []
+    for threads, stats in loaded:
+        if groups and threads <= groups[-1][0][0] * (1 + STEP_WIDTH):
+            groups[-1].append((threads, stats))
+        else:
+            groups.append([(threads, stats)])
+
+    steps = []
+    for group in groups:
+        if len(group) < MIN_STEP_WINDOWS:
+            continue
+        rps = sorted(s.count / window_seconds for _, s in group)
+        latency = sorted(s.avg_response_time for _, s in group)
+        steps.append({
+            "threads": round(sum(t for t, _ in group) / len(group), 1),
+            "rps": rps[len(rps) // 2],
+            "latency": latency[len(latency) // 2],
+            "windows": len(group),
+        })
+    return steps
+
+
+def _plateau(steps):
+    """First step after which throughput stays flat for PLATEAU_STEPS steps of growing load."""
+    for index, step in enumerate(steps[:-PLATEAU_STEPS]):
+        following = steps[index + 1:index + 1 + PLATEAU_STEPS]
+        if step["rps"] and all(
+            later["threads"] >= step["threads"] * (1 + PLATEAU_THREAD_GROWTH)
+            and later["rps"] < step["rps"] * (1 + PLATEAU_RPS_GROWTH)
+            for later in following
+        ):
+            return step, following[-1]
+    return None
+
+
+def _capacity(steps):
+    """Throughput plateau and saturation knee over the load steps of a ramp-up."""
+    if len(steps) < 3:
+        return []
+
+    findings = []
+    base = steps[0]
+    base_efficiency = base["rps"] / base["threads"] if base["threads"] else 0
+
+    plateau = _plateau(steps)
+    if plateau:
+        start, end = plateau
+        thread_growth = end["threads"] / start["threads"] - 1
+        rps_growth = end["rps"] / start["rps"] - 1
+        findings.append(_finding(
+            "throughput_plateau", "warning", f"Throughput plateau from {_fmt(start['threads'])} threads",
+            f"Going from {_fmt(start['threads'])} to {_fmt(end['threads'])} threads (+{thread_growth:.0%}) "
+            f"moved throughput only {rps_growth:+.0%} ({_fmt(start['rps'])} → {_fmt(end['rps'])} rps).",
+            threads=start["threads"], value=start["rps"],
+        ))
+
+    for previous, step in zip(steps, steps[1:]):
+        added = step["threads"] - previous["threads"]
+        marginal = (step["rps"] - previous["rps"]) / added if added else 0
+        latency_growth = step["latency"] / base["latency"] - 1 if base["latency"] else 0
+        if latency_growth >= KNEE_LATENCY_GROWTH and marginal < base_efficiency * KNEE_EFFICIENCY:
+            findings.append(_finding(
+                "saturation_knee", "critical", f"Saturation knee at about {_fmt(previous['threads'])} threads",
+                f"Beyond {_fmt(previous['threads'])} threads ({_fmt(previous['rps'])} rps) extra users add little "
+                f"throughput while average latency rises from {_fmt(base['latency'], 'ms')} to "
+                f"{_fmt(step['latency'], 'ms')}. Treat ~{previous['threads']:.0f} concurrent users as current "
+                f"capacity.",
+                threads=previous["threads"], value=previous["rps"],
+            ))
+            break
+    return findings
+
+
+RECOMMENDATIONS = {
+    "sla_latency": "Profile the slowest endpoints (DB queries, downstream calls) and re-test against the SLA.",
+    "sla_errors": "Inspect server logs for the failing requests; errors usually point at the first limit hit.",
+    "error_spike": "Correlate the spike windows with server logs, deployments and autoscaling events.",
+    "latency_regression": "Check GC pauses, connection-pool exhaustion and background jobs in the slow windows.",
+    "long_tail": "Look for lock contention, cold caches or retries behind the slowest requests.",
+    "throughput_plateau": "Find the resource that stops scaling (CPU, DB connections, thread pools) at the plateau.",
+    "saturation_knee": "Size production for fewer users than the knee, or scale the bottleneck before more load.",
+    "generator_bottleneck": "Give the runner more CPU/memory or spread the load over more nodes, then re-run.",
+}
+
+
+def analyze(summary, timeline=None, bottlenecks=None, sla_p95_ms=SLA_P95_MS, sla_error_rate=SLA_ERROR_RATE):
+    """
+    Rule-based findings for a run: SLA breaches, long tails and, with a
+    timeline, error spikes, latency regressions and capacity limits.
+    Returns (verdict, findings).
+    """
+    findings = _sla_breaches(summary, sla_p95_ms, sla_error_rate) + _long_tails(summary)
+
+    if timeline is not None and timeline.groups:
+        windows = _windows(timeline)
+        overall = LabelStats()
+        for _, stats in windows:
+            overall.merge(stats)
+        findings += _error_spikes(windows, timeline.window_ms, overall.error_rate)
+        findings += _latency_regressions(windows, timeline.window_ms, overall.sketch.quantile(0.95))
+        findings += _capacity(load_steps(windows, timeline.window_seconds))
+
+    for bottleneck in bottlenecks or []:
+        findings.append(_finding(
+            "generator_bottleneck", "warning", f"Load generator saturated on node {bottleneck['node']}",
+            f"{format_bottlenecks([bottleneck])[2:]}. Latency in this interval reflects the JMeter runner, "
+            "not the system under test.",
+            start=bottleneck["start"], end=bottleneck["end"],
+        ))
+
+    verdict = "FAIL" if any(f["severity"] == "critical" for f in findings) else (
+        "WARN" if findings else "PASS"
+    )
+    return verdict, findings
+
+
+def render_report(summary, verdict, findings, sla_p95_ms=SLA_P95_MS, sla_error_rate=SLA_ERROR_RATE):
+    """Markdown report of the summary table and the findings."""
+    lines = [
+        "# Performance Test Analysis",
+        "",
+        f"**Verdict: {verdict}** (SLA: P95 ≤ {_fmt(sla_p95_ms, 'ms')}, errors ≤ {_fmt(sla_error_rate, '%')})",
+        "",
+        "## Summary",
+        "",
+        "| Label | Samples | Avg (ms) | P50 | P90 | P95 | P99 | Max | Errors | Users |",
+        "|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    for _, row in summary.iterrows():
+        lines.append(
+            f"| {row['label']} | {_fmt(row['throughput'])} | {_fmt(row['avg_response_time'])} | "
+            f"{_fmt(row['p50'])} | {_fmt(row['p90'])} | {_fmt(row['p95'])} | {_fmt(row['p99'])} | "
+            f"{_fmt(row['max_response_time'])} | {_fmt(row['error_rate'], '%')} | {_fmt(row['concurrent_users'])} |"
+        )
+
+    lines += ["", "## Findings", ""]
+    if not findings:
+        lines.append("No SLA breaches, error spikes, regressions or capacity limits detected.")
+    for finding in findings:
+        lines.append(f"- {SEVERITY_ICONS[finding['severity']]} **{finding['title']}**: {finding['detail']}")
+
+    recommendations = list(dict.fromkeys(RECOMMENDATIONS[f["kind"]] for f in findings))
+    if recommendations:
+        lines += ["", "## Recommendations", ""]
+        lines += [f"- {text}" for text in recommendations]
+    return "\n".join(lines) + "\n"
+
+
+def with_ai_insights(report, insights):
+    """The local report followed by Gemini's commentary, if there is any."""
+    if not insights:
+        return report
+    return f"{report}\n{AI_SECTION_HEADING}\n\n{insights.strip()}\n"
@@ -0,0 +1,66 @@
+import os
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Seconds between metrics log lines from each process; 0 disables
+METRICS_LOG_SECONDS = int(os.getenv("METRICS_LOG_SECONDS", 300))
+
+_sources = {}
+_reporter = None
+_lock = threading.Lock()
+
+
+class _MetricsReporter(threading.Thread):
+    """Logs every registered snapshot of this process's counters on an interval."""
+
+    def __init__(self, interval):
+        super().__init__(name="metrics-log", daemon=True)
+        self.interval = interval
+        self.pid = os.getpid()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            report_metrics()
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        self.join(timeout)
+
+
+def report_metrics():
+    """Log each non-empty snapshot once."""
+    with _lock:
+        sources = list(_sources.items())
+    for name, snapshot in sources:
+        try:
+            data = snapshot()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not collect {name} metrics: {e}")
+            continue
+        if data:
+            logger.info(f"📊 {name} metrics (pid {os.getpid()}): {json.dumps(data, default=str)}")
+
+
+def start_metrics_log():
+    """
+    Start this process's reporter if it isn't running. Threads don't
+    survive a fork, so prefork workers call this again in each child.
+    """
+    global _reporter
+    if METRICS_LOG_SECONDS <= 0:
+        return
+    with _lock:
+        if _reporter is None or _reporter.pid != os.getpid() or not _reporter.is_alive():
+            _reporter = _MetricsReporter(METRICS_LOG_SECONDS)
+            _reporter.start()
+
+
+def register_metrics(name, snapshot):
+    """Log `snapshot()`, a dict of per-process counters, every METRICS_LOG_SECONDS."""
+    with _lock:
+        _sources[name] = snapshot
+    start_metrics_log()
@@ -0,0 +1,261 @@
+import os
+import re
+import hashlib
+import logging
+from datetime import datetime, timezone
+import xml.etree.ElementTree as ET
+from pymongo import ASCENDING, DESCENDING
+from redis.exceptions import RedisError
+from users.models import db
+from redis_client import get_redis
+from jmx_builder import load_shape, parse_load_shape, prompt_urls
+from jmx_validator import validate_jmx, has_errors, is_thread_group
+
+logger = logging.getLogger(__name__)
+
+plan_library = db["plan_library"]
+
+# Entries unused for this long expire (Mongo TTL index on last_used)
+PLAN_LIBRARY_TTL_SECONDS = int(os.getenv("PLAN_LIBRARY_TTL", 30 * 24 * 3600))
+# Least recently used entries beyond this are evicted per user
+PLAN_LIBRARY_MAX_PER_USER = int(os.getenv("PLAN_LIBRARY_MAX_PER_USER", 200))
+# Jaccard similarity of normalised prompt terms needed to reuse a plan
+PLAN_LIBRARY_SIMILARITY = float(os.getenv("PLAN_LIBRARY_SIMILARITY", 0.8))
+
+plan_library.create_index("last_used", expireAfterSeconds=PLAN_LIBRARY_TTL_SECONDS)
+plan_library.create_index([("user", ASCENDING), ("urls", ASCENDING), ("last_used", DESCENDING)])
+plan_library.create_index([("user", ASCENDING), ("fingerprint", ASCENDING)], unique=True)
+
+HITS_KEY = "plans:library-hits"
+ADAPTED_KEY = "plans:library-adapted"
+MISSES_KEY = "plans:library-misses"
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "for", "with", "on", "in", "at", "by", "it", "is", "be",
+    "that", "this", "my", "our", "me", "us", "please", "can", "you", "i", "we", "want", "need", "create",
+    "generate", "make", "build", "write", "jmeter", "jmx", "test", "plan", "script", "which", "then",
+    "also", "should", "will", "each", "using", "against",
+}
+# Time units of the load shape are adapted rather than matched
+TIME_UNITS = {"ms", "millisecond", "s", "sec", "second", "m", "min", "minute", "h", "hr", "hour"}
+URL_TOKEN = re.compile(r"https?://\S+", re.I)
+NUMBER_TOKEN = re.compile(r"\d[\d,.]*")
+# Any other number changes the plan (think time, throughput, asserted status, ...) and is matched exactly
+VALUE_TOKEN = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(ms|milliseconds?|s|secs?|seconds?|m|mins?|minutes?|h|hrs?|"
+                         r"hours?|rps|rpm|%)?\b", re.I)
+WORD = re.compile(r"[a-z0-9][a-z0-9.%]*")
+
+SHAPE_PROPERTIES = {
+    "users": "ThreadGroup.num_threads",
+    "ramp_up": "ThreadGroup.ramp_time",
+    "duration": "ThreadGroup.duration",
+}
+
+
+def _value_term(match):
+    """A number outside the load shape as one term, time spans in milliseconds: "30 s" -> "v30000ms"."""
+    number, unit = match.group(1).replace(",", ""), (match.group(2) or "").lower()
+    if unit in TIME_UNITS or unit.rstrip("s") in TIME_UNITS:
+        if unit == "ms" or unit.startswith("milli"):
+            scale = 1
+        else:
+            scale = {"s": 1000, "m": 60_000, "h": 3_600_000}[unit[0]]
+        return f" v{float(number) * scale:g}ms "
+    return f" v{float(number):g}{unit} "
+
+
+def _terms(prompt):
+    """
+    Normalised terms of a prompt; plurals and filler words go. URLs and
+    the load-shape numbers (users, duration, ramp-up, loops), which
+    _adapt rewrites, become placeholders; every other number is kept.
+    """
+    spans = []
+    for start, end in sorted(parse_load_shape(prompt)[1]):
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+
+    pieces, position = [], 0
+    for start, end in spans + [[len(prompt), len(prompt)]]:
+        pieces.append(VALUE_TOKEN.sub(_value_term, URL_TOKEN.sub(" url ", prompt[position:start])))
+        pieces.append(NUMBER_TOKEN.sub(" num ", prompt[start:end]))
+        position = end
+    text = "".join(pieces).lower()
+
+    words = [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") and w.isalpha() else w
+             for w in WORD.findall(text) if w not in STOPWORDS]
+    return ["unit" if w in TIME_UNITS else w for w in words]
+
+
+def fingerprint(prompt):
+    """
+    Local prompt features: the set of normalised unigrams and bigrams,
+    the target URLs, and a hash of both for exact matches. Prompts that
+    differ only in users, duration, ramp-up or loops share a digest.
+    """
+    words = _terms(prompt)
+    features = sorted(set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])})
+    urls = sorted(set(prompt_urls(prompt)))
+    digest = hashlib.sha256("\0".join(features + ["|"] + urls).encode("utf-8")).hexdigest()
+    return digest, features, urls
+
+
+def _similarity(a, b):
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def _count(key):
+    try:
+        get_redis().incr(key)
+    except RedisError as e:
+        logger.warning(f"⚠️ Plan library metrics update failed: {e}")
+
+
+def _loops(group):
+    return next((p for p in group.iter("stringProp") if p.get("name") == "LoopController.loops"), None)
+
+
+def _set_loops(group, value):
+    """Set the thread group's loop count; returns True when it changed."""
+    loops = _loops(group)
+    if loops is None or (loops.text or "").strip() == value:
+        return False
+    loops.text = value
+    return True
+
+
+def _adapt(xml_content, shape):
+    """
+    The stored plan with the load shape the new prompt asks for (users,
+    duration or loops, ramp-up). Only single-thread-group plans are
+    adapted; returns None when the plan can't be adapted safely.
+    """
+    root = ET.fromstring(xml_content)
+    groups = [g for g in root.iter() if is_thread_group(g) and g.get("enabled", "true") != "false"
+              and g.tag not in ("SetupThreadGroup", "PostThreadGroup")]
+    # Plugin thread groups shape load with their own properties
+    if len(groups) != 1 or groups[0].tag != "ThreadGroup":
+        return None
+    group = groups[0]
+    props = {p.get("name"): p for p in group if p.get("name")}
+
+    changed = False
+    for field, name in SHAPE_PROPERTIES.items():
+        if field not in shape:
+            continue
+        value = str(shape[field])
+        prop = props.get(name)
+        if prop is None:
+            prop = ET.SubElement(group, "stringProp", name=name)
+        if (prop.text or "").strip() != value:
+            prop.text = value
+            changed = True
+
+    if "duration" in shape:
+        scheduler = props.get("ThreadGroup.scheduler")
+        if scheduler is None:
+            scheduler = ET.SubElement(group, "boolProp", name="ThreadGroup.scheduler")
+        if scheduler.text != "true":
+            scheduler.text = "true"
+            changed = True
+        # The scheduler bounds the run; loops must not stop it early
+        changed = _set_loops(group, "-1") or changed
+    elif "loops" in shape:
+        if _loops(group) is None:
+            return None
+        # A fixed number of iterations; a scheduler would cut them short
+        scheduler = props.get("ThreadGroup.scheduler")
+        if scheduler is not None and scheduler.text == "true":
+            scheduler.text = "false"
+            changed = True
+        changed = _set_loops(group, str(shape["loops"])) or changed
+
+    if not changed:
+        return xml_content
+    adapted = '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(root, encoding="unicode")
+    return None if has_errors(validate_jmx(adapted)) else adapted
+
+
+def find_plan(user, prompt):
+    """
+    A plan from the user's library for this prompt, or None.
+
+    Candidates target the same URLs; the most similar one at or above
+    PLAN_LIBRARY_SIMILARITY is reused, with its users, duration and
+    ramp-up adjusted to what the new prompt asks for.
+    Returns (xml, similarity, adapted).
+    """
+    digest, features, urls = fingerprint(prompt)
+    best, best_score = None, 0.0
+    for entry in plan_library.find({"user": user, "urls": urls}, {"features": 1, "fingerprint": 1, "jmx": 1}):
+        score = 1.0 if entry["fingerprint"] == digest else _similarity(features, entry["features"])
+        if score > best_score:
+            best, best_score = entry, score
+
+    if best is None or best_score < PLAN_LIBRARY_SIMILARITY:
+        _count(MISSES_KEY)
+        return None
+
+    try:
+        xml_content = _adapt(best["jmx"], load_shape(prompt))
+    except ET.ParseError:
+        xml_content = None
+    if xml_content is None:
+        _count(MISSES_KEY)
+        return None
+
+    adapted = xml_content != best["jmx"]
+    plan_library.update_one(
+        {"_id": best["_id"]}, {"$set": {"last_used": datetime.now(timezone.utc)}, "$inc": {"hits": 1}}
+    )
+    _count(ADAPTED_KEY if adapted else HITS_KEY)
+    logger.info(f"📚 Plan library hit for {user} (similarity {best_score:.2f}{', adapted' if adapted else ''})")
+    return xml_content, round(best_score, 3), adapted
+
+
+def remember_plan(user, prompt, xml_content):
+    """Store a validated plan for the prompt, then evict the user's least recently used overflow."""
+    digest, features, urls = fingerprint(prompt)
+    now = datetime.now(timezone.utc)
+    plan_library.update_one(
+        {"user": user, "fingerprint": digest},
+        {
+            "$set": {"prompt": prompt, "features": features, "urls": urls, "jmx": xml_content, "last_used": now},
+            "$setOnInsert": {"created_at": now, "hits": 0},
+        },
+        upsert=True,
+    )
+
+    overflow = plan_library.count_documents({"user": user}) - PLAN_LIBRARY_MAX_PER_USER
+    if overflow > 0:
+        stale = [doc["_id"] for doc in
+                 plan_library.find({"user": user}, {"_id": 1}).sort("last_used", ASCENDING).limit(overflow)]
+        plan_library.delete_many({"_id": {"$in": stale}})
+        logger.info(f"🧹 Evicted {len(stale)} plan library entries for {user}")
+
+
+def clear_user_library(user):
+    return plan_library.delete_many({"user": user}).deleted_count
+
+
+def library_stats(user=None):
+    """Hit/adapt/miss counters and hit rate across users, plus entry counts."""
+    try:
+        hits, adapted, misses = (int(v or 0) for v in get_redis().mget(HITS_KEY, ADAPTED_KEY, MISSES_KEY))
+    except RedisError as e:
+        logger.warning(f"⚠️ Plan library metrics unavailable: {e}")
+        hits = adapted = misses = 0
+    lookups = hits + adapted + misses
+    stats = {
+        "hits": hits,
+        "adapted_hits": adapted,
+        "misses": misses,
+        "hit_rate": round((hits + adapted) / lookups * 100, 2) if lookups else 0.0,
+        "entries": plan_library.estimated_document_count(),
+    }
+    if user is not None:
+        stats["user_entries"] = plan_library.count_documents({"user": user})
+    return stats
@@ -0,0 +1,17 @@
+import os
+from redis import Redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+_redis = None
+
+
+def get_redis():
+    """Process-wide Redis client (thread-safe, pooled) on the Celery Redis instance."""
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(REDIS_URL, decode_responses=True)
+    return _redis
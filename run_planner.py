@@ -0,0 +1,232 @@
+import os
+import re
+import json
+import math
+import logging
+import xml.etree.ElementTree as ET
+from redis.exceptions import RedisError
+from redis_client import get_redis
+from run_scheduler import RUNNER_CPUS, RUNNER_MEMORY_MB
+from sharding import unsplittable_groups
+from jmx_validator import is_thread_group
+
+logger = logging.getLogger(__name__)
+
+MINIMAL_PROPERTIES = os.path.join(os.path.dirname(__file__), "minimal.properties")
+
+# Heap model: a base for JMeter itself plus, per virtual user, its buffers
+# and its own clone of the test tree (each thread copies every element)
+HEAP_BASE_MB = int(os.getenv("JMETER_HEAP_BASE_MB", 256))
+HEAP_PER_THREAD_MB = float(os.getenv("JMETER_HEAP_PER_THREAD_MB", 0.25))
+HEAP_PER_THREAD_ELEMENT_KB = float(os.getenv("JMETER_HEAP_PER_THREAD_ELEMENT_KB", 10))
+MIN_HEAP_MB = int(os.getenv("JMETER_MIN_HEAP_MB", 512))
+MAX_HEAP_MB = int(os.getenv("JMETER_MAX_HEAP_MB", 8192))
+
+# Off-heap: metaspace, code cache, GC structures, plus one stack per thread
+JVM_OVERHEAD_MB = 192
+THREAD_STACK_KB = 256
+
+# Virtual users one CPU can drive before the generator becomes the bottleneck
+THREADS_PER_CPU = int(os.getenv("JMETER_THREADS_PER_CPU", 200))
+MAX_CPUS = float(os.getenv("JMETER_MAX_CPUS", 4))
+
+G1_FLAGS = "-XX:+UseG1GC -XX:MaxGCPauseMillis=100 -XX:G1ReservePercent=20"
+
+# Listeners only re-record what -l already writes to the .jtl; in non-GUI
+# mode they cost throughput (View Results Tree keeps every response)
+LISTENER_TAGS = {"ResultCollector"}
+
+# Plan profiles recorded at upload, for sizing runs at admission
+PLAN_STATS_PREFIX = "plans:stats:"
+PLAN_STATS_TTL_SECONDS = int(os.getenv("PLAN_STATS_TTL", 90 * 24 * 3600))
+
+
+def _prop(elem, name):
+    for child in elem:
+        if child.get("name") == name:
+            return (child.text or "").strip()
+    return None
+
+
+def _enabled(elem):
+    return elem.get("enabled", "true") != "false"
+
+
+def _walk(tree, inherited=True):
+    """(element, enabled) for every test element, following hashTree nesting; disabled parents disable children."""
+    children = list(tree)
+    for index, elem in enumerate(children):
+        if elem.tag == "hashTree":
+            continue
+        enabled = inherited and _enabled(elem)
+        yield elem, enabled
+        if index + 1 < len(children) and children[index + 1].tag == "hashTree":
+            yield from _walk(children[index + 1], enabled)
+
+
+def inspect_plan(root):
+    """
+    Static profile of a parsed plan: threads (None if any enabled thread
+    group's count is an expression), enabled test elements and samplers,
+    listeners, the longest scheduled duration and whether it asserts.
+    """
+    profile = {"threads": 0, "elements": 0, "samplers": 0, "listeners": [], "duration": None,
+               "assertions": False, "embedded_resources": False}
+    top = root.find("hashTree")
+    for elem, enabled in _walk(top if top is not None else root):
+        if elem.tag in LISTENER_TAGS:
+            profile["listeners"].append(elem)
+        if not enabled:
+            continue
+        profile["elements"] += 1
+        if elem.tag.endswith("Sampler") or elem.tag.endswith("SamplerProxy"):
+            profile["samplers"] += 1
+            if _prop(elem, "HTTPSampler.image_parser") == "true":
+                profile["embedded_resources"] = True
+        elif elem.tag.endswith("Assertion"):
+            profile["assertions"] = True
+        elif is_thread_group(elem):
+            # Plugin groups size their threads differently (e.g. TargetLevel); count them as unknown
+            threads = _prop(elem, "ThreadGroup.num_threads") or ""
+            if profile["threads"] is not None:
+                profile["threads"] = profile["threads"] + int(threads) if threads.isdigit() else None
+            duration = _prop(elem, "ThreadGroup.duration") or ""
+            if _prop(elem, "ThreadGroup.scheduler") == "true" and duration.isdigit():
+                profile["duration"] = max(profile["duration"] or 0, int(duration))
+    return profile
+
+
+def size_runner(threads, elements):
+    """
+    Heap, container memory (MB), CPUs and GC flags for one runner driving
+    `threads` virtual users over a plan of `elements` test elements.
+    Unknown thread counts get the static runner defaults.
+    """
+    if threads is None:
+        heap_mb = int(RUNNER_MEMORY_MB * 0.75)
+        return {"heap_mb": heap_mb, "memory_mb": RUNNER_MEMORY_MB, "cpus": RUNNER_CPUS, "gc": G1_FLAGS}
+
+    per_thread_mb = HEAP_PER_THREAD_MB + elements * HEAP_PER_THREAD_ELEMENT_KB / 1024
+    heap_mb = int(min(MAX_HEAP_MB, max(MIN_HEAP_MB, HEAP_BASE_MB + threads * per_thread_mb)))
+    heap_mb = math.ceil(heap_mb / 64) * 64
+
+    stacks_mb = threads * THREAD_STACK_KB / 1024
+    memory_mb = math.ceil((heap_mb + JVM_OVERHEAD_MB + stacks_mb) * 1.1 / 64) * 64
+
+    # Half-CPU steps between one CPU and MAX_CPUS
+    cpus = min(MAX_CPUS, max(1.0, math.ceil(threads / THREADS_PER_CPU * 2) / 2))
+
+    if cpus <= 1 and heap_mb <= 1024:
+        # One core: concurrent collector threads would only compete with the samplers
+        gc = "-XX:+UseSerialGC"
+    else:
+        gc = G1_FLAGS
+        if heap_mb >= 4096:
+            gc += " -XX:+ParallelRefProcEnabled"
+    return {"heap_mb": heap_mb, "memory_mb": memory_mb, "cpus": cpus, "gc": gc}
+
+
+def jvm_environment(sizing):
+    """Environment variables the jmeter launcher script reads for the JVM."""
+    return {
+        "HEAP": f"-Xms{sizing['heap_mb']}m -Xmx{sizing['heap_mb']}m -XX:MaxMetaspaceSize=256m",
+        "GC_ALGO": sizing["gc"],
+        "JVM_ARGS": f"-Xss{THREAD_STACK_KB}k",
+    }
+
+
+def _threads_per_node(profile, nodes):
+    return math.ceil(profile["threads"] / nodes) if profile["threads"] is not None else None
+
+
+def remember_plan_stats(s3_key, xml_content):
+    """
+    Record what admission needs to know about a plan when it is uploaded,
+    so a run can be sized without downloading the plan on the request path.
+    """
+    root = ET.fromstring(xml_content)
+    profile = inspect_plan(root)
+    stats = {"threads": profile["threads"], "elements": profile["elements"],
+             "shardable": not unsplittable_groups(root)}
+    try:
+        get_redis().setex(f"{PLAN_STATS_PREFIX}{s3_key}", PLAN_STATS_TTL_SECONDS, json.dumps(stats))
+    except RedisError as e:
+        logger.warning(f"⚠️ Could not store plan stats for {s3_key}: {e}")
+
+
+def plan_stats(s3_key):
+    """Stats stored by remember_plan_stats, or None (unknown plan, expired, or Redis unavailable)."""
+    try:
+        raw = get_redis().get(f"{PLAN_STATS_PREFIX}{s3_key}")
+    except RedisError as e:
+        logger.warning(f"⚠️ Could not read plan stats for {s3_key}: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+def plan_resources(stats, nodes=1):
+    """CPUs and memory (MB) one runner of a plan with these stats needs; for admission before the run."""
+    sizing = size_runner(_threads_per_node(stats, nodes), stats["elements"])
+    return {"cpus": sizing["cpus"], "memory_mb": sizing["memory_mb"]}
+
+
+def prepare_run(jmx_path, properties_path, nodes=1):
+    """
+    Tune a downloaded plan for a non-GUI run, in place.
+
+    Disables listeners (results come from -l), sizes the runner for the
+    per-node thread count, and writes a per-run properties file. Returns
+    the run plan: profile, sizing, the JVM environment and what was disabled.
+    """
+    tree = ET.parse(jmx_path)
+    profile = inspect_plan(tree.getroot())
+
+    disabled = []
+    for listener in profile.pop("listeners"):
+        if _enabled(listener):
+            listener.set("enabled", "false")
+            disabled.append(listener.get("testname") or listener.get("guiclass") or listener.tag)
+    if disabled:
+        tree.write(jmx_path, encoding="UTF-8", xml_declaration=True)
+        logger.info(f"🔇 Disabled {len(disabled)} listeners for the run: {', '.join(disabled)}")
+
+    threads = _threads_per_node(profile, nodes)
+    sizing = size_runner(threads, profile["elements"])
+    write_run_properties(properties_path, profile)
+    logger.info(
+        f"📐 Run sized for {threads if threads is not None else 'unknown'} threads/node: "
+        f"heap {sizing['heap_mb']} MB, container {sizing['memory_mb']} MB, {sizing['cpus']:g} CPUs, {sizing['gc']}"
+    )
+    return {
+        "profile": profile,
+        "sizing": sizing,
+        "environment": jvm_environment(sizing),
+        "properties_path": properties_path,
+        "disabled_listeners": disabled,
+    }
+
+
+def write_run_properties(output_path, profile):
+    """minimal.properties plus settings chosen for this plan."""
+    with open(MINIMAL_PROPERTIES, encoding="utf-8") as f:
+        base = f.read()
+
+    # Short runs report more often so the live view isn't empty for most of the test
+    interval = 5 if profile["duration"] is not None and profile["duration"] <= 120 else 10
+    lines = [
+        "",
+        "# Per-run settings chosen from the plan",
+        f"summariser.interval={interval}",
+        # Failure messages are only worth their bytes when the plan asserts anything
+        f"jmeter.save.saveservice.assertion_results_failure_message={str(profile['assertions']).lower()}",
+        "jmeter.save.saveservice.response_data=false",
+        "jmeter.save.saveservice.samplerData=false",
+    ]
+    if profile["embedded_resources"]:
+        # Embedded resources would be saved as extra rows and double-count requests
+        lines.append("jmeter.save.saveservice.subresults=false")
+    # Override the base file's interval (and its comment) rather than repeat the key
+    base = re.sub(r"(?m)^(#[^\n]*\n)?summariser\.interval=.*\n?", "", base).rstrip("\n")
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(base + "\n" + "\n".join(lines) + "\n")
+    return output_path
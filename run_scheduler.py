@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import logging
+import threading
+from redis.exceptions import RedisError
+from redis_client import get_redis
+from docker_runtime import get_docker_runtime
+
+logger = logging.getLogger(__name__)
+
+# Resources one runner container reserves (and is limited to) while a plan runs
+RUNNER_CPUS = float(os.getenv("JMETER_RUNNER_CPUS", 1))
+RUNNER_MEMORY_MB = int(os.getenv("JMETER_RUNNER_MEMORY_MB", 1024))
+
+# Left free for the app stack when capacity is read from the Docker host
+HOST_RESERVED_CPUS = float(os.getenv("JMETER_HOST_RESERVED_CPUS", 1))
+HOST_RESERVED_MEMORY_MB = int(os.getenv("JMETER_HOST_RESERVED_MEMORY_MB", 2048))
+
+# Runs dispatched at once; matches the jmeter worker's --concurrency
+MAX_CONCURRENT_RUNS = int(os.getenv("JMETER_MAX_CONCURRENT_RUNS", 2))
+
+# Runs one user may have waiting before new ones are rejected
+MAX_PENDING_PER_USER = int(os.getenv("JMETER_MAX_PENDING_PER_USER", 3))
+
+# Reservations are leases: a running job renews its lease every third of
+# this, so one that isn't renewed in time belongs to a dead worker and is dropped
+RESERVATION_TTL_SECONDS = int(os.getenv("JMETER_RESERVATION_TTL", 15 * 60))
+
+# How long the Docker host's capacity is trusted before it is asked again
+HOST_CAPACITY_TTL_SECONDS = int(os.getenv("JMETER_HOST_CAPACITY_TTL", 300))
+
+PENDING_KEY = "sched:pending"
+RUNNING_KEY = "sched:running"
+REQUEST_PREFIX = "sched:request:"
+LOCK_KEY = "sched:lock"
+REQUEST_TTL_SECONDS = 24 * 3600
+
+# Lower runs first
+LICENSE_PRIORITY = {"paid": 0, "trial": 1, "expired": 2}
+
+
+class RunRejected(Exception):
+    """A run that can't be admitted; `status_code` is the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=429):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+_capacity_cache = {"value": None, "expires": 0.0}
+
+
+def host_capacity():
+    """
+    CPUs and memory (MB) available to runner containers.
+
+    JMETER_HOST_CPUS / JMETER_HOST_MEMORY_MB win; otherwise the Docker
+    host's totals minus the app stack's share, cached for
+    HOST_CAPACITY_TTL_SECONDS. When the daemon can't be asked, this
+    machine's totals are used for this call only, never cached.
+    """
+    cpus, memory_mb = os.getenv("JMETER_HOST_CPUS"), os.getenv("JMETER_HOST_MEMORY_MB")
+    if cpus and memory_mb:
+        return {"cpus": float(cpus), "memory_mb": int(memory_mb)}
+
+    now = time.monotonic()
+    if _capacity_cache["value"] is not None and _capacity_cache["expires"] > now:
+        return _capacity_cache["value"]
+
+    try:
+        info = get_docker_runtime().info()
+        total_cpus, total_mb = info["NCPU"], info["MemTotal"] // (1024 * 1024)
+        cacheable = True
+    except Exception as e:
+        logger.warning(f"⚠️ Docker host capacity unavailable, using local machine: {e}")
+        total_cpus = os.cpu_count() or 1
+        total_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+        cacheable = False
+
+    capacity = {
+        "cpus": float(cpus) if cpus else max(total_cpus - HOST_RESERVED_CPUS, RUNNER_CPUS),
+        "memory_mb": int(memory_mb) if memory_mb else max(total_mb - HOST_RESERVED_MEMORY_MB, RUNNER_MEMORY_MB),
+    }
+    if cacheable:
+        _capacity_cache.update(value=capacity, expires=now + HOST_CAPACITY_TTL_SECONDS)
+    return capacity
+
+
+def run_reservation(nodes, runner=None):
+    """Total reservation of a run; `runner` is one runner's {"cpus", "memory_mb"} as sized for the plan."""
+    runner = runner or {"cpus": RUNNER_CPUS, "memory_mb": RUNNER_MEMORY_MB}
+    return {"cpus": runner["cpus"] * nodes, "memory_mb": runner["memory_mb"] * nodes}
+
+
+def _running(r, now):
+    """Live reservations by job id; expired ones are dropped."""
+    running = {}
+    for job_id, raw in r.hgetall(RUNNING_KEY).items():
+        reservation = json.loads(raw)
+        if reservation["expires"] < now:
+            logger.warning(f"⚠️ Dropping expired reservation of job {job_id}")
+            r.hdel(RUNNING_KEY, job_id)
+        else:
+            running[job_id] = reservation
+    return running
+
+
+def _pending(r):
+    requests = []
+    for job_id in r.zrange(PENDING_KEY, 0, -1):
+        raw = r.get(f"{REQUEST_PREFIX}{job_id}")
+        if raw is None:
+            r.zrem(PENDING_KEY, job_id)
+            continue
+        requests.append(json.loads(raw))
+    return requests
+
+
+def _user_running(running):
+    counts = {}
+    for reservation in running.values():
+        counts[reservation["user"]] = counts.get(reservation["user"], 0) + 1
+    return counts
+
+
+def _rank(request, user_running):
+    """Paid before trial, then users with fewer runs in flight, then first come."""
+    return (
+        LICENSE_PRIORITY.get(request["license"], len(LICENSE_PRIORITY)),
+        user_running.get(request["user"], 0),
+        request["submitted"],
+    )
+
+
+def submit_run(job_id, user, license_type, nodes, task_args, runner=None):
+    """
+    Queue a run for admission and dispatch whatever fits now. `runner`
+    is the plan-aware size of one runner (run_planner.plan_resources).
+
+    Raises RunRejected when the run could never fit on the host or the
+    user already has MAX_PENDING_PER_USER runs waiting.
+    """
+    needed, capacity = run_reservation(nodes, runner), host_capacity()
+    if needed["cpus"] > capacity["cpus"] or needed["memory_mb"] > capacity["memory_mb"]:
+        raise RunRejected(
+            f"A {nodes}-node run needs {needed['cpus']:g} CPUs / {needed['memory_mb']} MB; "
+            f"the host has {capacity['cpus']:g} CPUs / {capacity['memory_mb']} MB.",
+            status_code=400,
+        )
+
+    r = get_redis()
+    with r.lock(LOCK_KEY, timeout=30, blocking_timeout=10):
+        waiting = sum(1 for request in _pending(r) if request["user"] == user)
+        if waiting >= MAX_PENDING_PER_USER:
+            raise RunRejected(f"You already have {waiting} test runs waiting; try again when one has started.")
+
+        request = {
+            "job_id": job_id, "user": user, "license": license_type, "nodes": nodes,
+            "args": task_args, "submitted": time.time(), **needed,
+        }
+        r.setex(f"{REQUEST_PREFIX}{job_id}", REQUEST_TTL_SECONDS, json.dumps(request))
+        r.zadd(PENDING_KEY, {job_id: request["submitted"]})
+        logger.info(f"📋 Run {job_id} queued for admission ({license_type}, {nodes} node(s))")
+
+    dispatch_pending()
+    return job_id
+
+
+def dispatch_pending():
+    """
+    Start the best-ranked waiting runs for as long as they fit.
+
+    Admission is strictly in rank order: if the head of the queue doesn't
+    fit, smaller runs behind it wait too, so multi-node runs aren't
+    starved by a stream of single-node ones. Returns the dispatched ids.
+    """
+    from tasks.tasks import run_jmeter_test_async
+
+    r = get_redis()
+    capacity = host_capacity()
+    dispatched = []
+    with r.lock(LOCK_KEY, timeout=30, blocking_timeout=10):
+        now = time.time()
+        running = _running(r, now)
+        pending = _pending(r)
+
+        while pending:
+            user_running = _user_running(running)
+            request = min(pending, key=lambda p: _rank(p, user_running))
+
+            used_cpus = sum(res["cpus"] for res in running.values())
+            used_mb = sum(res["memory_mb"] for res in running.values())
+            if (len(running) >= MAX_CONCURRENT_RUNS
+                    or used_cpus + request["cpus"] > capacity["cpus"]
+                    or used_mb + request["memory_mb"] > capacity["memory_mb"]):
+                break
+
+            job_id = request["job_id"]
+            reservation = {
+                "user": request["user"], "cpus": request["cpus"], "memory_mb": request["memory_mb"],
+                "started": now, "expires": now + RESERVATION_TTL_SECONDS,
+            }
+            r.hset(RUNNING_KEY, job_id, json.dumps(reservation))
+            try:
+                run_jmeter_test_async.apply_async(args=request["args"], task_id=job_id)
+            except Exception:
+                r.hdel(RUNNING_KEY, job_id)
+                raise
+
+            r.zrem(PENDING_KEY, job_id)
+            r.delete(f"{REQUEST_PREFIX}{job_id}")
+            running[job_id] = reservation
+            pending.remove(request)
+            dispatched.append(job_id)
+            logger.info(f"🚦 Admitted run {job_id} ({request['cpus']:g} CPUs / {request['memory_mb']} MB)")
+
+    return dispatched
+
+
+def renew_run(job_id):
+    """Extend a running job's reservation lease; returns False if it has none any more."""
+    r = get_redis()
+    with r.lock(LOCK_KEY, timeout=30, blocking_timeout=10):
+        raw = r.hget(RUNNING_KEY, job_id)
+        if raw is None:
+            return False
+        reservation = json.loads(raw)
+        reservation["expires"] = time.time() + RESERVATION_TTL_SECONDS
+        r.hset(RUNNING_KEY, job_id, json.dumps(reservation))
+    return True
+
+
+class ReservationLease(threading.Thread):
+    """Renews a run's reservation while the run is alive, so long soak tests keep their resources."""
+
+    def __init__(self, job_id, interval=RESERVATION_TTL_SECONDS / 3):
+        super().__init__(daemon=True, name=f"lease-{job_id}")
+        self.job_id = job_id
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if not renew_run(self.job_id):
+                    logger.warning(f"⚠️ Reservation of run {self.job_id} is gone; it no longer counts against capacity")
+                    return
+            except RedisError as e:
+                # LockError is a RedisError; the next renewal is still well within the TTL
+                logger.warning(f"⚠️ Could not renew reservation of run {self.job_id}: {e}")
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        self.join(timeout)
+
+
+def release_run(job_id):
+    """Free a finished run's reservation and admit whatever now fits."""
+    get_redis().hdel(RUNNING_KEY, job_id)
+    dispatch_pending()
+
+
+def queue_position(job_id):
+    """1-based position among waiting runs in admission order, or None if not waiting."""
+    r = get_redis()
+    pending = _pending(r)
+    user_running = _user_running(_running(r, time.time()))
+    ordered = sorted(pending, key=lambda p: _rank(p, user_running))
+    return next((i for i, p in enumerate(ordered, start=1) if p["job_id"] == job_id), None)
+
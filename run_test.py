@@ -1,12 +1,31 @@
 import docker
 import os
+import shutil
 import logging
+import tempfile
 import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from live_metrics import parse_summary_line, publish_live_event
+from s3_utils import download_file_from_s3, upload_file_to_s3
+from jtl_reader import convert_jtl_to_parquet, parquet_filename
+from jtl_aggregator import aggregates_filename
+from jtl_tailer import JTLTailer
+from container_telemetry import RunTelemetry, telemetry_filename
+from sharding import split_jmx, shard_result_paths, merge_jtl_files
+from runner_pool import get_runner_pool, JMETER_WARM_POOL, POOL_DIR
+from docker_runtime import get_docker_runtime
+from run_scheduler import submit_run, RunRejected, RUNNER_CPUS, RUNNER_MEMORY_MB
+from run_planner import MINIMAL_PROPERTIES, prepare_run, plan_resources, plan_stats
 
 logger = logging.getLogger(__name__)
 
 JMETER_IMAGE = "my-jmeter:5.6.3"
-MINIMAL_PROPERTIES = os.path.join(os.path.dirname(__file__), "minimal.properties")
+
+# Log lines kept in memory for the failure report of a streamed run
+LOG_TAIL_LINES = 500
 
 
 def extract_jmeter_summary(log_text):
@@ -15,43 +34,127 @@ def extract_jmeter_summary(log_text):
     return "\n".join(summary_lines) or "No summary found."
 
 
-def _run_jmeter_internal(file_path, result_file_path):
+def _follow_logs(log_stream, job_id=None, tail_lines=LOG_TAIL_LINES, node=None):
+    """
+    Follow a JMeter log stream while it runs, publishing each summariser
+    line as live metrics (tagged with `node` for a shard). Returns the
+    summary lines and the last `tail_lines` log lines (for error reporting).
+    """
+    summary_lines = []
+    tail = deque(maxlen=tail_lines)
+    buffer = b""
+
+    for data in log_stream:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            line = raw.decode("utf-8", errors="replace").rstrip("\r")
+            tail.append(line)
+            if line.strip().startswith("summary"):
+                summary_lines.append(line)
+                metrics = parse_summary_line(line)
+                if metrics:
+                    publish_live_event(job_id, metrics if node is None else {**metrics, "node": node})
+
+    if buffer:
+        tail.append(buffer.decode("utf-8", errors="replace"))
+    return summary_lines, list(tail)
+
+
+def _jmeter_args(plan_path, result_path, properties_path="/data/minimal.properties"):
+    return ["-n", "-t", plan_path, "-l", result_path, "-q", properties_path]
+
+
+def _run_jmeter_internal(file_path, result_file_path, job_id=None, network=None, warm=None,
+                         telemetry=None, node=1, run_plan=None, shard=False):
+    """
+    Run a plan in non-GUI mode and return the summariser output.
+
+    Uses a warm runner from the pool when it is enabled (or `warm` is
+    True), both files live under the pool directory and the run fits the
+    pool's limits; otherwise starts a fresh container. A `run_plan` from
+    run_planner.prepare_run sizes the container and JVM and supplies the
+    properties file. With a `telemetry` recorder, the runner's resource
+    usage is sampled (as `node`) while the plan runs.
+
+    A `shard` of a distributed run only publishes its summariser metrics,
+    tagged with `node`; the distributed run publishes started/done/error.
+    """
+    runtime = get_docker_runtime()
+    container = None
+    runner = None
+    sampler = None
+    pool = get_runner_pool() if warm is not False and network is None else None
+    exit_code = None
+    sizing = run_plan["sizing"] if run_plan else {"memory_mb": RUNNER_MEMORY_MB, "cpus": RUNNER_CPUS}
+    environment = run_plan["environment"] if run_plan else None
+    properties_file = run_plan["properties_path"] if run_plan else MINIMAL_PROPERTIES
+    lifecycle_job_id = None if shard else job_id
     try:
         start_time = time.time()
-        client = docker.from_env()
-
-        container = client.containers.run(
-            image=JMETER_IMAGE,
-            command=[
-                "-n",
-                "-t", f"/data/{os.path.basename(file_path)}",
-                "-l", f"/data/{os.path.basename(result_file_path)}",
-                "-q", "/data/minimal.properties"
-            ],
-            volumes={
-                os.path.abspath(file_path): {
-                    'bind': f"/data/{os.path.basename(file_path)}", 'mode': 'ro'
-                },
-                os.path.abspath(result_file_path): {
-                    'bind': f"/data/{os.path.basename(result_file_path)}", 'mode': 'rw'
+
+        if pool and not pool.fits(sizing):
+            logger.info(f"📐 Run needs {sizing['memory_mb']} MB / {sizing['cpus']:g} CPUs; "
+                        f"starting a dedicated runner instead of a warm one.")
+            pool = None
+        if pool:
+            plan_path = pool.container_path(file_path)
+            result_path = pool.container_path(result_file_path)
+            # Warm runners have minimal.properties mounted; per-run files sit next to the plan
+            properties_path = pool.container_path(properties_file) if run_plan else "/data/minimal.properties"
+        if pool and plan_path and result_path and properties_path:
+            runner = pool.checkout()
+
+        if runner is not None:
+            logger.info(f"🧪 JMeter started on warm runner {runner.container.short_id}.")
+            log_stream, wait = runner.exec_jmeter(_jmeter_args(plan_path, result_path, properties_path),
+                                                  environment=environment)
+        else:
+            container = runtime.run(
+                image=JMETER_IMAGE,
+                command=_jmeter_args(
+                    f"/data/{os.path.basename(file_path)}",
+                    f"/data/results/{os.path.basename(result_file_path)}",
+                    "/data/run.properties"
+                ),
+                volumes={
+                    os.path.abspath(file_path): {
+                        'bind': f"/data/{os.path.basename(file_path)}", 'mode': 'ro'
+                    },
+                    # Mount the results directory: binding a not-yet-existing file
+                    # would make Docker create a directory in its place
+                    os.path.dirname(os.path.abspath(result_file_path)): {
+                        'bind': "/data/results", 'mode': 'rw'
+                    },
+                    os.path.abspath(properties_file): {
+                        'bind': "/data/run.properties", 'mode': 'ro'
+                    }
                 },
-                os.path.abspath(MINIMAL_PROPERTIES): {
-                    'bind': "/data/minimal.properties", 'mode': 'ro'
-                }
-            },
-            detach=True,
-            remove=True,
-            mem_limit='1g',
-            cpu_shares=512
-        )
-
-        logger.info("🧪 JMeter container started.")
-        exit_status = container.wait()
-        logs = container.logs().decode("utf-8")
+                environment=environment,
+                detach=True,
+                network=network,
+                mem_limit=f"{sizing['memory_mb']}m",
+                nano_cpus=int(sizing["cpus"] * 1e9)
+            )
+            logger.info("🧪 JMeter container started.")
+            log_stream = runtime.logs(container.id, stream=True, follow=True)
+            wait = lambda: runtime.wait(container.id).get("StatusCode", 1)
+
+        if telemetry is not None:
+            sampler = telemetry.watch(runtime, (runner.container if runner is not None else container).id, node)
+
+        publish_live_event(lifecycle_job_id, {"type": "started"})
+
+        # Stream the log while the test runs; the container is removed
+        # explicitly so the exit status is still readable afterwards
+        summary_lines, log_tail = _follow_logs(log_stream, job_id, node=node if shard else None)
+        exit_code = wait()
         end_time = time.time()
 
-        if exit_status.get("StatusCode", 1) != 0:
+        if exit_code != 0:
+            logs = "\n".join(log_tail)
             logger.error(f"❌ JMeter run failed. Logs:\n{logs}")
+            publish_live_event(lifecycle_job_id, {"type": "error", "message": "JMeter container exited with error."})
             raise RuntimeError("JMeter container exited with error.")
 
         logger.info(f"🕒 Execution Time: {end_time - start_time:.2f} seconds")
@@ -61,23 +164,162 @@ def _run_jmeter_internal(file_path, result_file_path):
         else:
             logger.error("❌ .jtl file NOT found after JMeter run!")
 
-        summary = extract_jmeter_summary(logs)
+        summary = extract_jmeter_summary("\n".join(summary_lines))
+        publish_live_event(lifecycle_job_id, {"type": "done", "summary": summary})
         return summary
 
     except Exception as e:
         logger.exception(f"🚨 Error running JMeter test: {e}")
         raise
 
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if runner is not None:
+            pool.checkin(runner, healthy=exit_code == 0)
+        if container is not None:
+            try:
+                runtime.remove(container.id)
+            except docker.errors.APIError as e:
+                logger.warning(f"⚠️ Failed to remove JMeter container: {e}")
+
+
+def _run_jmeter_distributed(file_path, result_file_path, nodes, job_id=None, telemetry=None, run_plan=None):
+    """
+    Run a plan as `nodes` independent shards, each in its own runner
+    container on a private Docker network, with the thread counts split
+    between them. The per-shard JTLs are merged into one timeStamp-ordered
+    result at `result_file_path`.
+    """
+    work_dir = os.path.dirname(os.path.abspath(result_file_path))
+    shard_plans = split_jmx(file_path, nodes, work_dir)
+    shard_results = shard_result_paths(result_file_path, nodes)
+
+    runtime = get_docker_runtime()
+    network = runtime.create_network(f"jmeter-run-{uuid.uuid4().hex[:12]}", driver="bridge")
+    logger.info(f"🌐 Starting {nodes} JMeter shards on network {network.name}")
+    publish_live_event(job_id, {"type": "started", "nodes": nodes})
+
+    try:
+        with ThreadPoolExecutor(max_workers=nodes) as pool:
+            futures = [
+                pool.submit(_run_jmeter_internal, plan, result, job_id, network.name,
+                            telemetry=telemetry, node=index, run_plan=run_plan, shard=True)
+                for index, (plan, result) in enumerate(zip(shard_plans, shard_results), start=1)
+            ]
+            summaries, failures = [], []
+            for index, future in enumerate(futures, start=1):
+                try:
+                    summaries.append(f"[shard {index}/{nodes}]\n{future.result()}")
+                except Exception as e:
+                    failures.append(f"shard {index}: {e}")
+
+        if failures:
+            publish_live_event(job_id, {"type": "error", "message": "; ".join(failures)})
+            raise RuntimeError(f"Distributed JMeter run failed ({'; '.join(failures)}).")
+
+        merge_jtl_files(shard_results, result_file_path)
+        summary = "\n".join(summaries)
+        publish_live_event(job_id, {"type": "done", "summary": summary})
+        return summary
+
+    finally:
+        for path in shard_results:
+            if os.path.exists(path):
+                os.remove(path)
+        try:
+            runtime.remove_network(network.id)
+        except docker.errors.APIError as e:
+            logger.warning(f"⚠️ Failed to remove network {network.name}: {e}")
+
+
+def run_test_job(user_prefix, test_filename, job_id=None, nodes=1):
+    """
+    Full test run for one user: download the .jmx from S3, run JMeter
+    (on `nodes` runner containers), upload the .jtl (plus its Parquet
+    copy) and clean up. Runs inside the Celery job so the web tier never
+    blocks on a container.
+    """
+    # Under the pool directory, runs can be handed to warm runners
+    work_dir = tempfile.mkdtemp(prefix="jmeter_run_", dir=POOL_DIR if JMETER_WARM_POOL else None)
+    try:
+        local_jmx_path = os.path.join(work_dir, test_filename)
+        if not download_file_from_s3(f"{user_prefix}{test_filename}", local_jmx_path):
+            raise RuntimeError(f"Could not download test plan {test_filename}.")
+        logger.info(f"📥 Downloaded {test_filename} from S3")
+
+        # Strip listeners, size the runner(s) and write this run's properties from the plan itself
+        run_plan = prepare_run(local_jmx_path, os.path.join(work_dir, "run.properties"), nodes)
+
+        timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
+        result_filename = f"test_plan_{timestamp}.jtl"
+        local_result_path = os.path.join(work_dir, result_filename)
+
+        # Aggregate the .jtl(s) while they are written, so the summary is ready at the end
+        if nodes > 1:
+            tailer = JTLTailer(shard_result_paths(local_result_path, nodes), job_id)
+        else:
+            tailer = JTLTailer(local_result_path, job_id)
+        tailer.start()
+        telemetry = RunTelemetry()
+        try:
+            if nodes > 1:
+                summary_output = _run_jmeter_distributed(local_jmx_path, local_result_path, nodes, job_id,
+                                                         telemetry=telemetry, run_plan=run_plan)
+            else:
+                summary_output = _run_jmeter_internal(local_jmx_path, local_result_path, job_id,
+                                                      telemetry=telemetry, run_plan=run_plan)
+        finally:
+            tailer.stop()
+        logger.info(f"✅ JMeter run complete. Result: {local_result_path}")
+
+        # CSV JTLs shrink ~10x; gzip is streamed during the upload, no compressed temp copy
+        upload_file_to_s3(local_result_path, f"{user_prefix}{result_filename}", compress=True)
+        logger.info(f"☁️ Uploaded result to S3: {user_prefix}{result_filename}")
+
+        # Upload a columnar copy so analyses don't re-parse the raw CSV
+        local_parquet_path = os.path.join(work_dir, parquet_filename(result_filename))
+        if convert_jtl_to_parquet(local_result_path, local_parquet_path):
+            upload_file_to_s3(local_parquet_path, f"{user_prefix}{parquet_filename(result_filename)}")
+
+        # Skipped when tailing failed: analyses then aggregate the JTL itself
+        local_aggregates_path = tailer.save(os.path.join(work_dir, aggregates_filename(result_filename)))
+        if local_aggregates_path:
+            upload_file_to_s3(local_aggregates_path, f"{user_prefix}{aggregates_filename(result_filename)}")
+
+        # Generator CPU/memory over the run, so analyses can tell a saturated generator from a slow system
+        local_telemetry_path = telemetry.save(os.path.join(work_dir, telemetry_filename(result_filename)))
+        upload_file_to_s3(local_telemetry_path, f"{user_prefix}{telemetry_filename(result_filename)}")
+
+        return {
+            "status": "success",
+            "message": "JMeter test executed.",
+            "result_file": result_filename,
+            "summary_output": summary_output,
+            "runner": {**run_plan["sizing"], "disabled_listeners": run_plan["disabled_listeners"]}
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+
 
-# Public interface, optionally Celery-backed
-try:
-    from tasks.tasks import run_jmeter_test_async
-except ImportError:
-    run_jmeter_test_async = None
+# Public interface: runs always execute in the Celery jmeter worker, never on a
+# request thread. The task is dispatched by the scheduler (imported lazily
+# there, since tasks.tasks imports this module).
+def run_jmeter_test(user_prefix, test_filename, nodes=1, user=None, license_type="trial"):
+    """
+    Queue a test run behind the admission scheduler and return its job id.
+    Raises RunRejected when it can't be admitted.
 
-def run_jmeter_test(file_path, result_file_path):
-    if run_jmeter_test_async:
-        run_jmeter_test_async.delay(file_path, result_file_path)
-        return None  # or task ID if needed
-    else:
-        return _run_jmeter_internal(file_path, result_file_path)  # ✅ This line is crucial
+    Runners are sized from the stats recorded when the plan was uploaded
+    (static defaults without them); the plan itself is only downloaded by
+    the job, which re-sizes the container from it.
+    """
+    stats = plan_stats(f"{user_prefix}{test_filename}")
+    if nodes > 1 and stats is not None and not stats.get("shardable", True):
+        raise RunRejected(f"{test_filename} has thread groups whose load can't be split across nodes; "
+                          "run it with nodes=1.", status_code=400)
+    runner = plan_resources(stats, nodes) if stats is not None else None
+    return submit_run(str(uuid.uuid4()), user, license_type, nodes, [user_prefix, test_filename, nodes],
+                      runner=runner)
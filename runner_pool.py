@@ -0,0 +1,278 @@
+import os
+import sys
+import time
+import atexit
+import socket
+import logging
+import tempfile
+import threading
+import docker
+from docker_runtime import get_docker_runtime
+from run_scheduler import RUNNER_CPUS, RUNNER_MEMORY_MB
+
+logger = logging.getLogger(__name__)
+
+JMETER_WARM_POOL = os.getenv("JMETER_WARM_POOL", "false").lower() == "true"
+
+# Host directory shared with every warm runner; runs keep their files under it
+POOL_DIR = os.getenv("JMETER_POOL_DIR", os.path.join(tempfile.gettempdir(), "jmeter-pool"))
+POOL_MOUNT = "/data/pool"
+
+POOL_SIZE = int(os.getenv("JMETER_POOL_SIZE", 2))
+POOL_MIN_IDLE = int(os.getenv("JMETER_POOL_MIN_IDLE", 1))
+POOL_MAX_RUNS = int(os.getenv("JMETER_POOL_MAX_RUNS", 20))
+# `docker exec` can still report Running just after its output stream ends
+EXEC_EXIT_TIMEOUT = float(os.getenv("JMETER_EXEC_EXIT_TIMEOUT", 30))
+
+POOL_LABEL = "jmeter-warm-pool"
+
+
+class WarmRunner:
+    """A long-lived runner container that executes plans through `docker exec`."""
+
+    def __init__(self, runtime, container):
+        self.runtime = runtime
+        self.container = container
+        self.runs = 0
+
+    def is_healthy(self):
+        try:
+            return self.runtime.inspect(self.container.id)["State"]["Status"] == "running"
+        except docker.errors.APIError:
+            return False
+
+    def exec_jmeter(self, args, environment=None):
+        """Start JMeter in the container; returns (log stream, callable returning the exit code)."""
+        exec_id = self.runtime.exec_create(self.container.id, ["jmeter", *args], environment=environment)
+        stream = self.runtime.exec_start(exec_id, stream=True)
+        self.runs += 1
+        return stream, lambda: self._exit_code(exec_id)
+
+    def _exit_code(self, exec_id, timeout=EXEC_EXIT_TIMEOUT):
+        """Exit code of a finished exec; waits until Docker stops reporting it as running."""
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while True:
+            state = self.runtime.exec_inspect(exec_id)
+            if not state["Running"]:
+                return state["ExitCode"]
+            if time.monotonic() >= deadline:
+                logger.warning(f"⚠️ JMeter exec in {self.container.short_id} still running after its output ended")
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def remove(self):
+        try:
+            self.runtime.remove(self.container.id)
+        except docker.errors.APIError as e:
+            logger.warning(f"⚠️ Failed to remove warm runner {self.container.short_id}: {e}")
+
+
+class RunnerPool:
+    """
+    Bounded pool of idle, pre-started JMeter runner containers.
+
+    Runners are created up to `size`, health-checked on checkout, and
+    recycled after `max_runs` plans or any failed run; a replacement is
+    warmed in the background so the next checkout doesn't pay the cold
+    start. Plans and results must live under POOL_DIR, which every runner
+    mounts at POOL_MOUNT.
+    """
+
+    def __init__(self, image, properties_path, size=POOL_SIZE, max_runs=POOL_MAX_RUNS,
+                 memory_mb=RUNNER_MEMORY_MB, cpus=RUNNER_CPUS):
+        self.image = image
+        self.properties_path = os.path.abspath(properties_path)
+        self.size = size
+        self.max_runs = max_runs
+        self.memory_mb = memory_mb
+        self.cpus = cpus
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.runtime = get_docker_runtime()
+        self._idle = []
+        self._total = 0
+        self._cond = threading.Condition()
+        os.makedirs(POOL_DIR, exist_ok=True)
+
+    def fits(self, sizing):
+        """Whether a run sized by the run planner fits in a warm runner's limits."""
+        return sizing["memory_mb"] <= self.memory_mb and sizing["cpus"] <= self.cpus
+
+    def container_path(self, host_path):
+        """Path of a host file inside the runners, or None if it isn't under POOL_DIR."""
+        relative = os.path.relpath(os.path.abspath(host_path), POOL_DIR)
+        if relative.startswith(os.pardir):
+            return None
+        return f"{POOL_MOUNT}/{relative}"
+
+    def _start_runner(self):
+        container = self.runtime.run(
+            image=self.image,
+            entrypoint=["sleep", "infinity"],
+            volumes={
+                POOL_DIR: {'bind': POOL_MOUNT, 'mode': 'rw'},
+                self.properties_path: {'bind': "/data/minimal.properties", 'mode': 'ro'}
+            },
+            labels={POOL_LABEL: self.owner},
+            detach=True,
+            mem_limit=f"{self.memory_mb}m",
+            nano_cpus=int(self.cpus * 1e9)
+        )
+        # Load JMeter's jars once so they sit in the page cache for the first real run
+        self.runtime.exec_start(self.runtime.exec_create(container.id, ["jmeter", "--version"]))
+        logger.info(f"🔥 Warm JMeter runner ready: {container.short_id}")
+        return WarmRunner(self.runtime, container)
+
+    def _release_slot(self):
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def prewarm(self, count=POOL_MIN_IDLE):
+        """Start up to `count` idle runners in the background, within the size cap."""
+        def warm():
+            for _ in range(count):
+                with self._cond:
+                    if self._total >= self.size:
+                        return
+                    self._total += 1
+                try:
+                    runner = self._start_runner()
+                except Exception as e:
+                    logger.warning(f"⚠️ Failed to warm JMeter runner: {e}")
+                    self._release_slot()
+                    return
+                with self._cond:
+                    self._idle.append(runner)
+                    self._cond.notify()
+
+        threading.Thread(target=warm, name="jmeter-pool-warmer", daemon=True).start()
+
+    def checkout(self):
+        """
+        Return a healthy idle runner, or None when none is idle right now.
+
+        Never starts a runner inline: that would be slower than the plain
+        cold run the caller falls back to. A replacement is warmed in the
+        background instead, for the next run.
+
+        Candidates are taken under the lock but health-checked outside it,
+        so a slow Docker daemon doesn't stall other checkouts and checkins.
+        """
+        while True:
+            with self._cond:
+                if not self._idle:
+                    below_size = self._total < self.size
+                    break
+                runner = self._idle.pop()
+            if runner.is_healthy():
+                return runner
+            runner.remove()
+            self._release_slot()
+        if below_size:
+            self.prewarm(1)
+        return None
+
+    def checkin(self, runner, healthy=True):
+        if healthy and runner.runs < self.max_runs and runner.is_healthy():
+            with self._cond:
+                self._idle.append(runner)
+                self._cond.notify()
+            return
+
+        logger.info(f"♻️ Recycling JMeter runner {runner.container.short_id} after {runner.runs} runs")
+        runner.remove()
+        self._release_slot()
+        self.prewarm(1)
+
+    def reap_orphans(self):
+        """Remove runners left behind by worker processes on this host that have exited."""
+        host = socket.gethostname()
+        for container in self.runtime.list_containers(all=True, filters={"label": POOL_LABEL}):
+            owner_host, _, pid = container.labels.get(POOL_LABEL, "").partition(":")
+            if owner_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+                self.runtime.remove(container.id)
+
+    def shutdown(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+        for runner in idle:
+            runner.remove()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_runner_pool():
+    """Process-wide warm pool, or None when JMETER_WARM_POOL is off."""
+    global _pool
+    if not JMETER_WARM_POOL:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            from run_test import JMETER_IMAGE, MINIMAL_PROPERTIES
+
+            _pool = RunnerPool(JMETER_IMAGE, MINIMAL_PROPERTIES)
+            _pool.reap_orphans()
+            _pool.prewarm()
+            atexit.register(_pool.shutdown)
+    return _pool
+
+
+def benchmark_time_to_first_sample(jmx_path, runs=3):
+    """
+    Compare time-to-first-sample of cold container starts and warm runners.
+
+    Measures from the start of `_run_jmeter_internal` until the first
+    sample line lands in the .jtl. Needs a Docker daemon and the runner image.
+    """
+    from run_test import _run_jmeter_internal
+
+    pool = get_runner_pool()
+    if pool is None:
+        raise RuntimeError("Set JMETER_WARM_POOL=true to benchmark the warm pool.")
+
+    results = {}
+    for mode in ("cold", "warm"):
+        timings = []
+        for _ in range(runs):
+            run_dir = tempfile.mkdtemp(dir=POOL_DIR)
+            plan = os.path.join(run_dir, os.path.basename(jmx_path))
+            result = os.path.join(run_dir, "result.jtl")
+            with open(jmx_path, "rb") as src, open(plan, "wb") as dst:
+                dst.write(src.read())
+
+            start = time.perf_counter()
+            run = threading.Thread(target=_run_jmeter_internal, args=(plan, result),
+                                   kwargs={"warm": mode == "warm"})
+            run.start()
+            first_sample = None
+            while run.is_alive() and first_sample is None:
+                if os.path.exists(result):
+                    with open(result, "rb") as f:
+                        if f.read().count(b"\n") >= 2:
+                            first_sample = time.perf_counter() - start
+                time.sleep(0.02)
+            run.join()
+            if first_sample is not None:
+                timings.append(first_sample)
+        results[mode] = round(min(timings), 3) if timings else None
+    return results
+
+
+if __name__ == "__main__":
+    for mode, seconds in benchmark_time_to_first_sample(sys.argv[1]).items():
+        print(f"{mode:>5}: time to first sample {seconds}s")
@@ -1,20 +1,204 @@
-import boto3
+import io
 import os
+import sys
+import json
+import time
+import zlib
+import gzip
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+import boto3
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from s3transfer.exceptions import S3DownloadFailedError
+from s3transfer.subscribers import BaseSubscriber
+from metrics_log import register_metrics
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Multipart tuning: parts above the threshold are sent/fetched in parallel
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD_MB", 16)) * MB
+S3_PART_SIZE = int(os.getenv("S3_PART_SIZE_MB", 16)) * MB
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", 10))
+
+# zlib level for streamed gzip uploads; low levels already shrink CSV ~10x
+S3_GZIP_LEVEL = int(os.getenv("S3_GZIP_LEVEL", 3))
+
+STREAM_BUFFER_SIZE = 1 * MB
+
+# Local copies of downloaded objects, shared by every process on the host; 0 disables
+S3_CACHE_DIR = os.getenv("S3_CACHE_DIR", os.path.join(tempfile.gettempdir(), "s3-cache"))
+S3_CACHE_MAX_BYTES = int(os.getenv("S3_CACHE_MAX_MB", 2048)) * MB
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=S3_PART_SIZE,
+    max_concurrency=S3_MAX_CONCURRENCY,
+    use_threads=True,
+)
 
 s3 = boto3.client(
     's3',
     aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
     aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    region_name=os.getenv("AWS_REGION")
+    region_name=os.getenv("AWS_REGION"),
+    # One connection per transfer thread, so parallel parts don't queue on the pool
+    config=Config(max_pool_connections=max(S3_MAX_CONCURRENCY, 10))
 )
 
 BUCKET_NAME = os.getenv("S3_BUCKET")
 
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _record_transfer(direction, s3_key, size, seconds, stored_size=None):
+    """Track per-direction totals and log the throughput of one transfer."""
+    with _metrics_lock:
+        m = _metrics.setdefault(direction, {"transfers": 0, "bytes": 0, "stored_bytes": 0, "seconds": 0.0})
+        m["transfers"] += 1
+        m["bytes"] += size
+        m["stored_bytes"] += size if stored_size is None else stored_size
+        m["seconds"] += seconds
+    rate = size / MB / seconds if seconds > 0 else 0
+    ratio = f", stored {stored_size / MB:.1f} MB" if stored_size is not None else ""
+    logger.info(f"📦 S3 {direction} {s3_key}: {size / MB:.1f} MB in {seconds:.2f}s ({rate:.1f} MB/s{ratio})")
+
+
+def _record_cache(hit, size):
+    with _metrics_lock:
+        m = _metrics.setdefault("cache", {"hits": 0, "misses": 0, "bytes_served": 0})
+        m["hits" if hit else "misses"] += 1
+        m["bytes_served"] += size if hit else 0
+
+
+def transfer_metrics():
+    """Totals and average throughput (MB/s) per direction, and cache hits, since start-up."""
+    with _metrics_lock:
+        return {
+            direction: {**m, "mb_per_second": round(m["bytes"] / MB / m["seconds"], 1) if m["seconds"] else None}
+            if direction != "cache" else dict(m)
+            for direction, m in _metrics.items()
+        }
+
+
+register_metrics("s3", transfer_metrics)
+
+
+class _GzipStream(io.RawIOBase):
+    """Gzip-compresses a binary file while it is read, so uploads need no compressed temp copy."""
+
+    def __init__(self, source, level=S3_GZIP_LEVEL):
+        self.source = source
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip framing
+        self.buffer = bytearray()
+        self.finished = False
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while not self.finished and (size is None or size < 0 or len(self.buffer) < size):
+            chunk = self.source.read(STREAM_BUFFER_SIZE)
+            if chunk:
+                self.raw_bytes += len(chunk)
+                self.buffer += self.compressor.compress(chunk)
+            else:
+                self.buffer += self.compressor.flush()
+                self.finished = True
+
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.compressed_bytes += len(data)
+        return data
+
+
+class _BodyReader(io.RawIOBase):
+    """Raw-stream view of a botocore StreamingBody, so it can be buffered and peeked."""
+
+    def __init__(self, body):
+        self.body = body
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.body.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.body.close()
+        super().close()
+
+
+class _PinnedVersion(BaseSubscriber):
+    """Gives s3transfer a size and ETag already seen, so it skips its HEAD and every GET carries If-Match."""
+
+    def __init__(self, size, etag):
+        self._size = size
+        self._etag = etag
+
+    def on_queued(self, future, **kwargs):
+        future.meta.provide_transfer_size(self._size)
+        future.meta.provide_object_etag(self._etag)
+
+
+def _download_version(s3_key, local_path, size, etag):
+    """
+    Download exactly the version of `s3_key` with `etag`, with parallel
+    ranged GETs; raises S3DownloadFailedError if it has been overwritten.
+    """
+    with create_transfer_manager(s3, TRANSFER_CONFIG) as manager:
+        manager.download(BUCKET_NAME, s3_key, local_path, subscribers=[_PinnedVersion(size, etag)]).result()
+
+
+def _index_upload(s3_key):
+    """Add a just-written object to its user's file index; the upload itself already succeeded."""
+    # Imported here: file_index reconciles through this module's client
+    from file_index import index_object
+
+    try:
+        head = s3.head_object(Bucket=BUCKET_NAME, Key=s3_key)
+        index_object(s3_key, head["ContentLength"], head["ETag"], head["LastModified"])
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to index {s3_key}; it will be picked up on reconciliation: {e}")
+
+
+def upload_file_to_s3(file_path, s3_key, compress=False):
+    """
+    Upload a file with multipart, parallel parts.
 
-def upload_file_to_s3(file_path, s3_key):
+    With `compress`, the file is gzip-compressed while it streams up and
+    stored with `Content-Encoding: gzip`: browsers following a presigned
+    URL get the original bytes back, and `download_file_from_s3`
+    decompresses it again.
+    """
+    start = time.perf_counter()
     try:
-        s3.upload_file(file_path, BUCKET_NAME, s3_key)
+        if compress:
+            with open(file_path, "rb") as f:
+                stream = _GzipStream(f)
+                s3.upload_fileobj(stream, BUCKET_NAME, s3_key, ExtraArgs={"ContentEncoding": "gzip"},
+                                  Config=TRANSFER_CONFIG)
+            _record_transfer("upload", s3_key, stream.raw_bytes, time.perf_counter() - start,
+                             stored_size=stream.compressed_bytes)
+        else:
+            s3.upload_file(file_path, BUCKET_NAME, s3_key, Config=TRANSFER_CONFIG)
+            _record_transfer("upload", s3_key, os.path.getsize(file_path), time.perf_counter() - start)
+        _index_upload(s3_key)
         return True
     except ClientError as e:
         print(f"Upload error: {e}")
@@ -23,22 +207,195 @@ def upload_file_to_s3(file_path, s3_key):
 
 def upload_fileobj_to_s3(file_obj, s3_key):
     try:
-        s3.upload_fileobj(file_obj, BUCKET_NAME, s3_key)
+        s3.upload_fileobj(file_obj, BUCKET_NAME, s3_key, Config=TRANSFER_CONFIG)
+        _index_upload(s3_key)
         return True
     except ClientError as e:
         print(f"Upload error: {e}")
         return False
 
 
-def download_file_from_s3(s3_key, local_path):
+@contextmanager
+def _file_lock(path, blocking=True):
+    """Exclusive flock on `path`; yields False instead of waiting when not `blocking`."""
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _cache_base(s3_key):
+    return os.path.join(S3_CACHE_DIR, hashlib.sha256(f"{BUCKET_NAME}/{s3_key}".encode()).hexdigest())
+
+
+def _cached_object(s3_key, base):
+    """
+    Path and metadata of an up-to-date cached copy of `s3_key`, downloading
+    it on a miss. Caller holds the key's lock. Returns (path, meta, hit).
+
+    A cached copy is revalidated with a conditional HEAD (If-None-Match on
+    its ETag): 304 means it is current; otherwise the new version replaces it.
+    The download is pinned to the HEAD's ETag, so the cached bytes are the
+    version its metadata names; if the object is overwritten in between,
+    the HEAD and download are retried once.
+    """
+    meta_path = f"{base}.meta"
+    meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if not os.path.exists(os.path.join(S3_CACHE_DIR, meta["data"])):
+            meta = None
+
     try:
-        s3.download_file(BUCKET_NAME, s3_key, local_path)
-        return True
+        head = s3.head_object(Bucket=BUCKET_NAME, Key=s3_key, **({"IfNoneMatch": meta["etag"]} if meta else {}))
     except ClientError as e:
+        if meta and e.response.get("Error", {}).get("Code") in ("304", "NotModified"):
+            data_path = os.path.join(S3_CACHE_DIR, meta["data"])
+            os.utime(data_path)  # recency for LRU eviction
+            return data_path, meta, True
+        raise
+
+    for attempt in range(2):
+        etag = head["ETag"]
+        data_name = f"{os.path.basename(base)}.{hashlib.sha256(etag.encode()).hexdigest()[:16]}.data"
+        data_path = os.path.join(S3_CACHE_DIR, data_name)
+        tmp_path = f"{data_path}.{os.getpid()}.tmp"
+        start = time.perf_counter()
+        try:
+            _download_version(s3_key, tmp_path, head["ContentLength"], etag)
+            os.replace(tmp_path, data_path)
+            break
+        except S3DownloadFailedError:
+            # Overwritten between the HEAD and the GETs: look again and fetch the new version
+            if attempt:
+                raise
+            head = s3.head_object(Bucket=BUCKET_NAME, Key=s3_key)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    _record_transfer("download", s3_key, head["ContentLength"], time.perf_counter() - start)
+
+    if meta and meta["data"] != data_name:
+        try:
+            os.remove(os.path.join(S3_CACHE_DIR, meta["data"]))
+        except FileNotFoundError:
+            pass
+    meta = {"key": s3_key, "etag": etag, "data": data_name, "encoding": head.get("ContentEncoding")}
+    with open(f"{meta_path}.{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(f"{meta_path}.{os.getpid()}.tmp", meta_path)
+    return data_path, meta, False
+
+
+def _evict_cache():
+    """Drop least recently used copies until the cache is within S3_CACHE_MAX_BYTES."""
+    with _file_lock(os.path.join(S3_CACHE_DIR, ".evict.lock"), blocking=False) as locked:
+        if not locked:
+            return  # another process is already evicting
+
+        entries = []
+        for entry in os.scandir(S3_CACHE_DIR):
+            if entry.name.endswith(".data"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.name))
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, name in sorted(entries):
+            if total <= S3_CACHE_MAX_BYTES:
+                break
+            base = os.path.join(S3_CACHE_DIR, name.split(".")[0])
+            # Skip entries another process is reading or refreshing right now
+            with _file_lock(f"{base}.lock", blocking=False) as got:
+                if not got:
+                    continue
+                for path in (os.path.join(S3_CACHE_DIR, name), f"{base}.meta"):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+
+
+def _download_cached(s3_key, local_path, decompress):
+    os.makedirs(S3_CACHE_DIR, exist_ok=True)
+    base = _cache_base(s3_key)
+    with _file_lock(f"{base}.lock"):
+        data_path, meta, hit = _cached_object(s3_key, base)
+        if decompress and meta["encoding"] == "gzip":
+            with gzip.open(data_path, "rb") as src, open(local_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, STREAM_BUFFER_SIZE)
+        else:
+            shutil.copyfile(data_path, local_path)
+    _record_cache(hit, os.path.getsize(data_path) if hit else 0)
+    if not hit:
+        _evict_cache()
+
+
+def download_file_from_s3(s3_key, local_path, decompress=True, use_cache=True):
+    """
+    Download an object; large ones with parallel ranged GETs.
+
+    Objects uploaded with `compress=True` are decompressed while they
+    stream to disk; pass `decompress=False` to keep the gzip bytes (the
+    JTL readers detect and read them directly).
+
+    Downloads go through a host-wide LRU disk cache keyed by bucket, key
+    and ETag, so a repeated download costs one conditional HEAD.
+    """
+    try:
+        if use_cache and S3_CACHE_MAX_BYTES > 0:
+            _download_cached(s3_key, local_path, decompress)
+            return True
+
+        # One GET tells the encoding and size; small or gzip objects are written from its body
+        start = time.perf_counter()
+        response = s3.get_object(Bucket=BUCKET_NAME, Key=s3_key)
+        stored_size = response["ContentLength"]
+        gzipped = decompress and response.get("ContentEncoding") == "gzip"
+        if gzipped or stored_size <= S3_MULTIPART_THRESHOLD:
+            body = io.BufferedReader(_BodyReader(response["Body"]), STREAM_BUFFER_SIZE)
+            with (gzip.GzipFile(fileobj=body) if gzipped else body) as stream, open(local_path, "wb") as f:
+                shutil.copyfileobj(stream, f, STREAM_BUFFER_SIZE)
+        else:
+            # Large plain objects: parallel ranged GETs, pinned to the version just seen
+            response["Body"].close()
+            _download_version(s3_key, local_path, stored_size, response["ETag"])
+        _record_transfer("download", s3_key, os.path.getsize(local_path), time.perf_counter() - start,
+                         stored_size=stored_size if gzipped else None)
+        return True
+    except (ClientError, S3DownloadFailedError) as e:
         print(f"Download error: {e}")
         return False
 
 
+def open_s3_stream(s3_key):
+    """
+    Buffered binary stream over an object's body, gzip-decoded when the
+    object is compressed, for consumers that can read without a local
+    file (e.g. `jtl_reader.iter_jtl_stream`).
+    """
+    response = s3.get_object(Bucket=BUCKET_NAME, Key=s3_key)
+    stream = io.BufferedReader(_BodyReader(response["Body"]), STREAM_BUFFER_SIZE)
+    if response.get("ContentEncoding") == "gzip" or stream.peek(2)[:2] == b"\x1f\x8b":
+        stream = io.BufferedReader(gzip.GzipFile(fileobj=stream), STREAM_BUFFER_SIZE)
+    return stream
+
+
+def s3_object_exists(s3_key):
+    try:
+        s3.head_object(Bucket=BUCKET_NAME, Key=s3_key)
+        return True
+    except ClientError:
+        return False
+
+
 def generate_presigned_url(s3_key, expiration=3600):
     try:
         url = s3.generate_presigned_url(
@@ -50,3 +407,60 @@ def generate_presigned_url(s3_key, expiration=3600):
     except Exception as e:
         print(f"❌ Error generating presigned URL: {e}")
         return None
+
+
+def benchmark(file_path, prefix="benchmarks/", repeat=3):
+    """
+    Compare boto3's default transfers with the tuned helpers on one file.
+
+    Times the round trip (upload + download) of the default `upload_file`/
+    `download_file`, the tuned multipart helpers with and without gzip,
+    and reading the compressed object straight into pandas. Needs real S3
+    credentials; the benchmark objects are deleted afterwards.
+    """
+    from jtl_reader import iter_jtl_stream
+    from jtl_aggregator import JTL_COLUMNS
+
+    size = os.path.getsize(file_path)
+    key = f"{prefix}{os.path.basename(file_path)}"
+    work_dir = tempfile.mkdtemp(prefix="s3_benchmark_")
+    local_path = os.path.join(work_dir, "download")
+
+    def default():
+        s3.upload_file(file_path, BUCKET_NAME, key)
+        s3.download_file(BUCKET_NAME, key, local_path)
+
+    def tuned():
+        upload_file_to_s3(file_path, key)
+        download_file_from_s3(key, local_path, use_cache=False)
+
+    def tuned_gzip():
+        upload_file_to_s3(file_path, key, compress=True)
+        download_file_from_s3(key, local_path, use_cache=False)
+
+    def stream_to_pandas():
+        with open_s3_stream(key) as stream:
+            rows = sum(len(chunk) for chunk in iter_jtl_stream(stream, JTL_COLUMNS))
+        return rows
+
+    results = {}
+    try:
+        for name, run in (("default", default), ("tuned", tuned), ("tuned_gzip", tuned_gzip),
+                          ("stream_to_pandas", stream_to_pandas)):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            results[name] = {"seconds": round(best, 3), "mb_per_second": round(size / MB / best, 1)}
+    finally:
+        s3.delete_object(Bucket=BUCKET_NAME, Key=key)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    for name, result in benchmark(sys.argv[1]).items():
+        print(f"{name:>16}: {result['seconds']:.3f}s  {result['mb_per_second']} MB/s")
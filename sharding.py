@@ -0,0 +1,165 @@
+import os
+import csv
+import heapq
+import logging
+import tempfile
+import xml.etree.ElementTree as ET
+from jmx_validator import is_thread_group
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on runner containers per distributed test
+MAX_NODES = int(os.getenv("JMETER_MAX_NODES", 4))
+
+# Property holding each splittable thread group class's load (threads, or arrivals/s for ArrivalsThreadGroup)
+THREADS_PROPERTIES = {
+    "ThreadGroup": "ThreadGroup.num_threads",
+    "SetupThreadGroup": "ThreadGroup.num_threads",
+    "PostThreadGroup": "ThreadGroup.num_threads",
+    "SteppingThreadGroup": "ThreadGroup.num_threads",
+    "ConcurrencyThreadGroup": "TargetLevel",
+    "ArrivalsThreadGroup": "TargetLevel",
+}
+
+# Rows sorted in memory at a time when merging shard results; larger shards spill sorted runs to disk
+MERGE_RUN_ROWS = int(os.getenv("JTL_MERGE_RUN_ROWS", 100_000))
+
+
+def _split_count(total, nodes, index):
+    """Share of `total` for shard `index`, spreading the remainder over the first shards."""
+    return total // nodes + (1 if index < total % nodes else 0)
+
+
+def shard_result_paths(result_file_path, nodes):
+    directory, filename = os.path.split(result_file_path)
+    return [os.path.join(directory, f"shard{i + 1}_{filename}") for i in range(nodes)]
+
+
+def _threads_prop(group):
+    """The element holding a thread group's load, if its class is known and the value is a plain number."""
+    name = THREADS_PROPERTIES.get((group.get("testclass") or group.tag).rsplit(".", 1)[-1])
+    prop = next((p for p in group if p.get("name") == name), None) if name else None
+    return prop if prop is not None and (prop.text or "").strip().isdigit() else None
+
+
+def _enabled_thread_groups(root):
+    return [g for g in root.iter() if is_thread_group(g) and g.get("enabled", "true") != "false"]
+
+
+def unsplittable_groups(root):
+    """
+    Names of enabled thread groups whose load split_jmx can't divide: plugin
+    groups it doesn't know, or counts given as expressions (${__P(threads)}).
+    Copied unchanged to every shard, they would run `nodes` times the load.
+    """
+    return [g.get("testname") or g.tag for g in _enabled_thread_groups(root) if _threads_prop(g) is None]
+
+
+def split_jmx(jmx_path, nodes, output_dir):
+    """
+    Write `nodes` copies of a plan with every thread group's load split
+    between them, so the shards together generate the original load.
+    Shards left with no threads in a group get that group disabled.
+
+    Raises ValueError if any enabled group can't be split (see unsplittable_groups).
+    """
+    tree = ET.parse(jmx_path)
+    unsplittable = unsplittable_groups(tree.getroot())
+    if unsplittable:
+        raise ValueError(f"Thread groups {', '.join(unsplittable)} can't be split across nodes.")
+
+    thread_groups = []
+    for group in _enabled_thread_groups(tree.getroot()):
+        prop = _threads_prop(group)
+        thread_groups.append((group, prop, int(prop.text.strip())))
+
+    base, _ = os.path.splitext(os.path.basename(jmx_path))
+    shard_paths = []
+    for index in range(nodes):
+        for group, prop, total in thread_groups:
+            threads = _split_count(total, nodes, index)
+            prop.text = str(threads)
+            group.set("enabled", "true" if threads else "false")
+
+        shard_path = os.path.join(output_dir, f"{base}_shard{index + 1}.jmx")
+        tree.write(shard_path, encoding="UTF-8", xml_declaration=True)
+        shard_paths.append(shard_path)
+    return shard_paths
+
+
+def _iter_records(file_path, header, ts_index, skipped):
+    """(timeStamp, record) for each complete row; rows cut off mid-write are counted in `skipped`."""
+    with open(file_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        if next(reader, None) != header:
+            raise ValueError(f"Shard result {file_path} has a different header.")
+        try:
+            for record in reader:
+                if len(record) != len(header) or not record[ts_index].isdigit():
+                    skipped[0] += 1
+                    continue
+                yield int(record[ts_index]), record
+        except csv.Error:
+            # A final row cut off inside a quoted field
+            skipped[0] += 1
+
+
+def _write_run(records, work_dir):
+    records.sort(key=lambda r: r[0])
+    fd, path = tempfile.mkstemp(suffix=".run.csv", dir=work_dir)
+    with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(record for _, record in records)
+    return path
+
+
+def _iter_run(path, ts_index):
+    with open(path, newline="", encoding="utf-8") as f:
+        for record in csv.reader(f):
+            yield int(record[ts_index]), record
+
+
+def merge_jtl_files(shard_paths, output_path, run_rows=None):
+    """
+    Merge per-shard CSV JTLs into one file ordered by timeStamp.
+
+    JMeter writes a row when its sample completes, but timeStamp is when
+    it started, so a shard's rows are not in timeStamp order. Each shard is
+    sorted in runs of `run_rows` rows, spilled to disk, and the runs are
+    k-way merged: memory stays bounded regardless of result size. Rows cut
+    off mid-write (e.g. a killed shard) are skipped. Returns the row count.
+    """
+    run_rows = run_rows or MERGE_RUN_ROWS
+    shard_paths = [p for p in shard_paths if os.path.isfile(p) and os.path.getsize(p)]
+    if not shard_paths:
+        open(output_path, "w").close()
+        return 0
+
+    with open(shard_paths[0], newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f))
+    ts_index = header.index("timeStamp")
+
+    rows = 0
+    skipped = [0]
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as work_dir:
+        runs = []
+        for path in shard_paths:
+            records = []
+            for item in _iter_records(path, header, ts_index, skipped):
+                records.append(item)
+                if len(records) >= run_rows:
+                    runs.append(_write_run(records, work_dir))
+                    records = []
+            if records:
+                runs.append(_write_run(records, work_dir))
+
+        with open(output_path, "w", newline="", encoding="utf-8") as out:
+            writer = csv.writer(out)
+            writer.writerow(header)
+            for _, record in heapq.merge(*(_iter_run(p, ts_index) for p in runs), key=lambda r: r[0]):
+                writer.writerow(record)
+                rows += 1
+
+    if skipped[0]:
+        logger.warning(f"⚠️ Skipped {skipped[0]} incomplete JTL rows")
+    logger.info(f"🔀 Merged {len(shard_paths)} shard results into {output_path} ({rows} rows)")
+    return rows
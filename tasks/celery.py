@@ -18,10 +18,15 @@ celery.conf.update(
     result_serializer='json',
     accept_content=['json'],
     timezone='UTC',
+    task_track_started=True,  # lets /jobs/<id> report STARTED while JMeter runs
     beat_schedule={
         'check-expired-users-every-hour': {
             'task': 'tasks.task.check_expiry_task',
             'schedule': crontab(minute=0, hour='*'),  # Every hour
+        },
+        'dispatch-pending-jmeter-runs-every-minute': {
+            'task': 'tasks.tasks.dispatch_pending_runs_task',
+            'schedule': crontab(),  # Every minute
         }
     }
 )
@@ -31,7 +36,10 @@ shared_task = celery.task  # for compatibility
 celery.conf.task_routes = {
     'tasks.tasks.run_jmeter_test_async': {'queue': 'jmeter'},
     'tasks.tasks.generate_gemini_analysis_async': {'queue': 'gemini'},
+    'tasks.tasks.stream_gemini_analysis_async': {'queue': 'gemini'},
+    'tasks.tasks.generate_test_plan_async': {'queue': 'gemini'},
     'tasks.tasks.check_expiry_task': {'queue': 'scheduler'},
+    'tasks.tasks.dispatch_pending_runs_task': {'queue': 'scheduler'},
 }
 
 
@@ -1,22 +1,67 @@
+import logging
+from celery.signals import worker_process_init
 from tasks.celery import celery, shared_task
 from email_utils import _send_email_internal
-from run_test import _run_jmeter_internal
+from run_test import run_test_job
 from users.scheduler import check_expiry
 from gemini import generate_with_gemini
+from generate_test_plan import generate_jmeter_test_plan
+from analysis_stream import stream_analysis
+from runner_pool import get_runner_pool
+from run_scheduler import release_run, dispatch_pending, ReservationLease
+from metrics_log import start_metrics_log
+
+logger = logging.getLogger(__name__)
+
+
+@worker_process_init.connect
+def prewarm_jmeter_runners(**kwargs):
+    # Only starts containers when JMETER_WARM_POOL=true (the jmeter worker)
+    get_runner_pool()
+    # The metrics log thread doesn't survive the fork into this child
+    start_metrics_log()
 
 
 @celery.task
 def send_email_async(to, subject, body, attachments=None, is_html=False):
     return _send_email_internal(to, subject, body, attachments, is_html)
 
+@celery.task(bind=True)
+def run_jmeter_test_async(self, user_prefix, test_filename, nodes=1):
+    lease = ReservationLease(self.request.id)
+    lease.start()
+    try:
+        return run_test_job(user_prefix, test_filename, job_id=self.request.id, nodes=nodes)
+    finally:
+        lease.stop()
+        # Admission scheduler: free this run's CPU/memory and start the next one.
+        # A failure here must not replace the run's own result or exception;
+        # the reservation then expires and the periodic dispatch catches up.
+        try:
+            release_run(self.request.id)
+        except Exception as e:
+            logger.exception(f"⚠️ Could not release reservation of run {self.request.id}: {e}")
+
 @celery.task
-def run_jmeter_test_async(file_path, result_file_path):
-    _run_jmeter_internal(file_path, result_file_path)
+def dispatch_pending_runs_task():
+    # Safety net for reservations dropped by dead workers
+    dispatch_pending()
 
 @celery.task
 def check_expiry_task():
     check_expiry(loop=False) 
 
 @shared_task
-def generate_gemini_analysis_async(prompt):
-    return generate_with_gemini(prompt)
\ No newline at end of file
+def generate_gemini_analysis_async(prompt, use_cache=True):
+    return generate_with_gemini(prompt, use_cache=use_cache)
+
+@shared_task(bind=True)
+def stream_gemini_analysis_async(self, prompt, user_prefix, md_filename, report=""):
+    return stream_analysis(self.request.id, prompt, user_prefix, md_filename, report)
+
+@shared_task
+def generate_test_plan_async(prompt, user_email):
+    # A failed generation is returned, not raised, so the job keeps its attempts/latency (see jobs.job_failed)
+    # The request handler already tried the template and plan library
+    result, _ = generate_jmeter_test_plan(prompt, user_email, skip_quick=True)
+    return result
@@ -0,0 +1,61 @@
+import os
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+os.environ.setdefault("MONGO_DB_NAME", "tests")
+os.environ.setdefault("AWS_REGION", "us-east-1")
+with mock.patch("pymongo.MongoClient", mongomock.MongoClient):
+    import file_index
+
+PREFIX = "user@example.com/"
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def index():
+    """Ten .jtl files, several sharing a timestamp, plus one .jmx; marked as freshly reconciled."""
+    file_index.files.delete_many({})
+    file_index.file_index_state.delete_many({})
+    for i in range(10):
+        file_index.index_object(f"{PREFIX}run{i:02d}.jtl", 100 + i, '"etag"', T0 + timedelta(minutes=i // 3))
+    file_index.index_object(f"{PREFIX}plan.jmx", 10, None, T0)
+    file_index.file_index_state.insert_one({"prefix": PREFIX, "reconciled_at": datetime.now(timezone.utc)})
+
+
+def _pages(**kwargs):
+    names, cursor = [], None
+    while True:
+        page, cursor = file_index.list_files(PREFIX, cursor=cursor, **kwargs)
+        names.append([f["name"] for f in page])
+        if cursor is None:
+            return names
+
+
+def test_name_pages_cover_every_file_once():
+    pages = _pages(sort="name", order="asc", limit=4)
+    assert [len(p) for p in pages] == [4, 4, 3]
+    assert sum(pages, []) == ["plan.jmx"] + [f"run{i:02d}.jtl" for i in range(10)]
+
+
+def test_date_pages_break_ties_on_name():
+    pages = _pages(file_type="jtl", sort="date", order="desc", limit=2)
+    assert sum(pages, []) == [f"run{i:02d}.jtl" for i in (9, 6, 7, 8, 3, 4, 5, 0, 1, 2)]
+
+
+def test_pages_stay_stable_when_files_are_added():
+    first, cursor = file_index.list_files(PREFIX, file_type="jtl", sort="date", order="asc", limit=5)
+    file_index.index_object(f"{PREFIX}early.jtl", 1, None, T0 - timedelta(days=1))
+    rest, _ = file_index.list_files(PREFIX, file_type="jtl", sort="date", order="asc", limit=5, cursor=cursor)
+
+    assert [f["name"] for f in first + rest] == [f"run{i:02d}.jtl" for i in range(10)]
+    assert rest[0]["last_modified"] == (T0 + timedelta(minutes=1)).isoformat()
+
+
+def test_invalid_cursor_and_sort_are_rejected():
+    with pytest.raises(ValueError):
+        file_index.list_files(PREFIX, cursor="not-a-cursor")
+    with pytest.raises(ValueError):
+        file_index.list_files(PREFIX, sort="size")
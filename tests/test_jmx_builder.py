@@ -0,0 +1,63 @@
+import pytest
+
+from jmx_builder import build_jmx, spec_from_prompt
+from jmx_validator import validate_jmx
+
+URL = "https://example.com/api"
+
+
+def _group(prompt):
+    spec = spec_from_prompt(prompt)
+    assert spec is not None
+    return spec["thread_groups"][0]
+
+
+def test_users_over_duration():
+    group = _group(f"50 users hitting {URL} over 10 minutes")
+    assert (group["users"], group["duration"]) == (50, 600)
+    assert group["requests"] == [{"url": URL, "method": "GET"}]
+
+
+def test_duration_stated_after_the_span():
+    assert _group(f"100 users, {URL} 5 minutes duration")["duration"] == 300
+
+
+def test_ramp_to_users_then_hold():
+    group = _group(f"ramp up to 200 users over 5 minutes then hold for 30 minutes against {URL}")
+    # The scheduler's duration includes the ramp-up
+    assert (group["users"], group["ramp_up"], group["duration"]) == (200, 300, 2100)
+
+
+def test_loops_think_time_throughput_and_status():
+    group = _group(f"20 users on {URL} 5 times, think time 500ms, 10 rps, assert status 200")
+    assert group["loops"] == 5
+    assert group["think_time_ms"] == 500
+    assert group["throughput_per_minute"] == 600
+    assert group["requests"][0]["assert_status"] == 200
+
+
+@pytest.mark.parametrize("prompt", [
+    f"10 users on {URL} for 5 minutes with response time under 500ms",
+    f"10 users on {URL} for 5 minutes, 3 regions",
+    f"POST {URL} with 10 users for 1m",
+    f"10 users log in to {URL} for 1m",
+    f"hit {URL} for 5 minutes",
+    "10 users for 5 minutes",
+])
+def test_prompts_beyond_the_templates_return_none(prompt):
+    assert spec_from_prompt(prompt) is None
+
+
+def test_built_plan_passes_validation():
+    spec = spec_from_prompt(f"ramp up to 20 users over 1 minute then hold for 5 minutes against {URL}, "
+                            "think time 200ms, assert status 200")
+    assert validate_jmx(build_jmx(spec)) == []
+
+
+def test_build_jmx_rejects_invalid_specs():
+    with pytest.raises(ValueError):
+        build_jmx({"thread_groups": []})
+    with pytest.raises(ValueError):
+        build_jmx({"thread_groups": [{"users": 0, "requests": [{"url": URL}]}]})
+    with pytest.raises(ValueError):
+        build_jmx({"thread_groups": [{"users": 1, "requests": [{"url": "ftp://example.com"}]}]})
@@ -0,0 +1,87 @@
+import pytest
+
+from jmx_validator import ERROR, has_errors, validate_jmx
+
+CONCURRENCY = "com.blazemeter.jmeter.threads.concurrency.ConcurrencyThreadGroup"
+
+SAMPLER = ('<HTTPSamplerProxy testclass="HTTPSamplerProxy" testname="home">'
+           '<stringProp name="HTTPSampler.domain">example.com</stringProp></HTTPSamplerProxy><hashTree/>')
+
+
+def _plan(*elements):
+    return ('<jmeterTestPlan><hashTree><TestPlan testclass="TestPlan" testname="plan"/><hashTree>'
+            f"{''.join(elements)}</hashTree></hashTree></jmeterTestPlan>")
+
+
+def _thread_group(threads="5", children=SAMPLER, tag="ThreadGroup", extra=""):
+    return (f'<{tag} testclass="{tag}" testname="users">'
+            f'<stringProp name="ThreadGroup.num_threads">{threads}</stringProp>{extra}'
+            '<elementProp name="ThreadGroup.main_controller" elementType="LoopController">'
+            '<stringProp name="LoopController.loops">1</stringProp></elementProp>'
+            f'</{tag}><hashTree>{children}</hashTree>')
+
+
+def _errors(xml):
+    return [d["code"] for d in validate_jmx(xml) if d["severity"] == ERROR]
+
+
+def test_core_plan_is_valid():
+    assert validate_jmx(_plan(_thread_group())) == []
+
+
+def test_plugin_group_with_main_controller_is_valid():
+    group = (f'<{CONCURRENCY} testclass="{CONCURRENCY}" testname="ramp">'
+             '<stringProp name="TargetLevel">10</stringProp>'
+             f'<elementProp name="ThreadGroup.main_controller"/></{CONCURRENCY}><hashTree>{SAMPLER}</hashTree>')
+    assert not has_errors(validate_jmx(_plan(group)))
+
+
+def test_custom_group_is_recognised_by_its_controller_property():
+    group = ('<kg.apc.jmeter.threads.Custom testclass="kg.apc.jmeter.threads.Custom" testname="custom">'
+             '<elementProp name="ThreadGroup.main_controller"/></kg.apc.jmeter.threads.Custom>'
+             f'<hashTree>{SAMPLER}</hashTree>')
+    assert not has_errors(validate_jmx(_plan(group)))
+
+
+def test_plugin_group_must_be_directly_in_the_plan():
+    nested = _thread_group(children=f'<{CONCURRENCY} testclass="{CONCURRENCY}"/><hashTree>{SAMPLER}</hashTree>')
+    assert _errors(_plan(nested)) == ["structure"]
+
+
+def test_sampler_outside_a_thread_group_fails():
+    assert _errors(_plan(SAMPLER, _thread_group())) == ["structure"]
+
+
+def test_missing_required_property_fails():
+    group = ('<ThreadGroup testclass="ThreadGroup" testname="users">'
+             '<stringProp name="ThreadGroup.num_threads">5</stringProp></ThreadGroup>'
+             f'<hashTree>{SAMPLER}</hashTree>')
+    assert _errors(_plan(group)) == ["missing_property"]
+
+
+@pytest.mark.parametrize("threads", ["0", "five", ""])
+def test_invalid_thread_count_fails(threads):
+    assert _errors(_plan(_thread_group(threads))) == ["invalid_number"]
+
+
+def test_expression_thread_count_is_accepted():
+    assert validate_jmx(_plan(_thread_group("${__P(threads,10)}"))) == []
+
+
+def test_scheduler_without_duration_fails():
+    extra = '<boolProp name="ThreadGroup.scheduler">true</boolProp>'
+    assert _errors(_plan(_thread_group(extra=extra))) == ["invalid_number"]
+
+
+def test_disabled_group_may_hold_placeholder_values():
+    disabled = _thread_group("0").replace('testname="users"', 'testname="off" enabled="false"', 1)
+    assert validate_jmx(_plan(_thread_group(), disabled)) == []
+
+
+def test_group_without_samplers_only_warns():
+    diagnostics = validate_jmx(_plan(_thread_group(), _thread_group(children="")))
+    assert [(d["severity"], d["code"]) for d in diagnostics] == [("warning", "no_samplers")]
+
+
+def test_malformed_xml_reports_position():
+    assert _errors("<jmeterTestPlan><hashTree>") == ["xml_syntax"]
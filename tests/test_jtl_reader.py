@@ -0,0 +1,41 @@
+import pytest
+
+from jtl_reader import convert_jtl_to_parquet, parse_jtl_lines, pa_csv, pa_parquet, read_jtl
+
+HEADER = ("timeStamp,elapsed,label,responseCode,responseMessage,threadName,dataType,success,"
+          "failureMessage,bytes,sentBytes,grpThreads,allThreads,URL,Latency,IdleTime,Connect")
+COLUMNS = ["timeStamp", "elapsed", "label", "responseCode", "success", "allThreads"]
+ENGINES = ["c"] + (["pyarrow"] if pa_csv is not None else [])
+
+
+def _sample(i):
+    return f"{1700000000000 + i},{100 + i % 7},home,200,OK,TG 1-1,text,true,,1234,200,5,5,http://x,50,0,3"
+
+
+@pytest.fixture
+def truncated_jtl(tmp_path):
+    """A JTL from an aborted run: the last sample was cut off mid-write."""
+    path = tmp_path / "aborted.jtl"
+    path.write_text("\n".join([HEADER] + [_sample(i) for i in range(500)] + ["1700000000500,12,ho"]))
+    return str(path)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_truncated_final_row_is_skipped(truncated_jtl, engine):
+    df = read_jtl(truncated_jtl, COLUMNS, engine=engine)
+    assert len(df) == 500
+    assert str(df["elapsed"].dtype) == "int32"
+    assert str(df["success"].dtype) == "bool"
+
+
+def test_tailer_lines_with_truncated_row():
+    data = ("\n".join([_sample(1), _sample(2), "1700000000003,12"]) + "\n").encode()
+    df = parse_jtl_lines(HEADER.encode(), data, COLUMNS)
+    assert len(df) == 2
+
+
+@pytest.mark.skipif(pa_parquet is None, reason="pyarrow not installed")
+def test_parquet_copy_of_truncated_jtl(truncated_jtl, tmp_path):
+    parquet_path = str(tmp_path / "aborted.parquet")
+    assert convert_jtl_to_parquet(truncated_jtl, parquet_path)
+    assert len(read_jtl(parquet_path, COLUMNS)) == 500
@@ -0,0 +1,101 @@
+import pytest
+
+from jtl_aggregator import load_aggregates
+from jtl_tailer import JTLTailer
+
+HEADER = "timeStamp,elapsed,label,responseCode,responseMessage,success,allThreads\n"
+
+
+def _row(start, elapsed=50, message="OK"):
+    return f"{start},{elapsed},home,200,{message},true,2\n"
+
+
+@pytest.fixture
+def jtl(tmp_path):
+    path = tmp_path / "results.jtl"
+    path.write_text(HEADER)
+    return path
+
+
+def _append(path, text):
+    with open(path, "a") as f:
+        f.write(text)
+
+
+def test_only_complete_lines_are_parsed(jtl):
+    tailer = JTLTailer(str(jtl))
+    _append(jtl, _row(1000) + _row(1010) + "1020,12,ho")
+    assert tailer.poll()
+    assert tailer.aggregator.rows == 2
+
+    _append(jtl, "me,200,OK,true,2\n")
+    assert tailer.poll()
+    assert tailer.aggregator.rows == 3
+    assert not tailer.poll()
+
+
+def test_newline_inside_quotes_does_not_end_the_row(jtl):
+    tailer = JTLTailer(str(jtl))
+    _append(jtl, _row(1000) + '1010,20,home,500,"Internal\nError')
+    tailer.poll()
+    assert tailer.aggregator.rows == 1
+
+    _append(jtl, '",false,2\n')
+    tailer.poll()
+    assert tailer.aggregator.rows == 2
+
+
+def test_failed_parse_is_retried_from_the_same_offset(jtl, monkeypatch):
+    tailer = JTLTailer(str(jtl))
+    _append(jtl, _row(1000) + _row(1010))
+    update = tailer.aggregator.update
+
+    def broken(chunk):
+        raise ValueError("boom")
+
+    monkeypatch.setattr(tailer.aggregator, "update", broken)
+    with pytest.raises(ValueError):
+        tailer.poll()
+    monkeypatch.setattr(tailer.aggregator, "update", update)
+
+    assert tailer.poll()
+    assert tailer.aggregator.rows == 2
+
+
+def test_stop_drops_a_truncated_final_line(jtl):
+    tailer = JTLTailer(str(jtl), interval=60)
+    _append(jtl, _row(1000) + _row(1010) + "1020,12,ho")
+    assert tailer.stop().rows == 2
+
+
+def test_stop_keeps_an_unterminated_complete_line(jtl):
+    tailer = JTLTailer(str(jtl), interval=60)
+    _append(jtl, _row(1000) + _row(1010).rstrip("\n"))
+    assert tailer.stop().rows == 2
+
+
+def test_shards_feed_the_same_aggregates(tmp_path):
+    paths = []
+    for i in range(2):
+        path = tmp_path / f"shard{i}.jtl"
+        path.write_text(HEADER + _row(1000 + i) + _row(1010 + i))
+        paths.append(str(path))
+    tailer = JTLTailer(paths + [str(tmp_path / "missing.jtl")], interval=60)
+    assert tailer.stop().rows == 4
+
+
+def test_saved_aggregates_round_trip(jtl, tmp_path):
+    _append(jtl, _row(1000, 40) + _row(1010, 60))
+    tailer = JTLTailer(str(jtl), interval=60)
+    tailer.stop()
+
+    aggregator, timeline = load_aggregates(tailer.save(str(tmp_path / "aggregates.json")))
+    assert aggregator.rows == 2
+    assert timeline is not None
+
+
+def test_failures_mean_nothing_is_saved(jtl, tmp_path):
+    tailer = JTLTailer(str(jtl), interval=60)
+    tailer.failed = True
+    assert tailer.save(str(tmp_path / "aggregates.json")) is None
+    assert not (tmp_path / "aggregates.json").exists()
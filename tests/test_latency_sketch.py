@@ -0,0 +1,51 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from latency_sketch import LatencySketch
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(7)
+    return np.concatenate([rng.lognormal(5, 0.6, 20000), rng.lognormal(8, 0.3, 500), np.zeros(100)])
+
+
+@pytest.mark.parametrize("q", [0.5, 0.9, 0.95, 0.99])
+def test_quantiles_within_relative_accuracy(samples, q):
+    sketch = LatencySketch(0.01).add(samples)
+    exact = np.quantile(samples, q, method="lower")
+    assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+
+
+def test_merge_matches_a_single_sketch(samples):
+    whole = LatencySketch().add(samples)
+    merged = LatencySketch()
+    for chunk in np.array_split(samples, 7):
+        merged.merge(LatencySketch().add(chunk))
+
+    assert merged.count == whole.count == len(samples)
+    assert merged.percentiles() == whole.percentiles()
+
+
+def test_merge_rejects_different_accuracy():
+    with pytest.raises(ValueError):
+        LatencySketch(0.01).merge(LatencySketch(0.02))
+
+
+def test_zero_and_nan_samples():
+    sketch = LatencySketch().add([0, 0, 0, float("nan"), 10])
+    assert sketch.count == 4
+    assert sketch.quantile(0.5) == 0.0
+
+
+def test_empty_sketch_has_nan_percentiles():
+    assert all(math.isnan(v) for v in LatencySketch().percentiles().values())
+
+
+def test_json_round_trip(samples):
+    sketch = LatencySketch().add(samples)
+    restored = LatencySketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert restored.percentiles() == sketch.percentiles()
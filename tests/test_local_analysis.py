@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import local_analysis
+from jtl_aggregator import JTLAggregator
+from jtl_timeline import JTLTimeline
+
+T0 = 1_700_000_000_000
+
+
+def _ramp(seed, rps_per_thread=2.0, capacity_rps=None, start=1, end=50, seconds=600):
+    """Samples of a linear start→end thread ramp; throughput is capped at `capacity_rps` if given."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for second in range(seconds):
+        threads = int(start + (end - start) * second / seconds)
+        rate = threads * rps_per_thread
+        latency = 100.0
+        if capacity_rps and rate > capacity_rps:
+            # Saturated: extra users only queue (Little's law)
+            latency *= rate / capacity_rps
+            rate = capacity_rps
+        for offset in np.sort(rng.integers(0, 1000, rng.poisson(rate))):
+            rows.append((T0 + second * 1000 + int(offset), int(rng.normal(latency, latency * 0.05)), threads))
+    frame = pd.DataFrame(rows, columns=["timeStamp", "elapsed", "allThreads"])
+    return frame.assign(label="GET /", responseCode="200", success=True)
+
+
+def _analyze(frame):
+    timeline = JTLTimeline(10).update(frame)
+    summary = JTLAggregator().update(frame).summary_frame()
+    return local_analysis.analyze(summary, timeline, [])
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_linear_scaling_ramp_has_no_plateau(seed):
+    verdict, findings = _analyze(_ramp(seed))
+    kinds = {f["kind"] for f in findings}
+    assert "throughput_plateau" not in kinds
+    assert "saturation_knee" not in kinds
+    assert verdict == "PASS"
+
+
+def test_saturating_ramp_reports_plateau():
+    _, findings = _analyze(_ramp(0, capacity_rps=50))
+    plateau = [f for f in findings if f["kind"] == "throughput_plateau"]
+    assert plateau
+    # Capacity is reached at 25 threads (2 rps each)
+    assert 20 <= plateau[0]["threads"] <= 32
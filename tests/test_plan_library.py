@@ -0,0 +1,64 @@
+import os
+import xml.etree.ElementTree as ET
+from unittest import mock
+
+import pytest
+
+from jmx_builder import build_jmx
+
+mongomock = pytest.importorskip("mongomock")
+os.environ.setdefault("MONGO_DB_NAME", "tests")
+with mock.patch("pymongo.MongoClient", mongomock.MongoClient):
+    from plan_library import _adapt, _terms, fingerprint
+
+URL = "https://example.com/api"
+
+
+def _plan(*groups):
+    return build_jmx({"thread_groups": [{"requests": [{"url": URL}], **group} for group in groups]})
+
+
+def _props(xml_content):
+    group = ET.fromstring(xml_content).find(".//ThreadGroup")
+    return {p.get("name"): (p.text or "") for p in group.iter() if p.get("name")}
+
+
+def test_load_shape_numbers_become_placeholders():
+    assert _terms(f"50 users on {URL} for 10 minutes") == ["num", "user", "url", "num", "unit"]
+    assert fingerprint(f"50 users on {URL} for 10 minutes")[0] == \
+        fingerprint(f"200 users on {URL} for 1 hour")[0]
+
+
+def test_other_numbers_are_kept_as_values():
+    assert _terms("think time 1s")[-1] == _terms("think time 1000ms")[-1] == "v1000ms"
+    assert _terms("at 2 rps") == ["v2rps"]
+    assert fingerprint(f"50 users on {URL} at 2 rps")[0] != fingerprint(f"50 users on {URL} at 5 rps")[0]
+
+
+def test_adapt_rewrites_users_duration_and_ramp():
+    adapted = _adapt(_plan({"users": 10, "loops": 3}), {"users": 50, "duration": 600, "ramp_up": 60})
+    props = _props(adapted)
+    assert (props["ThreadGroup.num_threads"], props["ThreadGroup.duration"], props["ThreadGroup.ramp_time"]) \
+        == ("50", "600", "60")
+    # The scheduler bounds the run, so the loops must not stop it early
+    assert (props["ThreadGroup.scheduler"], props["LoopController.loops"]) == ("true", "-1")
+
+
+def test_adapt_switches_a_timed_plan_to_loops():
+    props = _props(_adapt(_plan({"users": 10, "duration": 600}), {"loops": 5}))
+    assert (props["ThreadGroup.scheduler"], props["LoopController.loops"]) == ("false", "5")
+
+
+def test_adapt_returns_the_plan_unchanged_when_the_shape_matches():
+    plan = _plan({"users": 10, "duration": 600})
+    assert _adapt(plan, {"users": 10, "duration": 600}) is plan
+
+
+def test_adapt_refuses_multiple_thread_groups():
+    assert _adapt(_plan({"users": 10}, {"users": 5}), {"users": 50}) is None
+
+
+def test_adapt_refuses_plugin_thread_groups():
+    plugin = "com.blazemeter.jmeter.threads.concurrency.ConcurrencyThreadGroup"
+    plan = _plan({"users": 10}).replace("<ThreadGroup ", f"<{plugin} ").replace("</ThreadGroup>", f"</{plugin}>")
+    assert _adapt(plan, {"users": 50}) is None
@@ -0,0 +1,123 @@
+import json
+import sys
+import types
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import run_scheduler  # noqa: E402
+
+
+class _Task:
+    """Stands in for the Celery task; records dispatched job ids instead of queueing them."""
+
+    def __init__(self):
+        self.started = []
+
+    def apply_async(self, args, task_id):
+        self.started.append(task_id)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    r = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(run_scheduler, "get_redis", lambda: r)
+    monkeypatch.setenv("JMETER_HOST_CPUS", "2")
+    monkeypatch.setenv("JMETER_HOST_MEMORY_MB", "4096")
+    monkeypatch.setattr(run_scheduler, "RUNNER_CPUS", 1.0)
+    monkeypatch.setattr(run_scheduler, "RUNNER_MEMORY_MB", 1024)
+    monkeypatch.setattr(run_scheduler, "MAX_CONCURRENT_RUNS", 2)
+    return r
+
+
+@pytest.fixture
+def task(monkeypatch):
+    task = _Task()
+    monkeypatch.setitem(sys.modules, "tasks.tasks", types.SimpleNamespace(run_jmeter_test_async=task))
+    return task
+
+
+def _submit(job_id, user, license_type="paid", nodes=1):
+    run_scheduler.submit_run(job_id, user, license_type, nodes, [job_id])
+
+
+def test_paid_runs_are_admitted_before_trial_runs(redis, task):
+    _submit("busy", "owner", nodes=2)
+    _submit("trial", "t", "trial")
+    _submit("paid", "p", "paid")
+    assert task.started == ["busy"]
+    assert [run_scheduler.queue_position(j) for j in ("paid", "trial")] == [1, 2]
+
+    run_scheduler.release_run("busy")
+    assert task.started == ["busy", "paid", "trial"]
+
+
+def test_users_with_fewer_runs_in_flight_go_first(redis, task):
+    _submit("a1", "alice")
+    _submit("block", "owner")
+    _submit("a2", "alice")
+    _submit("b1", "bob")
+
+    run_scheduler.release_run("block")
+    assert task.started == ["a1", "block", "b1"]
+    assert run_scheduler.queue_position("a2") == 1
+
+
+def test_head_of_queue_is_not_overtaken_by_smaller_runs(redis, task):
+    _submit("one", "a")
+    _submit("big", "b", nodes=2)
+    _submit("small", "c")
+    assert task.started == ["one"]
+    assert run_scheduler.queue_position("big") == 1
+
+
+def test_oversized_and_excess_pending_runs_are_rejected(redis, task, monkeypatch):
+    with pytest.raises(run_scheduler.RunRejected) as rejected:
+        _submit("huge", "a", nodes=3)
+    assert rejected.value.status_code == 400
+
+    monkeypatch.setattr(run_scheduler, "MAX_PENDING_PER_USER", 1)
+    _submit("big", "a", nodes=2)
+    _submit("waiting", "a", nodes=2)
+    with pytest.raises(run_scheduler.RunRejected) as rejected:
+        _submit("more", "a")
+    assert rejected.value.status_code == 429
+
+
+def test_renewal_extends_the_lease(redis, task):
+    _submit("run", "a")
+    expires = json.loads(redis.hget(run_scheduler.RUNNING_KEY, "run"))["expires"]
+
+    assert run_scheduler.renew_run("run")
+    assert json.loads(redis.hget(run_scheduler.RUNNING_KEY, "run"))["expires"] >= expires
+    assert not run_scheduler.renew_run("unknown")
+
+
+def test_expired_lease_frees_its_capacity(redis, task):
+    _submit("dead", "a", nodes=2)
+    _submit("next", "b")
+    assert task.started == ["dead"]
+
+    reservation = json.loads(redis.hget(run_scheduler.RUNNING_KEY, "dead"))
+    redis.hset(run_scheduler.RUNNING_KEY, "dead", json.dumps({**reservation, "expires": 0}))
+    assert run_scheduler.dispatch_pending() == ["next"]
+    assert not run_scheduler.renew_run("dead")
+
+
+def test_lease_thread_renews_until_stopped(redis, task):
+    _submit("run", "a")
+    redis.hset(run_scheduler.RUNNING_KEY, "run",
+               json.dumps({**json.loads(redis.hget(run_scheduler.RUNNING_KEY, "run")), "expires": 0}))
+
+    lease = run_scheduler.ReservationLease("run", interval=0.01)
+    lease.start()
+    try:
+        for _ in range(100):
+            if json.loads(redis.hget(run_scheduler.RUNNING_KEY, "run"))["expires"] > 0:
+                break
+            lease._stop_event.wait(0.01)
+    finally:
+        lease.stop()
+    assert json.loads(redis.hget(run_scheduler.RUNNING_KEY, "run"))["expires"] > 0
+    assert not lease.is_alive()
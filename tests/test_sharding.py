@@ -0,0 +1,111 @@
+import csv
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from sharding import merge_jtl_files, split_jmx
+
+HEADER = "timeStamp,elapsed,label,responseCode,responseMessage,success,allThreads"
+
+
+CONCURRENCY = "com.blazemeter.jmeter.threads.concurrency.ConcurrencyThreadGroup"
+ULTIMATE = "kg.apc.jmeter.threads.UltimateThreadGroup"
+
+
+def _plan(tmp_path, *groups):
+    path = tmp_path / "plan.jmx"
+    path.write_text(f"<jmeterTestPlan><hashTree><TestPlan/><hashTree>{''.join(groups)}</hashTree></hashTree></jmeterTestPlan>")
+    return str(path)
+
+
+def _group(tag, prop, value, enabled="true"):
+    return (f'<{tag} testclass="{tag}" testname="{tag.rsplit(".", 1)[-1]}" enabled="{enabled}">'
+            f'<stringProp name="{prop}">{value}</stringProp>'
+            f'<elementProp name="ThreadGroup.main_controller"/></{tag}><hashTree/>')
+
+
+def _loads(shard_paths):
+    """Per shard: (class, load, enabled) of each thread group."""
+    shards = []
+    for path in shard_paths:
+        root = ET.parse(path).getroot()
+        shards.append([(g.tag.rsplit(".", 1)[-1], g[0].text, g.get("enabled")) for g in root.iter()
+                       if g.get("testclass")])
+    return shards
+
+
+def test_split_divides_core_and_plugin_groups(tmp_path):
+    plan = _plan(tmp_path, _group("ThreadGroup", "ThreadGroup.num_threads", 5),
+                 _group("SetupThreadGroup", "ThreadGroup.num_threads", 1),
+                 _group(CONCURRENCY, "TargetLevel", 10))
+
+    shards = _loads(split_jmx(plan, 3, str(tmp_path)))
+
+    assert shards == [
+        [("ThreadGroup", "2", "true"), ("SetupThreadGroup", "1", "true"), ("ConcurrencyThreadGroup", "4", "true")],
+        [("ThreadGroup", "2", "true"), ("SetupThreadGroup", "0", "false"), ("ConcurrencyThreadGroup", "3", "true")],
+        [("ThreadGroup", "1", "true"), ("SetupThreadGroup", "0", "false"), ("ConcurrencyThreadGroup", "3", "true")],
+    ]
+
+
+@pytest.mark.parametrize("group", [
+    _group(ULTIMATE, "ultimatethreadgroupdata", ""),
+    _group("ThreadGroup", "ThreadGroup.num_threads", "${__P(threads,10)}"),
+])
+def test_split_rejects_groups_it_cannot_divide(tmp_path, group):
+    plan = _plan(tmp_path, _group("ThreadGroup", "ThreadGroup.num_threads", 5), group)
+    with pytest.raises(ValueError):
+        split_jmx(plan, 2, str(tmp_path))
+
+
+def test_split_ignores_disabled_unknown_groups(tmp_path):
+    plan = _plan(tmp_path, _group("ThreadGroup", "ThreadGroup.num_threads", 4),
+                 _group(ULTIMATE, "ultimatethreadgroupdata", "", enabled="false"))
+
+    shards = _loads(split_jmx(plan, 2, str(tmp_path)))
+
+    assert [s[0] for s in shards] == [("ThreadGroup", "2", "true")] * 2
+
+
+def _row(start, elapsed, label="home"):
+    return f"{start},{elapsed},{label},200,OK,true,2"
+
+
+def _write(path, rows):
+    path.write_text("\n".join([HEADER] + rows) + "\n")
+    return str(path)
+
+
+def _timestamps(path):
+    with open(path, newline="") as f:
+        return [int(r["timeStamp"]) for r in csv.DictReader(f)]
+
+
+@pytest.mark.parametrize("run_rows", [2, 100])
+def test_merge_orders_rows_written_at_completion(tmp_path, run_rows):
+    # Rows are written as samples complete: a long sample lands after shorter ones that started later
+    shard1 = _write(tmp_path / "s1.jtl", [_row(1000, 50), _row(1010, 20), _row(1000 + 5, 900), _row(1500, 10)])
+    shard2 = _write(tmp_path / "s2.jtl", [_row(1002, 5), _row(1400, 10), _row(1001, 700)])
+    output = str(tmp_path / "merged.jtl")
+
+    assert merge_jtl_files([shard1, shard2], output, run_rows=run_rows) == 7
+    assert _timestamps(output) == [1000, 1001, 1002, 1005, 1010, 1400, 1500]
+
+
+def test_merge_skips_truncated_final_rows(tmp_path):
+    killed = tmp_path / "s1.jtl"
+    killed.write_text("\n".join([HEADER, _row(1000, 50), _row(1020, 10), "1030,12,ho"]))
+    quoted = tmp_path / "s2.jtl"
+    quoted.write_text("\n".join([HEADER, _row(1010, 5), '1040,7,home,500,"Internal']))
+    output = str(tmp_path / "merged.jtl")
+
+    assert merge_jtl_files([str(killed), str(quoted)], output) == 3
+    assert _timestamps(output) == [1000, 1010, 1020]
+
+
+def test_merge_ignores_missing_and_empty_shards(tmp_path):
+    shard = _write(tmp_path / "s1.jtl", [_row(1000, 5)])
+    (tmp_path / "empty.jtl").write_text("")
+    output = str(tmp_path / "merged.jtl")
+
+    assert merge_jtl_files([shard, str(tmp_path / "empty.jtl"), str(tmp_path / "missing.jtl")], output) == 1